@@ -0,0 +1,224 @@
+"""
+account_counters.py
+Contadores por conta, mantidos de forma atômica (UpdateExpression ADD).
+
+Ficam na users_table, no mesmo esquema de chave de account_settings:
+    user_id = "account_counters:<account_id>"
+
+Atributos:
+    items_<status>         → itens por status (available, archive, deleted, ...)
+    transactions_<status>  → transações por transaction_status
+    clients_total          → clientes da conta
+    initialized_at         → presente só depois de uma recontagem completa
+
+Toda rota que muda status chama item_status_changed / transaction_status_changed.
+Se o registro ainda não foi inicializado, get_counters faz a recontagem (uma vez).
+Essa recontagem não sobrescreve o registro: soma a cada contador a diferença entre
+o total contado e o valor lido antes de contar, com a condição de ainda não estar
+inicializado, para que um ADD feito durante a contagem não se perca.
+Para reparar manualmente: python recount_account_counters.py <account_id>
+"""
+
+import datetime
+import re
+
+from boto3.dynamodb.conditions import Key
+
+
+def counters_key(account_id):
+    return f"account_counters:{account_id}"
+
+
+def _attr_name(prefix, status):
+    status = re.sub(r"[^a-z0-9_]+", "_", str(status or "").strip().lower()).strip("_")
+    return f"{prefix}_{status}" if status else None
+
+
+def _to_int(value):
+    try:
+        return int(value or 0)
+    except (ValueError, TypeError):
+        return 0
+
+
+def adjust(users_table, account_id, deltas):
+    """Aplica {atributo: delta} com ADD. Deltas zerados são ignorados."""
+    deltas = {k: int(v) for k, v in (deltas or {}).items() if k and int(v or 0) != 0}
+    if not account_id or not deltas:
+        return
+    names = {}
+    values = {}
+    parts = []
+    for i, (attr, delta) in enumerate(deltas.items()):
+        names[f"#c{i}"] = attr
+        values[f":d{i}"] = delta
+        parts.append(f"#c{i} :d{i}")
+    try:
+        users_table.update_item(
+            Key={"user_id": counters_key(account_id)},
+            UpdateExpression="ADD " + ", ".join(parts),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+    except Exception as e:
+        print(f"Erro ao atualizar contadores da conta {account_id}: {e}")
+
+
+def _status_deltas(prefix, old_status, new_status):
+    if old_status == new_status:
+        return {}
+    deltas = {}
+    old_attr = _attr_name(prefix, old_status)
+    new_attr = _attr_name(prefix, new_status)
+    if old_attr:
+        deltas[old_attr] = deltas.get(old_attr, 0) - 1
+    if new_attr:
+        deltas[new_attr] = deltas.get(new_attr, 0) + 1
+    return deltas
+
+
+def item_status_changed(users_table, account_id, old_status, new_status):
+    """old_status=None para item novo; new_status=None para exclusão definitiva."""
+    adjust(users_table, account_id, _status_deltas("items", old_status, new_status))
+
+
+def transaction_status_changed(users_table, account_id, old_status, new_status):
+    adjust(users_table, account_id, _status_deltas("transactions", old_status, new_status))
+
+
+def client_added(users_table, account_id, delta=1):
+    adjust(users_table, account_id, {"clients_total": delta})
+
+
+def _count_query(table, **query_kwargs):
+    total = 0
+    query_kwargs["Select"] = "COUNT"
+    while True:
+        response = table.query(**query_kwargs)
+        total += response.get("Count", 0)
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return total
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+
+def _count_by_attr(table, index_name, account_id, attr):
+    """Conta por valor de `attr` lendo só esse atributo (uma passada no GSI)."""
+    counts = {}
+    query_kwargs = {
+        "IndexName": index_name,
+        "KeyConditionExpression": Key("account_id").eq(account_id),
+        "ProjectionExpression": "#a",
+        "ExpressionAttributeNames": {"#a": attr},
+    }
+    while True:
+        response = table.query(**query_kwargs)
+        for row in response.get("Items", []):
+            value = row.get(attr)
+            if value:
+                counts[value] = counts.get(value, 0) + 1
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return counts
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+
+def _counter_attrs(record):
+    return [k for k in record if k.startswith(("items_", "transactions_")) or k == "clients_total"]
+
+
+def recount(users_table, itens_table, transactions_table, clients_table, account_id, overwrite=False):
+    """
+    Recontagem completa. overwrite=True (script de reparo) sobrescreve o registro;
+    sem ele, só inicializa um registro ainda não inicializado (ver _initialize).
+    """
+    key = {"user_id": counters_key(account_id)}
+    before = {} if overwrite else users_table.get_item(Key=key, ConsistentRead=True).get("Item") or {}
+    if before.get("initialized_at"):
+        return before
+
+    record = {
+        "user_id": counters_key(account_id),
+        "initialized_at": datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    for status, total in _count_by_attr(
+        itens_table, "account_id-created_at-index", account_id, "status"
+    ).items():
+        attr = _attr_name("items", status)
+        if attr:
+            record[attr] = total
+
+    for status, total in _count_by_attr(
+        transactions_table, "account_id-index", account_id, "transaction_status"
+    ).items():
+        attr = _attr_name("transactions", status)
+        if attr:
+            record[attr] = total
+
+    record["clients_total"] = _count_query(
+        clients_table,
+        IndexName="account_id-index",
+        KeyConditionExpression=Key("account_id").eq(account_id),
+    )
+
+    if overwrite:
+        users_table.put_item(Item=record)
+        return record
+    return _initialize(users_table, record, before)
+
+
+def _initialize(users_table, record, before):
+    """
+    SET contador = if_not_exists(contador, 0) + (contado - lido antes), condicionado
+    a attribute_not_exists(initialized_at). Os ADDs feitos depois da leitura ficam
+    no resultado. Se outra requisição inicializou antes, fica com o registro dela.
+    """
+    key = {"user_id": record["user_id"]}
+    names = {"#init": "initialized_at"}
+    values = {":init": record["initialized_at"], ":zero": 0}
+    parts = ["#init = :init"]
+    for i, attr in enumerate(dict.fromkeys(_counter_attrs(record) + _counter_attrs(before))):
+        names[f"#c{i}"] = attr
+        values[f":d{i}"] = _to_int(record.get(attr)) - _to_int(before.get(attr))
+        parts.append(f"#c{i} = if_not_exists(#c{i}, :zero) + :d{i}")
+    try:
+        response = users_table.update_item(
+            Key=key,
+            UpdateExpression="SET " + ", ".join(parts),
+            ConditionExpression="attribute_not_exists(#init)",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_NEW",
+        )
+    except users_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return users_table.get_item(Key=key, ConsistentRead=True).get("Item") or {}
+    return response.get("Attributes") or record
+
+
+def get_counters(users_table, account_id, itens_table=None, transactions_table=None, clients_table=None):
+    """
+    Lê os contadores com um get_item. Se o registro não foi inicializado e as
+    tabelas foram passadas, faz a recontagem uma única vez.
+    """
+    if not account_id:
+        return {}
+    try:
+        response = users_table.get_item(Key={"user_id": counters_key(account_id)})
+        record = response.get("Item") or {}
+    except Exception as e:
+        print(f"Erro ao ler contadores da conta {account_id}: {e}")
+        record = {}
+
+    if not record.get("initialized_at") and itens_table and transactions_table and clients_table:
+        try:
+            record = recount(users_table, itens_table, transactions_table, clients_table, account_id)
+        except Exception as e:
+            print(f"Erro ao recontar contadores da conta {account_id}: {e}")
+
+    return record
+
+
+def count(record, prefix, *statuses):
+    """Soma os contadores de um ou mais status. Ex.: count(c, "items", "available", "archive")."""
+    return sum(max(_to_int(record.get(_attr_name(prefix, s))), 0) for s in statuses)
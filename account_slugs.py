@@ -0,0 +1,169 @@
+"""
+account_slugs.py
+Resolução do slug público (/agendar/<slug>) para a conta, sem scan.
+
+Além do registro account_slug de cada conta (account_id, "account_slug"), há um
+registro de mapeamento por slug na mesma scheduling_config_table:
+    account_id = "slug:<slug>", config_key = "account_slug_map"
+    owner_account_id, business_name
+
+A busca é um get_item por chave, com cache em memória (ACCOUNT_SLUG_TTL_SECONDS,
+padrão 300). O painel de configuração grava pelo claim(), que reserva o slug novo
+(falha se outra conta já o usa), atualiza o registro da conta e libera o antigo.
+
+Slugs gravados antes do mapeamento precisam do backfill:
+    python backfill_slug_mappings.py
+Slug sem mapeamento é tratado como inexistente. Só com ACCOUNT_SLUG_LEGACY_SCAN=1
+(enquanto o backfill não rodou) ele é procurado pelo scan antigo e o mapeamento
+é criado na hora.
+"""
+
+import os
+import threading
+import time
+
+from boto3.dynamodb.conditions import Attr
+
+
+SLUG_TTL = float(os.getenv("ACCOUNT_SLUG_TTL_SECONDS", "300"))
+MISSING_TTL = 30
+LEGACY_SCAN = os.getenv("ACCOUNT_SLUG_LEGACY_SCAN", "").strip().lower() in ("1", "true")
+MAP_CONFIG_KEY = "account_slug_map"
+
+_lock = threading.Lock()
+_slugs = {}  # {slug: (expira_em, conta ou None)}
+
+
+def mapping_key(slug):
+    return {"account_id": f"slug:{slug}", "config_key": MAP_CONFIG_KEY}
+
+
+def _cache_set(slug, account, ttl):
+    with _lock:
+        _slugs[slug] = (time.time() + ttl, account)
+
+
+def invalidate(*slugs):
+    with _lock:
+        for slug in slugs:
+            if slug:
+                _slugs.pop(slug, None)
+
+
+def _legacy_lookup(scheduling_config_table, slug):
+    """Scan antigo (paginado), só com LEGACY_SCAN e quando o slug não tem mapeamento."""
+    scan_kwargs = {
+        "FilterExpression": Attr("config_key").eq("account_slug") & Attr("slug").eq(slug),
+    }
+    while True:
+        resp = scheduling_config_table.scan(**scan_kwargs)
+        items = resp.get("Items", [])
+        if items:
+            return items[0]
+        last_evaluated_key = resp.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return None
+        scan_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+
+def write_mapping(scheduling_config_table, account_id, slug, business_name=""):
+    """
+    Grava o mapeamento se o slug está livre ou já é da conta.
+    Devolve False se outra conta é dona do slug.
+    """
+    try:
+        scheduling_config_table.put_item(
+            Item={
+                **mapping_key(slug),
+                "owner_account_id": account_id,
+                "slug": slug,
+                "business_name": business_name or "",
+            },
+            ConditionExpression="attribute_not_exists(account_id) OR owner_account_id = :owner",
+            ExpressionAttributeValues={":owner": account_id},
+        )
+    except scheduling_config_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+    return True
+
+
+def resolve(scheduling_config_table, slug):
+    """{"account_id", "slug", "business_name"} do slug, ou None."""
+    slug = str(slug or "").strip().lower()
+    if not slug:
+        return None
+    with _lock:
+        cached = _slugs.get(slug)
+        if cached and cached[0] > time.time():
+            return cached[1]
+
+    try:
+        item = scheduling_config_table.get_item(Key=mapping_key(slug)).get("Item")
+        if item and item.get("owner_account_id"):
+            account = {
+                "account_id": item["owner_account_id"],
+                "slug": slug,
+                "business_name": item.get("business_name", ""),
+            }
+            _cache_set(slug, account, SLUG_TTL)
+            return account
+
+        legacy = _legacy_lookup(scheduling_config_table, slug) if LEGACY_SCAN else None
+    except Exception as e:
+        print(f"Erro ao buscar conta pelo slug: {e}")
+        return None
+
+    if not legacy:
+        _cache_set(slug, None, MISSING_TTL)
+        return None
+
+    account = {
+        "account_id": legacy["account_id"],
+        "slug": slug,
+        "business_name": legacy.get("business_name", ""),
+    }
+    try:
+        write_mapping(scheduling_config_table, account["account_id"], slug, account["business_name"])
+    except Exception as e:
+        print(f"Erro ao gravar mapeamento do slug {slug}: {e}")
+    _cache_set(slug, account, SLUG_TTL)
+    return account
+
+
+def claim(scheduling_config_table, account_id, slug, business_name="", previous_slug=""):
+    """
+    Troca o slug da conta: reserva o novo, grava o registro account_slug da conta
+    e libera o anterior. Devolve (ok, mensagem de erro).
+    """
+    slug = str(slug or "").strip().lower()
+    previous_slug = str(previous_slug or "").strip().lower()
+    if not slug:
+        return False, "Slug vazio."
+    try:
+        if not write_mapping(scheduling_config_table, account_id, slug, business_name):
+            return False, f"O link /agendar/{slug} já está em uso por outra conta."
+        scheduling_config_table.put_item(
+            Item={
+                "account_id": account_id,
+                "config_key": "account_slug",
+                "slug": slug,
+                "business_name": business_name or "",
+                "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+        )
+        if previous_slug and previous_slug != slug:
+            try:
+                scheduling_config_table.delete_item(
+                    Key=mapping_key(previous_slug),
+                    ConditionExpression="owner_account_id = :owner",
+                    ExpressionAttributeValues={":owner": account_id},
+                )
+            except scheduling_config_table.meta.client.exceptions.ConditionalCheckFailedException:
+                pass
+    except Exception as e:
+        msg = str(e) or e.__class__.__name__
+        print(f"Erro ao salvar slug da conta {account_id}: {msg}")
+        return False, msg
+    finally:
+        invalidate(slug, previous_slug)
+    return True, ""
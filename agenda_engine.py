@@ -0,0 +1,324 @@
+"""
+agenda_engine.py
+Leitura da agenda por janela de datas, sem scan.
+
+Provas: alugueqqc_fittings_table já tem account_id (PK) + date_time_local (SK,
+"YYYY-MM-DD#HH:MM#<fitting_id>"), então uma janela é um query `between` na chave
+e o passado é o mesmo query em ordem decrescente, paginado por data.
+
+Retiradas/devoluções: GSIs esparsos account_id-rental_date-index e
+account_id-return_date-index (create_transaction_date_gsis.py), com o status no
+FilterExpression. Enquanto os índices não existem, cai no GSI
+account_id-transaction_status-index com a janela de datas no filtro.
+
+    sheet = day_sheet(fittings_table, transactions_table, account_id, "2025-06-10")
+    next_days, next_cursor = upcoming_days(fittings_table, transactions_table, account_id, after_iso)
+    past_days, older_cursor = past_days(fittings_table, account_id, before_iso)
+"""
+
+import datetime
+
+from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
+
+
+WINDOW_DAYS = 30
+PAST_PAGE_DAYS = 30
+ACTIVE_STATUSES = ("reserved", "rented")
+
+# Maior que qualquer "#HH:MM#<fitting_id>" depois da data
+_KEY_SUFFIX_MAX = "#\uffff"
+
+
+def add_days(date_iso, days):
+    return (datetime.date.fromisoformat(str(date_iso)[:10]) + datetime.timedelta(days=days)).isoformat()
+
+
+def _query_all(table, query_kwargs):
+    items = []
+    while True:
+        response = table.query(**query_kwargs)
+        items.extend(response.get("Items", []))
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return items
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+
+def _index_missing(error):
+    """Erro do DynamoDB por índice (ou tabela) que ainda não existe."""
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get("Error", {}).get("Code")
+    return code == "ResourceNotFoundException" or (
+        code == "ValidationException" and "index" in str(error).lower()
+    )
+
+
+def fittings_between(fittings_table, account_id, start_iso, end_iso):
+    """Provas com data em [start_iso, end_iso] (inclusivo), em ordem de data/hora."""
+    return _query_all(fittings_table, {
+        "KeyConditionExpression": Key("account_id").eq(account_id)
+        & Key("date_time_local").between(str(start_iso)[:10], str(end_iso)[:10] + _KEY_SUFFIX_MAX),
+    })
+
+
+def _active_transactions_between(transactions_table, account_id, start_iso, end_iso):
+    """Caminho antigo (sem os GSIs de data): locações em aberto filtradas pela janela."""
+    events = []
+    for status in ACTIVE_STATUSES:
+        date_filter = Attr("rental_date").between(start_iso, end_iso)
+        if status == "rented":
+            date_filter = date_filter | Attr("return_date").between(start_iso, end_iso)
+        transactions = _query_all(transactions_table, {
+            "IndexName": "account_id-transaction_status-index",
+            "KeyConditionExpression": Key("account_id").eq(account_id)
+            & Key("transaction_status").eq(status),
+            "FilterExpression": date_filter,
+        })
+        for tx in transactions:
+            rental_date = str(tx.get("rental_date") or "")[:10]
+            return_date = str(tx.get("return_date") or "")[:10]
+            if start_iso <= rental_date <= end_iso:
+                events.append((tx, "pickup"))
+            if status == "rented" and start_iso <= return_date <= end_iso:
+                events.append((tx, "return"))
+    return events
+
+
+def transactions_between(transactions_table, account_id, start_iso, end_iso):
+    """
+    Transações com retirada ou devolução em [start_iso, end_iso].
+    Devolve pares (transação, "pickup" | "return"), com as mesmas regras da agenda:
+    retirada para reserved/rented, devolução só para rented.
+    """
+    start_iso = str(start_iso)[:10]
+    end_iso = str(end_iso)[:10]
+    try:
+        pickups = _query_all(transactions_table, {
+            "IndexName": "account_id-rental_date-index",
+            "KeyConditionExpression": Key("account_id").eq(account_id)
+            & Key("rental_date").between(start_iso, end_iso),
+            "FilterExpression": Attr("transaction_status").is_in(list(ACTIVE_STATUSES)),
+        })
+        returns = _query_all(transactions_table, {
+            "IndexName": "account_id-return_date-index",
+            "KeyConditionExpression": Key("account_id").eq(account_id)
+            & Key("return_date").between(start_iso, end_iso),
+            "FilterExpression": Attr("transaction_status").eq("rented"),
+        })
+    except ClientError as e:
+        if not _index_missing(e):
+            raise
+        print(f"GSIs de data indisponíveis, usando índice de status: {e}")
+        return _active_transactions_between(transactions_table, account_id, start_iso, end_iso)
+    return [(tx, "pickup") for tx in pickups] + [(tx, "return") for tx in returns]
+
+
+def day_sheet(fittings_table, transactions_table, account_id, start_iso, end_iso=None):
+    """
+    Folha do dia (ou do período [start_iso, end_iso]): retiradas, devoluções e provas.
+        {"start_iso", "end_iso", "pickups": [...], "returns": [...], "fittings": [...]}
+    As transações vêm com transaction_type ("pickup"/"return"), como a agenda espera.
+    """
+    start_iso = str(start_iso)[:10]
+    end_iso = str(end_iso or start_iso)[:10]
+    sheet = {"start_iso": start_iso, "end_iso": end_iso, "pickups": [], "returns": [], "fittings": []}
+    for tx, transaction_type in transactions_between(transactions_table, account_id, start_iso, end_iso):
+        tx_copy = tx.copy()
+        tx_copy["transaction_type"] = transaction_type
+        sheet["pickups" if transaction_type == "pickup" else "returns"].append(tx_copy)
+    sheet["pickups"].sort(key=lambda tx: str(tx.get("rental_date") or ""))
+    sheet["returns"].sort(key=lambda tx: str(tx.get("return_date") or ""))
+    sheet["fittings"] = fittings_between(fittings_table, account_id, start_iso, end_iso)
+    return sheet
+
+
+def sheet_days(sheet):
+    """Agrupa a folha por data no formato do template da agenda (ordenado por data)."""
+    dates = {}
+
+    def _day(date_iso):
+        return dates.setdefault(date_iso, {"fitting_items": [], "transaction_items": []})
+
+    for fitting in sheet["fittings"]:
+        date_part = str(fitting.get("date_time_local") or "")[:10]
+        if date_part:
+            _day(date_part)["fitting_items"].append(fitting)
+    for tx in sheet["pickups"]:
+        _day(str(tx.get("rental_date"))[:10])["transaction_items"].append(tx)
+    for tx in sheet["returns"]:
+        _day(str(tx.get("return_date"))[:10])["transaction_items"].append(tx)
+
+    return [
+        {
+            "date_iso": date_iso,
+            "fitting_items": dates[date_iso]["fitting_items"],
+            "transaction_items": dates[date_iso]["transaction_items"],
+        }
+        for date_iso in sorted(dates)
+    ]
+
+
+def _first_item(table, query_kwargs):
+    """Primeiro item de um query (paginando só enquanto o filtro descarta tudo)."""
+    query_kwargs = dict(query_kwargs, Limit=query_kwargs.get("Limit", 25))
+    while True:
+        response = table.query(**query_kwargs)
+        items = response.get("Items", [])
+        if items:
+            return items[0]
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return None
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+
+def next_event_date(fittings_table, transactions_table, account_id, after_iso):
+    """
+    Data da primeira prova/retirada/devolução depois de `after_iso` (exclusivo),
+    ou None. Cada fonte é um query em ordem de data que para no primeiro resultado.
+    """
+    after_key = str(after_iso)[:10] + "\uffff"
+    dates = []
+    fitting = _first_item(fittings_table, {
+        "KeyConditionExpression": Key("account_id").eq(account_id)
+        & Key("date_time_local").gt(after_key),
+        "Limit": 1,
+    })
+    if fitting:
+        dates.append(str(fitting.get("date_time_local") or "")[:10])
+
+    try:
+        pickup = _first_item(transactions_table, {
+            "IndexName": "account_id-rental_date-index",
+            "KeyConditionExpression": Key("account_id").eq(account_id)
+            & Key("rental_date").gt(after_key),
+            "FilterExpression": Attr("transaction_status").is_in(list(ACTIVE_STATUSES)),
+        })
+        ret = _first_item(transactions_table, {
+            "IndexName": "account_id-return_date-index",
+            "KeyConditionExpression": Key("account_id").eq(account_id)
+            & Key("return_date").gt(after_key),
+            "FilterExpression": Attr("transaction_status").eq("rented"),
+        })
+        if pickup:
+            dates.append(str(pickup.get("rental_date") or "")[:10])
+        if ret:
+            dates.append(str(ret.get("return_date") or "")[:10])
+    except ClientError as e:
+        if not _index_missing(e):
+            raise
+        for status in ACTIVE_STATUSES:
+            date_filter = Attr("rental_date").gt(after_key)
+            if status == "rented":
+                date_filter = date_filter | Attr("return_date").gt(after_key)
+            for tx in _query_all(transactions_table, {
+                "IndexName": "account_id-transaction_status-index",
+                "KeyConditionExpression": Key("account_id").eq(account_id)
+                & Key("transaction_status").eq(status),
+                "FilterExpression": date_filter,
+            }):
+                fields = ("rental_date", "return_date") if status == "rented" else ("rental_date",)
+                for field in fields:
+                    date_part = str(tx.get(field) or "")[:10]
+                    if date_part > str(after_iso)[:10]:
+                        dates.append(date_part)
+
+    dates = [d for d in dates if d]
+    return min(dates) if dates else None
+
+
+def upcoming_days(fittings_table, transactions_table, account_id, after_iso, days=WINDOW_DAYS):
+    """
+    Dias com provas/retiradas/devoluções depois de `after_iso` (exclusivo) e até
+    `days` dias depois dele, no formato do template da agenda:
+        [{"date_iso", "fitting_items", "transaction_items"}, ...]
+    Devolve também o cursor da próxima janela: a véspera do próximo evento depois
+    da janela (a janela seguinte começa nele), ou None se não há mais nada.
+    """
+    end_iso = add_days(after_iso, days)
+    sheet = day_sheet(fittings_table, transactions_table, account_id, add_days(after_iso, 1), end_iso)
+    next_date = next_event_date(fittings_table, transactions_table, account_id, end_iso)
+    return sheet_days(sheet), (add_days(next_date, -1) if next_date else None)
+
+
+def past_days(fittings_table, account_id, before_iso, count=PAST_PAGE_DAYS, batch_size=100):
+    """
+    Até `count` dias com provas antes de `before_iso` (exclusivo), do mais recente
+    para o mais antigo. Devolve (dias, cursor) — o cursor é a data mais antiga
+    devolvida, ou None se não há nada mais antigo.
+    """
+    dates = {}
+    order = []
+    query_kwargs = {
+        "KeyConditionExpression": Key("account_id").eq(account_id)
+        & Key("date_time_local").lt(str(before_iso)[:10]),
+        "ScanIndexForward": False,
+        "Limit": batch_size,
+    }
+    has_more = False
+    while True:
+        response = fittings_table.query(**query_kwargs)
+        for fitting in response.get("Items", []):
+            date_part = str(fitting.get("date_time_local") or "")[:10]
+            if not date_part:
+                continue
+            if date_part not in dates:
+                if len(order) == count:
+                    # Já temos os `count` dias; existe ao menos mais um dia antes
+                    has_more = True
+                    break
+                dates[date_part] = []
+                order.append(date_part)
+            dates[date_part].append(fitting)
+        if has_more:
+            break
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            break
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+    result = []
+    for date_iso in order:
+        # Dentro do dia, mantém a ordem de horário
+        result.append({"date_iso": date_iso, "fitting_items": list(reversed(dates[date_iso]))})
+    return result, (order[-1] if has_more else None)
+
+
+def find_fitting(fittings_table, account_id, fitting_id):
+    """
+    Prova pelo fitting_id, via GSI fitting_id-index (migrate_fitting_id_index.py).
+    Só se o índice ainda não existe procura na partição da conta (query paginado);
+    id que o índice não conhece devolve None sem ler o histórico.
+    """
+    if not account_id or not fitting_id:
+        return None
+    try:
+        response = fittings_table.query(
+            IndexName="fitting_id-index",
+            KeyConditionExpression=Key("fitting_id").eq(fitting_id),
+        )
+    except ClientError as e:
+        if not _index_missing(e):
+            raise
+        print(f"Índice fitting_id-index indisponível, buscando prova {fitting_id} na partição: {e}")
+    else:
+        for fitting in response.get("Items", []):
+            if fitting.get("account_id") == account_id:
+                return fitting
+        return None
+
+    query_kwargs = {
+        "KeyConditionExpression": Key("account_id").eq(account_id),
+        "FilterExpression": Attr("fitting_id").eq(fitting_id),
+    }
+    while True:
+        response = fittings_table.query(**query_kwargs)
+        items = response.get("Items", [])
+        if items:
+            return items[0]
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return None
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
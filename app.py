@@ -1,6 +1,6 @@
 import os
 import pytz
-import boto3
+import aws_clients
 from dotenv import load_dotenv
 from boto3.dynamodb.conditions import Key
 
@@ -12,27 +12,10 @@ from jinja2 import ChoiceLoader, FileSystemLoader
 load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))  # only for setting up the env as debug
 
 # Configurações AWS
-aws_region = os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "us-east-1"
-aws_access_key_id = os.getenv("AWS_ACCESS_KEY_ID") or os.getenv("AWS_ACCESS_KEY") or os.getenv("AWS_ACCESS_KEYID")
-aws_secret_access_key = (
-    os.getenv("AWS_SECRET_ACCESS_KEY")
-    or os.getenv("AWS_SECRET_ACCESS")
-    or os.getenv("AWS_SECRET_KEY")
-    or os.getenv("AWS_SECRET")
-)
 s3_bucket_name = "alugueqqc-images"
 
-# Initialize AWS resources
-_aws_kwargs = {"region_name": aws_region}
-if aws_access_key_id and aws_secret_access_key:
-    _aws_kwargs.update(
-        {
-            "aws_access_key_id": aws_access_key_id,
-            "aws_secret_access_key": aws_secret_access_key,
-        }
-    )
-
-dynamodb = boto3.resource("dynamodb", **_aws_kwargs)
+# Initialize AWS resources (clientes compartilhados e com pool; ver aws_clients.py)
+dynamodb = aws_clients.resource("dynamodb")
 
 
 itens_table = dynamodb.Table("alugueqqc_itens")
@@ -72,17 +55,18 @@ _sched_table_name = _resolve_dynamodb_table_name(
 )
 scheduling_config_table = dynamodb.Table(_sched_table_name)
 
-
-s3 = boto3.client(
-    "s3",
-    **_aws_kwargs,
+# Snapshot do catálogo público (ver catalog_snapshot.py / create_catalog_snapshot_table.py)
+catalog_snapshot_table = dynamodb.Table(
+    os.getenv("CATALOG_SNAPSHOT_TABLE", "").strip() or "alugueqqc_catalog_snapshot"
 )
+# Log de visitas + baldes diários (ver visit_recorder.py / visit_buckets.py)
+visits_table = dynamodb.Table("alugueqqc_item_visits")
+
+
+s3 = aws_clients.client("s3")
 
 # Configuração AWS SES para envio de emails
-ses_client = boto3.client(
-    "ses",
-    **_aws_kwargs,
-)
+ses_client = aws_clients.client("ses")
 
 
 # Create Flask app
@@ -134,8 +118,16 @@ init_item_routes(
     users_table,
     text_models_table,
     payment_transactions,
+    catalog_snapshot_table=catalog_snapshot_table,
+    visits_table=visits_table,
+)
+init_status_routes(
+    app,
+    itens_table,
+    transactions_table,
+    users_table,
+    catalog_snapshot_table=catalog_snapshot_table,
 )
-init_status_routes(app, itens_table, transactions_table, users_table)
 init_transaction_routes(
     app, itens_table, s3, s3_bucket_name, transactions_table, clients_table, users_table
 )
@@ -158,6 +150,8 @@ init_static_routes(
     text_models_table,
     users_table,
     payment_transactions,
+    catalog_snapshot_table=catalog_snapshot_table,
+    visits_table=visits_table,
 )
 
 # Provas e Agenda
@@ -342,7 +336,7 @@ def format_currency(value):
         return str(value)
 
 #
-from utils import get_cloudfront_url
+from utils import get_cloudfront_url, image_srcset
 
 # Registrar filtros no Jinja
 app.jinja_env.filters["format_cpf"] = format_cpf
@@ -350,6 +344,7 @@ app.jinja_env.filters["format_cnpj"] = format_cnpj
 app.jinja_env.filters["format_phone"] = format_phone
 app.jinja_env.filters["format_currency"] = format_currency
 app.jinja_env.filters["cloudfront_url"] = get_cloudfront_url
+app.jinja_env.filters["image_srcset"] = image_srcset
 
 from datetime import datetime
 
@@ -0,0 +1,263 @@
+"""
+availability_index.py
+Índice de disponibilidade por conta: os períodos reservados/retirados de cada item.
+
+Fica na users_table, no mesmo esquema de chave de account_settings:
+    user_id = "account_availability:<account_id>"
+
+Atributos (um por transação ativa, para que criar/editar/mudar status seja um
+único SET ou REMOVE, sem ler o documento):
+    "t|<transaction_id>" → "<item_id>|<rental_date>|<return_date>" (datas ISO)
+    initialized_at       → presente só depois de um rebuild completo
+
+Só entram transações com status reserved/rented (devolvidas/excluídas saem do
+documento), então o tamanho acompanha as locações em aberto. rent, edit_transaction, as rotas de status,
+delete_transaction e restore_deleted_transaction chamam sync_transaction.
+
+Limite: é um único item do DynamoDB (máx. 400 KB). Cada atributo ocupa ~80 bytes,
+o que dá folga para alguns milhares de locações em aberto por conta; acima disso o
+índice precisa virar uma linha por item.
+
+A reconstrução preguiçosa (load) não sobrescreve o documento: grava só os
+atributos que faltam, com a condição de ainda não estar inicializado, para não
+perder um sync_transaction que aconteça durante a leitura das transações.
+Para reconstruir: python rebuild_availability_index.py <account_id> | --all
+"""
+
+import bisect
+import datetime
+
+from boto3.dynamodb.conditions import Key
+
+
+ACTIVE_STATUSES = ("reserved", "rented")
+
+# Atributos por update_item na inicialização (UpdateExpression tem limite de 4 KB)
+INIT_CHUNK = 50
+
+
+def availability_key(account_id):
+    return f"account_availability:{account_id}"
+
+
+def _entry_value(transaction):
+    """Valor do atributo para a transação, ou None se ela não ocupa o item."""
+    if not isinstance(transaction, dict):
+        return None
+    if transaction.get("transaction_status") not in ACTIVE_STATUSES:
+        return None
+    item_id = str(transaction.get("item_id") or "").strip()
+    rental_date = str(transaction.get("rental_date") or "")[:10]
+    return_date = str(transaction.get("return_date") or "")[:10]
+    if not item_id or not rental_date or not return_date:
+        return None
+    return f"{item_id}|{rental_date}|{return_date}"
+
+
+def sync_transaction(users_table, transaction, account_id=None):
+    """
+    Grava (ou remove) o período da transação conforme o estado atual dela.
+    account_id só é usado se a transação não trouxer o próprio.
+    """
+    if not isinstance(transaction, dict):
+        return
+    account_id = transaction.get("account_id") or account_id
+    transaction_id = transaction.get("transaction_id")
+    if not account_id or not transaction_id:
+        return
+    value = _entry_value(transaction)
+    update_kwargs = {
+        "Key": {"user_id": availability_key(account_id)},
+        "ExpressionAttributeNames": {"#t": f"t|{transaction_id}"},
+    }
+    if value:
+        update_kwargs["UpdateExpression"] = "SET #t = :v"
+        update_kwargs["ExpressionAttributeValues"] = {":v": value}
+    else:
+        update_kwargs["UpdateExpression"] = "REMOVE #t"
+    try:
+        users_table.update_item(**update_kwargs)
+    except Exception as e:
+        print(f"Erro ao atualizar índice de disponibilidade ({account_id}/{transaction_id}): {e}")
+
+
+def rebuild(users_table, transactions_table, account_id, overwrite=False):
+    """
+    Reconstrói o documento a partir das transações reserved/rented da conta.
+    overwrite=True (script de reparo) substitui o documento inteiro; sem ele, só
+    inicializa um documento que ainda não foi inicializado (ver _initialize).
+    """
+    record = {
+        "user_id": availability_key(account_id),
+        "initialized_at": datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    for status in ACTIVE_STATUSES:
+        query_kwargs = {
+            "IndexName": "account_id-transaction_status-index",
+            "KeyConditionExpression": Key("account_id").eq(account_id)
+            & Key("transaction_status").eq(status),
+            "ProjectionExpression": "transaction_id, item_id, rental_date, return_date, transaction_status",
+        }
+        while True:
+            response = transactions_table.query(**query_kwargs)
+            for tx in response.get("Items", []):
+                value = _entry_value(tx)
+                if value:
+                    record[f"t|{tx['transaction_id']}"] = value
+            last_evaluated_key = response.get("LastEvaluatedKey")
+            if not last_evaluated_key:
+                break
+            query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+    if overwrite:
+        users_table.put_item(Item=record)
+        return record
+    return _initialize(users_table, record)
+
+
+def _initialize(users_table, record):
+    """
+    Grava os períodos com if_not_exists (um SET de sync_transaction feito durante
+    a reconstrução prevalece), em lotes condicionados a attribute_not_exists
+    (initialized_at); initialized_at entra no último lote. Se outra requisição
+    inicializou antes, fica com o documento dela. Devolve o documento gravado.
+    """
+    key = {"user_id": record["user_id"]}
+    attrs = [a for a in record if a.startswith("t|")]
+    chunks = [attrs[i : i + INIT_CHUNK] for i in range(0, len(attrs), INIT_CHUNK)] or [[]]
+    client = users_table.meta.client
+    response = {}
+    for n, chunk in enumerate(chunks):
+        names = {"#init": "initialized_at"}
+        values = {}
+        parts = []
+        for i, attr in enumerate(chunk):
+            names[f"#t{i}"] = attr
+            values[f":t{i}"] = record[attr]
+            parts.append(f"#t{i} = if_not_exists(#t{i}, :t{i})")
+        if n == len(chunks) - 1:
+            values[":init"] = record["initialized_at"]
+            parts.append("#init = :init")
+        try:
+            response = users_table.update_item(
+                Key=key,
+                UpdateExpression="SET " + ", ".join(parts),
+                ConditionExpression="attribute_not_exists(#init)",
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+                ReturnValues="ALL_NEW",
+            )
+        except client.exceptions.ConditionalCheckFailedException:
+            return users_table.get_item(Key=key, ConsistentRead=True).get("Item") or {}
+    return response.get("Attributes") or record
+
+
+def load(users_table, account_id, transactions_table=None):
+    """
+    Lê o documento (1 get_item consistente) e devolve o índice em memória:
+        {
+          "items":  {item_id: [(início, fim, transaction_id), ...] ordenado por início},
+          "starts": [início, ...] de todos os períodos, ordenado,
+          "spans":  [(início, fim, item_id, transaction_id), ...] na mesma ordem,
+          "max_end": máximo acumulado de fim ao longo de "spans",
+        }
+    Se o documento não foi inicializado e transactions_table foi passada, reconstrói.
+    """
+    record = {}
+    if account_id:
+        try:
+            record = users_table.get_item(
+                Key={"user_id": availability_key(account_id)}, ConsistentRead=True
+            ).get("Item") or {}
+        except Exception as e:
+            print(f"Erro ao ler índice de disponibilidade da conta {account_id}: {e}")
+
+        if not record.get("initialized_at") and transactions_table is not None:
+            try:
+                record = rebuild(users_table, transactions_table, account_id)
+            except Exception as e:
+                print(f"Erro ao reconstruir índice de disponibilidade da conta {account_id}: {e}")
+
+    spans = []
+    for attr, value in record.items():
+        if not attr.startswith("t|"):
+            continue
+        parts = str(value).split("|")
+        if len(parts) != 3:
+            continue
+        item_id, start, end = parts
+        spans.append((start, end, item_id, attr[2:]))
+
+    spans.sort()
+    items = {}
+    max_end = []
+    running = ""
+    for start, end, item_id, transaction_id in spans:
+        items.setdefault(item_id, []).append((start, end, transaction_id))
+        running = max(running, end)
+        max_end.append(running)
+
+    return {
+        "items": items,
+        "starts": [s[0] for s in spans],
+        "spans": spans,
+        "max_end": max_end,
+    }
+
+
+def item_ranges(index, item_id, exclude_transaction_id=None):
+    """[[início, fim], ...] do item, no formato que os templates de calendário usam."""
+    return [
+        [start, end]
+        for start, end, transaction_id in (index or {}).get("items", {}).get(str(item_id), [])
+        if transaction_id != exclude_transaction_id
+    ]
+
+
+def conflicts(index, item_id, start, end, exclude_transaction_id=None):
+    """Períodos do item que se sobrepõem a [start, end] (datas ISO, inclusivas)."""
+    spans = (index or {}).get("items", {}).get(str(item_id), [])
+    # Só os períodos que começam até `end` podem sobrepor
+    limit = bisect.bisect_right(spans, (end, "\uffff", "\uffff"))
+    return [
+        (s, e, transaction_id)
+        for s, e, transaction_id in spans[:limit]
+        if e >= start and transaction_id != exclude_transaction_id
+    ]
+
+
+def has_conflict(index, item_id, start, end, exclude_transaction_id=None):
+    return bool(conflicts(index, item_id, start, end, exclude_transaction_id))
+
+
+def busy_items(index, start, end):
+    """
+    Itens com algum período sobreposto a [start, end]. Busca binária pelos períodos
+    que começam até `end` e, de trás para frente, para assim que o máximo acumulado
+    de fim fica antes de `start` (nenhum período anterior pode sobrepor).
+    """
+    index = index or {}
+    starts = index.get("starts") or []
+    spans = index.get("spans") or []
+    max_end = index.get("max_end") or []
+    busy = set()
+    i = bisect.bisect_right(starts, end) - 1
+    while i >= 0 and max_end[i] >= start:
+        span_start, span_end, item_id, _ = spans[i]
+        if span_end >= start:
+            busy.add(item_id)
+        i -= 1
+    return busy
+
+
+def parse_dates(start_value, end_value):
+    """Par de datas ISO (inputs type=date); fim vazio = mesmo dia do início."""
+    try:
+        start = datetime.date.fromisoformat(str(start_value or "").strip()[:10])
+        end_text = str(end_value or "").strip()[:10]
+        end = datetime.date.fromisoformat(end_text) if end_text else start
+    except ValueError:
+        return None, None
+    if end < start:
+        start, end = end, start
+    return start.isoformat(), end.isoformat()
@@ -0,0 +1,111 @@
+"""
+aws_clients.py
+Clientes AWS compartilhados pelo processo inteiro (uma sessão, um pool por serviço).
+
+Clientes do botocore são thread-safe; o que não é thread-safe é criar clientes a
+partir da mesma Session, por isso a criação fica sob lock e o resultado em cache.
+Assim nenhuma rota monta boto3.resource/client por requisição (nem refaz TLS).
+
+    from aws_clients import client, resource, table
+    s3 = client("s3")
+    itens_table = table("alugueqqc_itens")
+
+Ajustes por variável de ambiente:
+    AWS_MAX_POOL_CONNECTIONS  conexões por cliente (padrão: threads do worker + folga)
+    AWS_MAX_ATTEMPTS          tentativas no modo de retry adaptativo (padrão 5)
+    AWS_CONNECT_TIMEOUT / AWS_READ_TIMEOUT  em segundos (padrão 3 / 10)
+"""
+
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+
+_lock = threading.Lock()
+_state = {"session": None, "config": None}
+_clients = {}
+_resources = {}
+_tables = {}
+
+
+def aws_kwargs():
+    """Região e credenciais a partir do ambiente (mesmas variáveis aceitas pelo app)."""
+    region = os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "us-east-1"
+    access_key = os.getenv("AWS_ACCESS_KEY_ID") or os.getenv("AWS_ACCESS_KEY") or os.getenv("AWS_ACCESS_KEYID")
+    secret_key = (
+        os.getenv("AWS_SECRET_ACCESS_KEY")
+        or os.getenv("AWS_SECRET_ACCESS")
+        or os.getenv("AWS_SECRET_KEY")
+        or os.getenv("AWS_SECRET")
+    )
+    kwargs = {"region_name": region}
+    if access_key and secret_key:
+        kwargs.update({"aws_access_key_id": access_key, "aws_secret_access_key": secret_key})
+    return kwargs
+
+
+def _pool_size():
+    configured = os.getenv("AWS_MAX_POOL_CONNECTIONS", "").strip()
+    if configured.isdigit() and int(configured) > 0:
+        return int(configured)
+    # Threads de requisição do worker + threads de fundo (visit_recorder, uploads)
+    threads = os.getenv("GUNICORN_THREADS", "").strip() or os.getenv("WEB_THREADS", "").strip()
+    threads = int(threads) if threads.isdigit() else 1
+    return max(10, threads * 2 + 8)
+
+
+def boto_config():
+    if _state["config"] is None:
+        _state["config"] = Config(
+            max_pool_connections=_pool_size(),
+            retries={
+                "mode": "adaptive",
+                "max_attempts": int(os.getenv("AWS_MAX_ATTEMPTS", "5")),
+            },
+            connect_timeout=float(os.getenv("AWS_CONNECT_TIMEOUT", "3")),
+            read_timeout=float(os.getenv("AWS_READ_TIMEOUT", "10")),
+            tcp_keepalive=True,
+        )
+    return _state["config"]
+
+
+def _session():
+    if _state["session"] is None:
+        _state["session"] = boto3.session.Session(**aws_kwargs())
+    return _state["session"]
+
+
+def client(service):
+    """Cliente de baixo nível compartilhado (s3, ses, dynamodb...)."""
+    found = _clients.get(service)
+    if found is not None:
+        return found
+    with _lock:
+        if service not in _clients:
+            _clients[service] = _session().client(service, config=boto_config())
+        return _clients[service]
+
+
+def resource(service="dynamodb"):
+    """Resource compartilhado (criado uma vez, com o mesmo Config de pool/retry)."""
+    found = _resources.get(service)
+    if found is not None:
+        return found
+    with _lock:
+        if service not in _resources:
+            _resources[service] = _session().resource(service, config=boto_config())
+        return _resources[service]
+
+
+def table(name):
+    """Tabela DynamoDB (objeto leve sobre o resource compartilhado)."""
+    found = _tables.get(name)
+    if found is not None:
+        return found
+    dynamodb = resource("dynamodb")
+    with _lock:
+        if name not in _tables:
+            _tables[name] = dynamodb.Table(name)
+        return _tables[name]
@@ -0,0 +1,82 @@
+"""
+Cria a contagem de referências (image_refs.py) das fotos já existentes, contando
+quantos itens (inclusive na lixeira) apontam para cada foto.
+
+Fotos sem contagem nunca são apagadas do S3 pelo app, então rodar o backfill
+depois do deploy é seguro. Registros que já existem (fotos enviadas depois do
+deploy) não são alterados.
+
+    python backfill_image_refs.py [--dry-run]
+"""
+
+import argparse
+import os
+from collections import Counter
+
+import boto3
+from dotenv import load_dotenv
+
+import image_refs
+
+load_dotenv()
+
+
+def backfill(dry_run=False):
+    dynamodb = boto3.resource(
+        "dynamodb",
+        region_name=os.getenv("AWS_REGION", "us-east-1"),
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    )
+    itens_table = dynamodb.Table("alugueqqc_itens")
+    users_table = dynamodb.Table("alugueqqc_users")
+
+    refs = Counter()
+    renditions = {}
+    scan_kwargs = {
+        "ProjectionExpression": "item_id, item_image_url, item_image_urls, image_url, item_image_renditions",
+    }
+    while True:
+        response = itens_table.scan(**scan_kwargs)
+        for item in response.get("Items", []):
+            item_renditions = item.get("item_image_renditions") or {}
+            for url in image_refs.item_image_urls(item):
+                key = image_refs.s3_key_from_url(url)
+                refs[key] += 1
+                if isinstance(item_renditions.get(url), dict):
+                    renditions[key] = item_renditions[url]
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            break
+        scan_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+    print(f"{len(refs)} fotos referenciadas por itens.")
+    client = users_table.meta.client
+    written = 0
+    existing = 0
+    for key, count in refs.items():
+        if dry_run:
+            print(f"[PLAN] {key}: {count} referência(s)")
+            continue
+        try:
+            users_table.put_item(
+                Item={
+                    **image_refs.ref_key(key),
+                    "refs": count,
+                    "stored": True,
+                    "renditions": renditions.get(key) or {},
+                },
+                ConditionExpression="attribute_not_exists(user_id)",
+            )
+            written += 1
+        except client.exceptions.ConditionalCheckFailedException:
+            existing += 1
+    if not dry_run:
+        print(f"[OK] {written} contagens criadas, {existing} já existiam.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Só mostra o que seria gravado")
+    args = parser.parse_args()
+    backfill(dry_run=args.dry_run)
@@ -0,0 +1,63 @@
+"""
+Cria os registros de mapeamento slug→conta (account_slugs.py) para os slugs já
+salvos em scheduling_config (config_key = "account_slug").
+
+Rode antes do deploy: sem mapeamento, o slug não é achado pela agenda pública
+(a não ser com ACCOUNT_SLUG_LEGACY_SCAN=1, que volta a usar o scan antigo).
+
+    python backfill_slug_mappings.py [--dry-run]
+"""
+
+import argparse
+import os
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+from dotenv import load_dotenv
+
+import account_slugs
+
+load_dotenv()
+
+TABLE_NAME = os.getenv("SCHEDULING_CONFIG_TABLE", "").strip() or "alugueqqc_scheduling_config_table"
+
+
+def backfill(dry_run=False):
+    dynamodb = boto3.resource(
+        "dynamodb",
+        region_name=os.getenv("AWS_REGION", "us-east-1"),
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    )
+    table = dynamodb.Table(TABLE_NAME)
+    scan_kwargs = {"FilterExpression": Attr("config_key").eq("account_slug")}
+    written = 0
+    conflicts = 0
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get("Items", []):
+            slug = str(item.get("slug") or "").strip().lower()
+            if not slug:
+                continue
+            if dry_run:
+                print(f"[PLAN] {slug} -> {item['account_id']}")
+                continue
+            if account_slugs.write_mapping(table, item["account_id"], slug, item.get("business_name", "")):
+                written += 1
+                print(f"[OK] {slug} -> {item['account_id']}")
+            else:
+                conflicts += 1
+                print(f"[CONFLITO] {slug} já mapeado para outra conta (registro de {item['account_id']})")
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            break
+        scan_kwargs["ExclusiveStartKey"] = last_evaluated_key
+    if not dry_run:
+        print(f"{written} mapeamentos gravados, {conflicts} conflitos.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Só mostra o que seria feito")
+    args = parser.parse_args()
+    backfill(dry_run=args.dry_run)
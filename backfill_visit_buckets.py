@@ -0,0 +1,77 @@
+"""
+Preenche os baldes diários de visitas (ver visit_buckets.py) a partir dos
+registros brutos que ainda estão na tabela alugueqqc_item_visits (TTL de 30 dias).
+Rodar uma vez, logo depois do deploy, para não começar a janela de 30 dias zerada.
+Sobrescreve os baldes existentes dos dias encontrados.
+
+    python backfill_visit_buckets.py
+"""
+
+import os
+
+import boto3
+from dotenv import load_dotenv
+
+import dynamo_batch
+import visit_buckets
+
+
+def main():
+    load_dotenv()
+    dynamodb = boto3.resource(
+        "dynamodb",
+        region_name=os.getenv("AWS_REGION", "us-east-1"),
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    )
+    visits_table = dynamodb.Table(visit_buckets.VISITS_TABLE_NAME)
+    itens_table = dynamodb.Table("alugueqqc_itens")
+
+    # {(item_id, dia): visitas}
+    per_day = {}
+    scan_kwargs = {
+        "ProjectionExpression": "item_id, #ts",
+        "ExpressionAttributeNames": {"#ts": "timestamp"},
+    }
+    while True:
+        response = visits_table.scan(**scan_kwargs)
+        for row in response.get("Items", []):
+            item_id = str(row.get("item_id") or "")
+            ts = str(row.get("timestamp") or "")
+            if not item_id or item_id.startswith("daily#") or len(ts) < 10:
+                continue
+            key = (item_id, ts[:10])
+            per_day[key] = per_day.get(key, 0) + 1
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    item_ids = sorted({item_id for item_id, _ in per_day})
+    account_by_item = {}
+    for row in dynamo_batch.batch_get_items(itens_table, item_ids, "item_id"):
+        if row and row.get("account_id"):
+            account_by_item[str(row["item_id"])] = row["account_id"]
+
+    # {(account_id, dia): {item_id: visitas}}
+    buckets = {}
+    for (item_id, day), n in per_day.items():
+        account_id = account_by_item.get(item_id)
+        if account_id:
+            buckets.setdefault((account_id, day), {})[item_id] = n
+
+    with visits_table.batch_writer() as batch:
+        for (account_id, day), counts in sorted(buckets.items()):
+            record = {
+                "item_id": visit_buckets.bucket_partition(account_id),
+                "timestamp": day,
+                "ttl": visit_buckets.bucket_ttl(day),
+            }
+            for item_id, n in counts.items():
+                record[f"v|{item_id}"] = n
+            batch.put_item(Item=record)
+
+    print(f"[OK] {len(buckets)} baldes gravados ({len(per_day)} pares item/dia).")
+
+
+if __name__ == "__main__":
+    main()
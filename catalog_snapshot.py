@@ -0,0 +1,448 @@
+"""
+catalog_snapshot.py
+Snapshot materializado do catálogo público ("/" e "/catalogo").
+
+Em vez de varrer a tabela de itens inteira a cada acesso, cada conta pública
+mantém uma tabela de snapshot com:
+  - PK: account_id (str)
+  - SK: entry_key (str)
+      "item#<item_id>" → campos projetados do item + ocasiões já resolvidas
+      "idx#<item_id>"  → entrada compacta do índice (ocasiões, cores, tamanhos,
+                          visitas totais), uma linha pequena por item
+      "meta"           → marca que o snapshot da conta já foi construído
+
+A página do catálogo lê as linhas "idx#" (query na partição, em cache por
+INDEX_CACHE_TTL segundos em cada processo), ordena em memória com as visitas
+recentes e busca apenas os itens da página (batch_get_item). Nada é gravado na
+leitura.
+
+O snapshot é atualizado item a item quando add_item, edit_item, mark_archived,
+mark_available e delete tocam um item de conta pública (cada item só regrava as
+suas duas linhas); o visit_recorder atualiza as visitas totais da linha "idx#".
+Para construir do zero (obrigatório depois de criar a tabela):
+rebuild_catalog_snapshot.py.
+"""
+
+import os
+import pickle
+import re
+import threading
+import time
+import unicodedata
+
+from boto3.dynamodb.conditions import Key
+
+import dynamo_batch
+
+
+# Account ID principal da London Noivas
+LONDON_NOIVAS_ACCOUNT_ID = "37d5b37f-c920-4090-a682-7e1ed2e31a0f"
+
+ITEM_PREFIX = "item#"
+INDEX_PREFIX = "idx#"
+META_KEY = "meta"
+
+INDEX_CACHE_TTL = float(os.getenv("CATALOG_INDEX_TTL_SECONDS", "60"))
+
+OCCASION_LABELS = {
+    "madrinha": "Madrinha",
+    "formatura": "Formatura",
+    "gala": "Gala",
+    "debutante": "Debutante",
+    "convidada": "Convidada",
+    "mae_dos_noivos": "Mãe dos Noivos",
+    "noiva": "Noiva",
+    "civil": "Civil",
+}
+
+# Campos usados pelos cards/modal do catálogo (templates/catalogo.html)
+PROJECTED_FIELDS = [
+    "item_id",
+    "account_id",
+    "status",
+    "title",
+    "item_title",
+    "item_description",
+    "description",
+    "item_obs",
+    "item_value",
+    "item_custom_id",
+    "item_image_url",
+    "item_image_urls",
+    "item_main_image_index",
+    "item_image_renditions",
+    "cor",
+    "cores",
+    "cor_base",
+    "cor_comercial",
+    "corCommercial",
+    "tamanho",
+    "size",
+    "visit_count",
+] + [f"occasion_{slug}" for slug in OCCASION_LABELS]
+
+
+_ai_meta_cache = {"mtime": None, "by_id": None}
+
+
+def get_public_account_ids():
+    env_ids = os.getenv("PUBLIC_CATALOG_ACCOUNT_IDS", "").strip()
+    public_account_ids = [
+        v.strip()
+        for v in ([env_ids] if env_ids and "," not in env_ids else env_ids.split(","))
+        if v.strip()
+    ]
+    if not public_account_ids:
+        public_account_ids = [LONDON_NOIVAS_ACCOUNT_ID, "london_noivas"]
+    return public_account_ids
+
+
+def is_public_account(account_id):
+    return bool(account_id) and str(account_id) in get_public_account_ids()
+
+
+def normalize_text(text):
+    text = str(text or "").lower()
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join([c for c in text if not unicodedata.combining(c)])
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+
+def slugify(text):
+    text = normalize_text(text)
+    text = re.sub(r"[^a-z0-9]+", "-", text).strip("-")
+    return text
+
+
+def load_ai_meta_by_id():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    pkl_path = os.path.join(base_dir, "vector_store_metadata.pkl")
+    if not os.path.exists(pkl_path):
+        _ai_meta_cache["mtime"] = None
+        _ai_meta_cache["by_id"] = {}
+        return _ai_meta_cache["by_id"]
+
+    try:
+        mtime = os.path.getmtime(pkl_path)
+        if _ai_meta_cache["by_id"] is not None and _ai_meta_cache["mtime"] == mtime:
+            return _ai_meta_cache["by_id"]
+
+        with open(pkl_path, "rb") as f:
+            raw = pickle.load(f)
+
+        by_id = {}
+        if isinstance(raw, list):
+            for entry in raw:
+                if not isinstance(entry, dict):
+                    continue
+                cid = entry.get("custom_id") or entry.get("item_id")
+                if cid:
+                    by_id[str(cid)] = entry
+
+        _ai_meta_cache["mtime"] = mtime
+        _ai_meta_cache["by_id"] = by_id
+        return by_id
+    except Exception:
+        _ai_meta_cache["mtime"] = None
+        _ai_meta_cache["by_id"] = {}
+        return _ai_meta_cache["by_id"]
+
+
+def resolve_item_occasions(item):
+    if not isinstance(item, dict):
+        return []
+
+    # Flags do DynamoDB primeiro
+    occasions = []
+    for slug, label in OCCASION_LABELS.items():
+        if item.get(f"occasion_{slug}") == "1":
+            occasions.append(label)
+
+    if occasions:
+        return occasions
+
+    # Fallback para metadados da IA se nenhuma flag estiver marcada
+    meta_by_id = load_ai_meta_by_id()
+    item_id = item.get("item_id")
+    if item_id and str(item_id) in meta_by_id:
+        meta = meta_by_id.get(str(item_id)) or {}
+        mf = meta.get("metadata_filters")
+        if isinstance(mf, dict):
+            occ = mf.get("occasions")
+            if isinstance(occ, list):
+                return [str(o) for o in occ if str(o).strip()]
+    return []
+
+
+def item_commercial_colors(item):
+    raw_color = item.get("cor_comercial") or item.get("corCommercial")
+    colors = raw_color if isinstance(raw_color, list) else [raw_color]
+    return [c.strip() for c in colors if isinstance(c, str) and c.strip()]
+
+
+def item_sizes(item):
+    raw_size = item.get("tamanho") or item.get("size")
+    sizes = raw_size if isinstance(raw_size, list) else [raw_size]
+    expanded = []
+    for s in sizes:
+        if not isinstance(s, str):
+            continue
+        parts = [p.strip() for p in s.split(",")]
+        expanded.extend([p for p in parts if p])
+    return expanded
+
+
+def _to_int(value):
+    try:
+        return int(value or 0)
+    except (ValueError, TypeError):
+        return 0
+
+
+def project_item(item):
+    projected = {k: item[k] for k in PROJECTED_FIELDS if k in item and item[k] not in (None, "")}
+    occasions = resolve_item_occasions(item)
+    projected["_occasions"] = occasions
+    projected["category"] = occasions[0] if occasions else "Outros"
+    return projected
+
+
+def build_index_entry(item):
+    """Entrada compacta do índice: ocasiões (slugs), cores, tamanhos e visitas."""
+    occasions = resolve_item_occasions(item)
+    return {
+        "o": sorted({slugify(o) for o in occasions if slugify(o)}),
+        "c": item_commercial_colors(item),
+        "s": item_sizes(item),
+        "v": _to_int(item.get("visit_count")),
+    }
+
+
+def ranking_key(item_id, entry):
+    """
+    Mesma ordem de antes: primeiro itens com visitas recentes, depois itens com
+    visitas totais e por último o restante (todos em ordem decrescente).
+    """
+    rv = _to_int(entry.get("r"))
+    vc = _to_int(entry.get("v"))
+    group = 2 if rv > 0 else (1 if vc > 0 else 0)
+    return (group, rv, vc, str(item_id))
+
+
+def compute_order(entries):
+    return [
+        iid
+        for iid, _ in sorted(
+            entries.items(), key=lambda kv: ranking_key(kv[0], kv[1]), reverse=True
+        )
+    ]
+
+
+def _item_key(account_id, item_id):
+    return {"account_id": account_id, "entry_key": f"{ITEM_PREFIX}{item_id}"}
+
+
+def _index_key(account_id, item_id):
+    return {"account_id": account_id, "entry_key": f"{INDEX_PREFIX}{item_id}"}
+
+
+def _meta_key(account_id):
+    return {"account_id": account_id, "entry_key": META_KEY}
+
+
+_index_lock = threading.Lock()
+_index_cache = {}  # {account_id: (expira_em, {item_id: entrada})}
+
+
+def invalidate_index(account_id):
+    with _index_lock:
+        _index_cache.pop(account_id, None)
+
+
+def _query_entries(snapshot_table, account_id):
+    entries = {}
+    query_kwargs = {
+        "KeyConditionExpression": Key("account_id").eq(account_id)
+        & Key("entry_key").begins_with(INDEX_PREFIX),
+    }
+    while True:
+        resp = snapshot_table.query(**query_kwargs)
+        for row in resp.get("Items", []):
+            entries[row["entry_key"][len(INDEX_PREFIX):]] = {
+                "o": list(row.get("o") or []),
+                "c": list(row.get("c") or []),
+                "s": list(row.get("s") or []),
+                "v": _to_int(row.get("v")),
+            }
+        if "LastEvaluatedKey" not in resp:
+            return entries
+        query_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def load_index(snapshot_table, account_id, recent_map=None):
+    """
+    Índice da conta: {"account_id", "entries": {item_id: entrada}, "order": [...]},
+    com as visitas recentes ("r") de recent_map e a ordenação calculada aqui.
+    Retorna None se o snapshot da conta ainda não foi construído.
+    """
+    with _index_lock:
+        cached = _index_cache.get(account_id)
+    if cached and cached[0] > time.time():
+        stored = cached[1]
+    else:
+        try:
+            stored = _query_entries(snapshot_table, account_id)
+            if not stored and not snapshot_table.get_item(Key=_meta_key(account_id)).get("Item"):
+                print(f"Snapshot do catálogo não construído ({account_id}); rode rebuild_catalog_snapshot.py")
+                return None
+        except Exception as e:
+            print(f"Erro ao carregar índice do catálogo ({account_id}): {e}")
+            return None
+        with _index_lock:
+            _index_cache[account_id] = (time.time() + INDEX_CACHE_TTL, stored)
+
+    recent_map = recent_map or {}
+    entries = {iid: {**entry, "r": _to_int(recent_map.get(iid, 0))} for iid, entry in stored.items()}
+    return {"account_id": account_id, "entries": entries, "order": compute_order(entries)}
+
+
+def upsert_item(snapshot_table, item):
+    account_id = item.get("account_id")
+    item_id = item.get("item_id")
+    if not account_id or not item_id:
+        return
+
+    row = project_item(item)
+    row.update(_item_key(account_id, item_id))
+    snapshot_table.put_item(Item=row)
+    snapshot_table.put_item(Item={**_index_key(account_id, item_id), **build_index_entry(item)})
+    invalidate_index(account_id)
+
+
+def remove_item(snapshot_table, account_id, item_id):
+    if not account_id or not item_id:
+        return
+
+    snapshot_table.delete_item(Key=_index_key(account_id, item_id))
+    snapshot_table.delete_item(Key=_item_key(account_id, item_id))
+    invalidate_index(account_id)
+
+
+def update_visit_count(snapshot_table, account_id, item_id, visit_count):
+    """Visitas totais do item no índice (só se o item está no snapshot)."""
+    if snapshot_table is None or not is_public_account(account_id) or not item_id:
+        return
+    try:
+        snapshot_table.update_item(
+            Key=_index_key(account_id, item_id),
+            UpdateExpression="SET v = :v",
+            ConditionExpression="attribute_exists(entry_key)",
+            ExpressionAttributeValues={":v": _to_int(visit_count)},
+        )
+    except snapshot_table.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+    except Exception as e:
+        print(f"Erro ao atualizar visitas no snapshot do catálogo ({item_id}): {e}")
+
+
+def sync_item(snapshot_table, item):
+    """Reflete o estado atual de um item no snapshot (inclui/atualiza/remove)."""
+    if snapshot_table is None or not isinstance(item, dict):
+        return
+    account_id = item.get("account_id")
+    if not is_public_account(account_id):
+        return
+    try:
+        if item.get("status") == "available":
+            upsert_item(snapshot_table, item)
+        else:
+            remove_item(snapshot_table, account_id, item.get("item_id"))
+    except Exception as e:
+        print(f"Erro ao atualizar snapshot do catálogo: {e}")
+
+
+def sync_item_by_id(snapshot_table, itens_table, item_id, account_id=None):
+    """Relê o item e sincroniza. Se account_id não for público, nem consulta."""
+    if snapshot_table is None or not item_id:
+        return
+    if account_id is not None and not is_public_account(account_id):
+        return
+    try:
+        resp = itens_table.get_item(Key={"item_id": item_id}, ConsistentRead=True)
+    except Exception as e:
+        print(f"Erro ao buscar item para o snapshot do catálogo: {e}")
+        return
+    item = resp.get("Item")
+    if item:
+        sync_item(snapshot_table, item)
+    elif account_id:
+        try:
+            remove_item(snapshot_table, account_id, item_id)
+        except Exception as e:
+            print(f"Erro ao remover item do snapshot do catálogo: {e}")
+
+
+def rebuild_account_snapshot(snapshot_table, itens_table, account_id):
+    """
+    Reconstrói o snapshot de uma conta a partir do GSI account_id-status-index.
+    Retorna quantos itens ficaram no snapshot.
+    """
+    items = []
+    query_kwargs = {
+        "IndexName": "account_id-status-index",
+        "KeyConditionExpression": Key("account_id").eq(account_id) & Key("status").eq("available"),
+    }
+    while True:
+        resp = itens_table.query(**query_kwargs)
+        items.extend(resp.get("Items", []))
+        if "LastEvaluatedKey" not in resp:
+            break
+        query_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    # GSI pode não projetar todos os campos: busca os itens completos em lotes
+    ids = [i["item_id"] for i in items if i.get("item_id")]
+    full_items = dynamo_batch.batch_get_items(itens_table, ids, key_name="item_id")
+
+    existing_keys = set()
+    query_kwargs = {
+        "KeyConditionExpression": Key("account_id").eq(account_id),
+        "ProjectionExpression": "entry_key",
+    }
+    while True:
+        resp = snapshot_table.query(**query_kwargs)
+        existing_keys.update(r["entry_key"] for r in resp.get("Items", []))
+        if "LastEvaluatedKey" not in resp:
+            break
+        query_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    existing_keys.discard(META_KEY)
+
+    total = 0
+    with snapshot_table.batch_writer(overwrite_by_pkeys=["account_id", "entry_key"]) as batch:
+        for item in full_items:
+            if item.get("status") != "available":
+                continue
+            item_id = item["item_id"]
+            row = project_item(item)
+            row.update(_item_key(account_id, item_id))
+            batch.put_item(Item=row)
+            batch.put_item(Item={**_index_key(account_id, item_id), **build_index_entry(item)})
+            existing_keys.discard(row["entry_key"])
+            existing_keys.discard(f"{INDEX_PREFIX}{item_id}")
+            total += 1
+
+        # Itens que saíram do catálogo (e o documento "index" da versão anterior)
+        for stale_key in existing_keys:
+            batch.delete_item(Key={"account_id": account_id, "entry_key": stale_key})
+
+    snapshot_table.put_item(Item={**_meta_key(account_id), "built_at": int(time.time()), "items": total})
+    invalidate_index(account_id)
+    return total
+
+
+def get_page_rows(snapshot_table, account_item_ids):
+    """Busca as linhas projetadas dos itens [(account_id, item_id), ...] na ordem."""
+    return dynamo_batch.batch_get_keys(
+        snapshot_table,
+        [_item_key(acc, iid) for acc, iid in account_item_ids],
+    )
@@ -1,8 +1,9 @@
 import datetime
 import uuid
 from boto3.dynamodb.conditions import Key
-from utils import get_user_timezone
+from utils import get_user_timezone, compilar_filtros_dinamicos
 import schemas
+import account_counters
 import os
 from decimal import Decimal, InvalidOperation
 
@@ -195,6 +196,7 @@ def init_client_routes(
         batch_size = 10
         last_valid_cliente = None
         raw_last_evaluated_key = None
+        atende_filtros = compilar_filtros_dinamicos(filtros, fields_config)
 
         while len(valid_clientes) < limit:
             query_kwargs = {
@@ -213,13 +215,11 @@ def init_client_routes(
             if not clientes:
                 break
 
-            from utils import entidade_atende_filtros_dinamico  # certifique-se de importar isso corretamente
-
             for cliente in clientes:
                 if cliente.get("status") == "deleted":
                     continue
 
-                if not entidade_atende_filtros_dinamico(cliente, filtros, fields_config):
+                if not atende_filtros(cliente):
                     continue
 
                 valid_clientes.append(cliente)
@@ -531,6 +531,7 @@ def init_client_routes(
 
             try:
                 clients_table.put_item(Item=new_client)
+                account_counters.client_added(users_table, account_id)
                 flash("Cliente adicionado com sucesso!", "success")
                 return redirect(next_page)
             except Exception as e:
@@ -741,7 +742,11 @@ def init_client_routes(
             return redirect(url_for("login"))
 
         try:
-            clients_table.delete_item(Key={"client_id": client_id})
+            removed = clients_table.delete_item(
+                Key={"client_id": client_id}, ReturnValues="ALL_OLD"
+            ).get("Attributes")
+            if removed:
+                account_counters.client_added(users_table, removed.get("account_id"), delta=-1)
             flash("Cliente excluído definitivamente.", "success")
         except Exception as e:
             print(f"Erro ao excluir cliente definitivamente: {e}")
@@ -760,9 +765,9 @@ def init_client_routes(
             "client_transactions.html",
             "Transações do cliente",
             transactions_table,
+            users_table,
             itens_table,
             text_models_table,
-            users_table,
             client_id=client_id,
         )
 
@@ -0,0 +1,105 @@
+"""
+Cria os GSIs de data em alugueqqc_transactions usados pela folha do dia
+(agenda_engine.day_sheet):
+
+    account_id-rental_date-index   (account_id HASH, rental_date RANGE)
+    account_id-return_date-index   (account_id HASH, return_date RANGE)
+
+São esparsos: só entram transações que têm a data gravada. Projeção ALL, porque
+a agenda mostra os dados da transação direto do índice.
+
+    python create_transaction_date_gsis.py
+"""
+
+import os
+import time
+
+import boto3
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TABLE_NAME = "alugueqqc_transactions"
+INDEXES = [
+    ("account_id-rental_date-index", "rental_date"),
+    ("account_id-return_date-index", "return_date"),
+]
+
+
+def _wait_active(dynamodb, index_name):
+    print("   Aguardando índice ficar ACTIVE (pode demorar)...")
+    while True:
+        time.sleep(5)
+        try:
+            desc = dynamodb.describe_table(TableName=TABLE_NAME)
+        except Exception as e:
+            print(f"   [WARN] Erro ao checar status: {e}. Retentando...")
+            continue
+        gsi = next(
+            (g for g in desc["Table"].get("GlobalSecondaryIndexes", []) if g["IndexName"] == index_name),
+            None,
+        )
+        status = gsi.get("IndexStatus") if gsi else None
+        print(f"   Status atual: {status}")
+        if status == "ACTIVE":
+            return True
+        if status == "FAILED":
+            print(f"   [ERRO] Falha ao criar índice {index_name}")
+            return False
+
+
+def create_transaction_date_gsis():
+    print("--- Criando GSIs de data das transações ---")
+    dynamodb = boto3.client(
+        "dynamodb",
+        region_name=os.getenv("AWS_REGION", "us-east-1"),
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    )
+
+    desc = dynamodb.describe_table(TableName=TABLE_NAME)
+    billing_mode = desc["Table"].get("BillingModeSummary", {}).get("BillingMode", "PROVISIONED")
+    existing_indexes = [g["IndexName"] for g in desc["Table"].get("GlobalSecondaryIndexes", [])]
+    print(f"Índices existentes: {existing_indexes}")
+
+    for index_name, date_attr in INDEXES:
+        if index_name in existing_indexes:
+            print(f"[SKIP] Índice {index_name} já existe.")
+            continue
+
+        create_index = {
+            "Create": {
+                "IndexName": index_name,
+                "KeySchema": [
+                    {"AttributeName": "account_id", "KeyType": "HASH"},
+                    {"AttributeName": date_attr, "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            }
+        }
+        if billing_mode != "PAY_PER_REQUEST":
+            create_index["Create"]["ProvisionedThroughput"] = {
+                "ReadCapacityUnits": 1,
+                "WriteCapacityUnits": 1,
+            }
+
+        print(f"Executando criação de {index_name}...")
+        try:
+            # Só um GSI pode ser criado por vez: espera cada um ficar ACTIVE
+            dynamodb.update_table(
+                TableName=TABLE_NAME,
+                AttributeDefinitions=[
+                    {"AttributeName": "account_id", "AttributeType": "S"},
+                    {"AttributeName": date_attr, "AttributeType": "S"},
+                ],
+                GlobalSecondaryIndexUpdates=[create_index],
+            )
+            print(f"   [OK] Solicitação enviada para {index_name}")
+            _wait_active(dynamodb, index_name)
+        except ClientError as e:
+            print(f"   [ERRO] {e}")
+
+
+if __name__ == "__main__":
+    create_transaction_date_gsis()
@@ -3,6 +3,8 @@ import os
 from boto3.dynamodb.conditions import Key, Attr
 from dotenv import load_dotenv
 
+import image_refs
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
@@ -47,22 +49,6 @@ def get_target_user(email):
         return None
     return items[0]
 
-def delete_s3_object(url):
-    if not url: return
-    try:
-        # Extrair key da URL
-        # Ex: https://alugueqqc-images.s3.amazonaws.com/uuid.jpg
-        if S3_BUCKET_NAME in url:
-            key = url.split(f"https://{S3_BUCKET_NAME}.s3.amazonaws.com/")[-1]
-            # Caso a URL esteja em outro formato, tentar split simples
-            if key == url:
-                key = url.split("/")[-1]
-            
-            print(f"  - Deletando imagem S3: {key}")
-            s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=key)
-    except Exception as e:
-        print(f"  ! Erro ao deletar S3 {url}: {e}")
-
 def delete_all_items():
     user = get_target_user(TARGET_EMAIL)
     if not user: return
@@ -80,7 +66,7 @@ def delete_all_items():
     
     scan_kwargs = {
         'FilterExpression': Attr('user_id').eq(user_id),
-        'ProjectionExpression': "account_id, item_id, item_image_url, title"
+        'ProjectionExpression': "account_id, item_id, item_image_url, item_image_urls, image_url, title"
     }
     
     done = False
@@ -97,10 +83,7 @@ def delete_all_items():
         for item in items:
             print(f"Deletando: {item.get('title', 'Sem título')} ({item['item_id']})")
             
-            # 1. Deletar Imagem S3
-            delete_s3_object(item.get('item_image_url'))
-            
-            # 2. Deletar do DynamoDB
+            # 1. Deletar do DynamoDB
             try:
                 itens_table.delete_item(
                     Key={
@@ -108,6 +91,8 @@ def delete_all_items():
                     }
                 )
                 deleted_count += 1
+                # 2. Liberar as fotos (só somem do S3 se nenhum outro item usa; ver image_refs.py)
+                image_refs.release_all(users_table, s3_client, S3_BUCKET_NAME, image_refs.item_image_urls(item))
             except Exception as e:
                 print(f"  ! Erro ao deletar item DynamoDB: {e}")
         
@@ -0,0 +1,51 @@
+"""
+dynamo_batch.py
+Leitura em lote (batch_get_item) com retry das UnprocessedKeys, usada pelo
+snapshot do catálogo, pelos cards da agenda e pelos scripts de backfill.
+"""
+
+import time
+
+
+def batch_get_keys(table, keys, retries=5):
+    """
+    batch_get_item em lotes de 100, reprocessando UnprocessedKeys com backoff.
+    Retorna as linhas na mesma ordem de `keys` (chaves ausentes são omitidas).
+    """
+    if not keys:
+        return []
+
+    key_names = list(keys[0].keys())
+
+    def _sig(row):
+        return tuple(str(row.get(k)) for k in key_names)
+
+    unique = list({_sig(k): k for k in keys}.values())
+    client = table.meta.client
+    found = {}
+    for start in range(0, len(unique), 100):
+        request_items = {table.name: {"Keys": unique[start:start + 100]}}
+        attempt = 0
+        while request_items and attempt <= retries:
+            resp = client.batch_get_item(RequestItems=request_items)
+            for row in resp.get("Responses", {}).get(table.name, []):
+                found[_sig(row)] = row
+            request_items = resp.get("UnprocessedKeys") or {}
+            if request_items:
+                attempt += 1
+                time.sleep(min(0.05 * (2 ** attempt), 1.0))
+        if request_items:
+            print(f"batch_get_item: chaves não processadas após {retries} tentativas em {table.name}")
+
+    out = []
+    seen = set()
+    for k in keys:
+        sig = _sig(k)
+        if sig in found and sig not in seen:
+            seen.add(sig)
+            out.append(found[sig])
+    return out
+
+
+def batch_get_items(table, ids, key_name="item_id"):
+    return batch_get_keys(table, [{key_name: i} for i in ids if i])
@@ -4,7 +4,7 @@ import hmac
 import json
 import os
 import uuid
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.conditions import Key
 from flask import (
     render_template,
     request,
@@ -16,6 +16,11 @@ from flask import (
 )
 
 from utils import get_user_timezone
+import agenda_engine
+import item_cards
+import pending_bookings
+import scheduling_config_cache
+import slot_occupancy
 
 
 def init_fittings_routes(
@@ -65,31 +70,18 @@ def init_fittings_routes(
             hashlib.sha256,
         ).hexdigest()[:32]
 
-    def _pending_booking_key(fitting_id: str) -> str:
-        return f"pending_booking#{fitting_id}"
-
     def _save_pending_booking(account_id: str, fitting_id: str, payload: dict) -> tuple[bool, str]:
-        try:
-            scheduling_config_table.put_item(
-                Item={
-                    "account_id": account_id,
-                    "config_key": _pending_booking_key(fitting_id),
-                    "payload": json.dumps(payload),
-                    "created_at": datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
-                }
-            )
-            return True, ""
-        except Exception as e:
-            msg = str(e) or e.__class__.__name__
-            print(f"Erro ao salvar pending_booking: {msg}")
-            return False, msg
+        return pending_bookings.save(
+            scheduling_config_table,
+            account_id,
+            fitting_id,
+            payload,
+            created_at=datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        )
 
     def _get_public_account_info(account_id: str) -> dict:
         try:
-            resp = scheduling_config_table.get_item(
-                Key={"account_id": account_id, "config_key": "account_slug"}
-            )
-            item = resp.get("Item") or {}
+            item = scheduling_config_cache.row(scheduling_config_table, account_id, "account_slug") or {}
             slug = str(item.get("slug") or "").strip()
             business_name = str(item.get("business_name") or "").strip()
             return {"slug": slug, "business_name": business_name}
@@ -331,42 +323,15 @@ def init_fittings_routes(
 
     def _get_default_duration_minutes(account_id: str) -> int:
         try:
-            resp = scheduling_config_table.get_item(
-                Key={"account_id": account_id, "config_key": "scheduling_settings"}
-            )
-            item = resp.get("Item") or {}
+            item = scheduling_config_cache.row(scheduling_config_table, account_id, "scheduling_settings") or {}
             raw = item.get("default_fitting_duration_minutes")
             val = int(raw)
             return val if val > 0 else 60
         except Exception:
             return 60
 
-    def _time_to_minutes(time_local: str) -> int | None:
-        if not time_local:
-            return None
-        t = str(time_local).strip()
-        if not t:
-            return None
-        try:
-            hh, mm = t.split(":")
-            h = int(hh)
-            m = int(mm)
-            if h < 0 or h > 23 or m < 0 or m > 59:
-                return None
-            return h * 60 + m
-        except Exception:
-            return None
-
-    def _intervals_overlap(start_a: int, end_a: int, start_b: int, end_b: int) -> bool:
-        return start_a < end_b and start_b < end_a
-
-    def _get_duration_minutes(item: dict, default_duration: int) -> int:
-        raw = item.get("duration_minutes")
-        try:
-            val = int(raw)
-        except Exception:
-            val = default_duration
-        return val if val > 0 else default_duration
+    _time_to_minutes = slot_occupancy.time_to_minutes
+    _get_duration_minutes = slot_occupancy.fitting_duration
 
     def _has_overlap(
         account_id: str,
@@ -381,62 +346,37 @@ def init_fittings_routes(
         end_min = start_min + max(1, int(duration_minutes or 60))
         default_duration = _get_default_duration_minutes(account_id)
         try:
-            resp = fittings_table.query(
-                KeyConditionExpression=Key("account_id").eq(account_id)
-                & Key("date_time_local").begins_with(date_iso)
-            )
-            items = resp.get("Items", [])
+            items = agenda_engine.fittings_between(fittings_table, account_id, date_iso, date_iso)
         except Exception as e:
             print("Erro ao checar sobreposição:", e)
             return False
 
-        for it in items:
-            if exclude_fitting_id and str(it.get("fitting_id") or "") == exclude_fitting_id:
-                continue
-            status = str(it.get("status") or "").lower()
-            if status in ("cancelado", "cancelled", "rejected"):
-                continue
-            other_start_str = it.get("time_local") or ""
-            other_start = _time_to_minutes(other_start_str)
-            if other_start is None:
-                continue
-            other_dur = _get_duration_minutes(it, default_duration)
-            other_end = other_start + other_dur
-            if _intervals_overlap(start_min, end_min, other_start, other_end):
-                return True
-        return False
+        occupancy = slot_occupancy.day_occupancy(
+            items,
+            default_duration,
+            exclude_statuses=("cancelado", "cancelled", "rejected"),
+            exclude_fitting_id=exclude_fitting_id,
+        )
+        return occupancy.overlaps(start_min, end_min)
 
     def _enrich_fittings_with_item_fields(fittings_items):
-        cache = {}
-        for f in fittings_items or []:
-            item_id = f.get("item_id")
-            if not item_id:
-                continue
-
-            if f.get("item_description") and f.get("item_custom_id") and f.get("item_image_url"):
-                continue
-
-            if item_id not in cache:
-                try:
-                    resp_item = itens_table.get_item(Key={"item_id": item_id})
-                    cache[item_id] = resp_item.get("Item") or {}
-                except Exception:
-                    cache[item_id] = {}
+        # Junta os item_ids que faltam em toda a lista e busca de uma vez (cache compartilhado)
+        pending = [
+            f for f in fittings_items or []
+            if f.get("item_id")
+            and not (f.get("item_description") and f.get("item_custom_id") and f.get("item_image_url"))
+        ]
+        if not pending:
+            return fittings_items
 
-            it = cache.get(item_id) or {}
+        cards = item_cards.get_cards(itens_table, [f.get("item_id") for f in pending])
+        for f in pending:
+            it = cards.get(str(f.get("item_id"))) or {}
             if not it:
                 continue
 
-            if not f.get("item_description"):
-                item_desc = (
-                    it.get("item_description")
-                    or it.get("description")
-                    or it.get("descricao")
-                    or it.get("nome")
-                    or ""
-                )
-                if item_desc:
-                    f["item_description"] = item_desc
+            if not f.get("item_description") and it.get("item_description"):
+                f["item_description"] = it.get("item_description")
 
             if not f.get("item_custom_id") and it.get("item_custom_id"):
                 f["item_custom_id"] = it.get("item_custom_id")
@@ -460,216 +400,56 @@ def init_fittings_routes(
             print("Erro ao buscar provas do dia:", e)
             return []
 
-    def _next_dates_with_fittings(account_id: str, start_date_iso: str, count: int = None):
-        # Busca TODAS as próximas datas com provas diretamente na tabela DynamoDB
+    def _next_dates_with_fittings(account_id: str, start_date_iso: str, days: int = agenda_engine.WINDOW_DAYS):
+        # Próximas datas com provas dentro da janela (query na chave, sem scan)
         results = []
         try:
-            print(f"DEBUG: Searching for account_id: {account_id}, start_date: {start_date_iso}")
-            
-            # Usar scan sem filtro de data primeiro para ver todos os itens
-            resp = fittings_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id)
+            next_days, _ = agenda_engine.upcoming_days(
+                fittings_table, transactions_table, account_id, start_date_iso, days=days
             )
-            
-            items = resp.get("Items", [])
-            print(f"DEBUG: Total items found: {len(items)}")
-            
-            # Debug: mostrar todos os itens encontrados
-            for item in items:
-                print(f"DEBUG: Found item - date_time_local: {item.get('date_time_local', 'N/A')}, client: {item.get('client_name', 'N/A')}")
-            
-            # Filtrar apenas datas futuras e agrupar por data
-            dates_dict = {}
-            for item in items:
-                date_part = item["date_time_local"][:10]  # Extrai apenas a parte da data (YYYY-MM-DD)
-                print(f"DEBUG: Processing item with date_part: {date_part}, full date_time_local: {item['date_time_local']}")
-                
-                # Filtrar apenas datas futuras
-                if date_part > start_date_iso:
-                    if date_part not in dates_dict:
-                        dates_dict[date_part] = []
-                    dates_dict[date_part].append(item)
-                    print(f"DEBUG: Date {date_part} now has {len(dates_dict[date_part])} items")
-                else:
-                    print(f"DEBUG: Skipping date {date_part} (not greater than {start_date_iso})")
-            
-            print(f"DEBUG: Final dates_dict keys: {list(dates_dict.keys())}")
-            for date_key, items_list in dates_dict.items():
-                print(f"DEBUG: Date {date_key} has {len(items_list)} items")
-            
-            # Converte para o formato esperado e ordena por data
-            for date_iso in sorted(dates_dict.keys()):
-                _enrich_fittings_with_item_fields(dates_dict[date_iso])
-                results.append({
-                    "date_iso": date_iso,
-                    "fitting_items": dates_dict[date_iso]  # Mudei de "items" para "fitting_items"
-                })
-                print(f"DEBUG: Added to results - Date: {date_iso}, Items count: {len(dates_dict[date_iso])}")
-                    
+            for day in next_days:
+                if day["fitting_items"]:
+                    results.append({"date_iso": day["date_iso"], "fitting_items": day["fitting_items"]})
+            _enrich_fittings_with_item_fields([f for day in results for f in day["fitting_items"]])
         except Exception as e:
             print("Erro ao buscar próximos dias com provas:", e)
-        
-        print(f"DEBUG: Final results count: {len(results)}")
         return results
 
-    def _next_dates_with_fittings_and_transactions(account_id: str, start_date_iso: str, count: int = None):
-        # Busca TODAS as próximas datas com provas e transações
-        results = []
+    def _next_dates_with_fittings_and_transactions(
+        account_id: str, start_date_iso: str, days: int = agenda_engine.WINDOW_DAYS, enrich: bool = True
+    ):
+        # Datas com provas e transações na janela (start_date_iso, start_date_iso + days]
+        # Devolve (dias, cursor da próxima janela)
         try:
-            # Buscar provas futuras
-            fittings_resp = fittings_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id)
+            next_days, next_cursor = agenda_engine.upcoming_days(
+                fittings_table, transactions_table, account_id, start_date_iso, days=days
             )
-            fittings_items = fittings_resp.get("Items", [])
-            
-            # Buscar transações futuras (retiradas e devoluções)
-            transactions_resp = transactions_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id)
-                & (Attr("transaction_status").eq("reserved")
-                   | Attr("transaction_status").eq("rented"))
-            )
-            transactions_items = transactions_resp.get("Items", [])
-            
-            # Agrupar por data
-            dates_dict = {}
-            
-            # Processar provas
-            for item in fittings_items:
-                date_part = item["date_time_local"][:10]  # Extrai apenas a parte da data (YYYY-MM-DD)
-                if date_part > start_date_iso:
-                    if date_part not in dates_dict:
-                        dates_dict[date_part] = {"fitting_items": [], "transaction_items": []}
-                    dates_dict[date_part]["fitting_items"].append(item)
-            
-            # Processar transações
-            for item in transactions_items:
-                # Verificar retiradas
-                rental_date = item.get("rental_date")
-                if rental_date and rental_date > start_date_iso:
-                    if rental_date not in dates_dict:
-                        dates_dict[rental_date] = {"fitting_items": [], "transaction_items": []}
-                    item_copy = item.copy()
-                    item_copy['transaction_type'] = 'pickup'
-                    dates_dict[rental_date]["transaction_items"].append(item_copy)
-                
-                # Verificar devoluções (apenas para status 'rented')
-                return_date = item.get("return_date")
-                if return_date and return_date > start_date_iso and item.get("transaction_status") == "rented":
-                    if return_date not in dates_dict:
-                        dates_dict[return_date] = {"fitting_items": [], "transaction_items": []}
-                    item_copy = item.copy()
-                    item_copy['transaction_type'] = 'return'
-                    dates_dict[return_date]["transaction_items"].append(item_copy)
-            
-            # Converte para o formato esperado e ordena por data
-            for date_iso in sorted(dates_dict.keys()):
-                _enrich_fittings_with_item_fields(dates_dict[date_iso]["fitting_items"])
-                results.append({
-                    "date_iso": date_iso,
-                    "fitting_items": dates_dict[date_iso]["fitting_items"],
-                    "transaction_items": dates_dict[date_iso]["transaction_items"]
-                })
-                    
+            if enrich:
+                _enrich_fittings_with_item_fields([f for day in next_days for f in day["fitting_items"]])
+            return next_days, next_cursor
         except Exception as e:
             print("Erro ao buscar próximos dias com provas e transações:", e)
-        
-        return results
+            return [], None
 
-    def _past_dates_with_fittings(account_id: str, end_date_iso: str, count: int = 30):
-        # Busca agendamentos passados (anteriores à data especificada)
-        results = []
+    def _past_dates_with_fittings(account_id: str, end_date_iso: str, count: int = agenda_engine.PAST_PAGE_DAYS):
+        # Agendamentos anteriores a end_date_iso, do mais recente para o mais antigo
+        # Devolve (dias, cursor para a página anterior)
         try:
-            # Usar scan para encontrar todos os itens do account_id
-            resp = fittings_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id)
-            )
-            
-            items = resp.get("Items", [])
-            
-            # Filtrar apenas datas passadas e agrupar por data
-            dates_dict = {}
-            for item in items:
-                date_part = item["date_time_local"][:10]  # Extrai apenas a parte da data (YYYY-MM-DD)
-                
-                # Filtrar apenas datas passadas
-                if date_part < end_date_iso:
-                    if date_part not in dates_dict:
-                        dates_dict[date_part] = []
-                    dates_dict[date_part].append(item)
-            
-            # Converte para o formato esperado e ordena por data (mais recente primeiro)
-            for date_iso in sorted(dates_dict.keys(), reverse=True):
-                results.append({
-                    "date_iso": date_iso,
-                    "fitting_items": dates_dict[date_iso]
-                })
-                
-                # Limitar o número de datas retornadas
-                if len(results) >= count:
-                    break
-                    
+            return agenda_engine.past_days(fittings_table, account_id, end_date_iso, count=count)
         except Exception as e:
             print("Erro ao buscar agendamentos passados:", e)
-        
-        return results
-
-    def _rentals_pickup_today(account_id: str, today_iso: str):
-        # Lista retiradas agendadas para hoje (reservadas/rented)
-        try:
-            resp = transactions_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id)
-                & Attr("rental_date").eq(today_iso)
-                & (Attr("transaction_status").eq("reserved")
-                   | Attr("transaction_status").eq("rented"))
-            )
-            return resp.get("Items", [])
-        except Exception as e:
-            print("Erro ao buscar retiradas de hoje:", e)
-            return []
-
-    def _rentals_return_today(account_id: str, today_iso: str):
-        # Lista devoluções agendadas para hoje (rented)
-        try:
-            resp = transactions_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id)
-                & Attr("return_date").eq(today_iso)
-                & Attr("transaction_status").eq("rented")
-            )
-            return resp.get("Items", [])
-        except Exception as e:
-            print("Erro ao buscar devoluções de hoje:", e)
-            return []
+            return [], None
 
-    def _rentals_for_date(account_id: str, date_iso: str):
-        # Lista transações (retiradas e devoluções) para uma data específica
+    def _day_sheet(account_id: str, start_iso: str, end_iso: str = None, enrich: bool = True):
+        # Retiradas, devoluções e provas do dia (ou período) em uma chamada
         try:
-            # Buscar retiradas para esta data
-            pickup_resp = transactions_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id)
-                & Attr("rental_date").eq(date_iso)
-                & (Attr("transaction_status").eq("reserved")
-                   | Attr("transaction_status").eq("rented"))
-            )
-            pickups = pickup_resp.get("Items", [])
-            
-            # Buscar devoluções para esta data
-            return_resp = transactions_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id)
-                & Attr("return_date").eq(date_iso)
-                & Attr("transaction_status").eq("rented")
-            )
-            returns = return_resp.get("Items", [])
-            
-            # Marcar o tipo de transação
-            for item in pickups:
-                item['transaction_type'] = 'pickup'
-            for item in returns:
-                item['transaction_type'] = 'return'
-            
-            return pickups + returns
+            sheet = agenda_engine.day_sheet(fittings_table, transactions_table, account_id, start_iso, end_iso)
         except Exception as e:
-            print(f"Erro ao buscar transações para {date_iso}:", e)
-            return []
+            print(f"Erro ao montar folha do dia {start_iso}:", e)
+            return {"start_iso": start_iso, "end_iso": end_iso or start_iso, "pickups": [], "returns": [], "fittings": []}
+        if enrich:
+            _enrich_fittings_with_item_fields(sheet["fittings"])
+        return sheet
 
     def _validate_conflicts(client_id, item_id, date_iso, time_local):
         # Usa os GSIs fornecidos para detectar conflitos por cliente/item no mesmo horário
@@ -709,12 +489,25 @@ def init_fittings_routes(
 
         today_iso = _today_iso(user_tz)
 
-        fittings_today = _list_fittings_for_date(account_id, today_iso)
-        rentals_today = _rentals_pickup_today(account_id, today_iso)
-        returns_today = _rentals_return_today(account_id, today_iso)
+        today_sheet = _day_sheet(account_id, today_iso, enrich=False)
+        fittings_today = today_sheet["fittings"]
+        rentals_today = today_sheet["pickups"]
+        returns_today = today_sheet["returns"]
+
+        # Próximas datas em janelas de WINDOW_DAYS dias; "depois" é o cursor da janela
+        window_start = today_iso
+        depois = (request.args.get("depois") or "").strip()
+        try:
+            if depois and datetime.date.fromisoformat(depois).isoformat() > today_iso:
+                window_start = depois
+        except ValueError:
+            pass
+        next_days, next_cursor = _next_dates_with_fittings_and_transactions(account_id, window_start, enrich=False)
 
-        # Mostra TODAS as datas futuras com provas e transações
-        next_days = _next_dates_with_fittings_and_transactions(account_id, today_iso)
+        # Um único lote de itens para a página inteira (hoje + próximas datas)
+        _enrich_fittings_with_item_fields(
+            fittings_today + [f for day in next_days for f in day["fitting_items"]]
+        )
 
         return render_template(
             "agenda.html",
@@ -723,6 +516,8 @@ def init_fittings_routes(
             rentals_today=rentals_today,
             returns_today=returns_today,
             next_days=next_days,
+            window_start=window_start,
+            next_cursor=next_cursor,
         )
 
     @app.route("/past_appointments")
@@ -736,13 +531,23 @@ def init_fittings_routes(
 
         today_iso = _today_iso(user_tz)
 
-        # Busca agendamentos passados (últimos 30 dias com agendamentos)
-        past_days = _past_dates_with_fittings(account_id, today_iso)
+        # Busca agendamentos passados (30 dias com agendamentos por página);
+        # "antes" é o cursor da página seguinte, para trás no tempo
+        before_iso = today_iso
+        antes = (request.args.get("antes") or "").strip()
+        try:
+            if antes and datetime.date.fromisoformat(antes).isoformat() < today_iso:
+                before_iso = antes
+        except ValueError:
+            pass
+        past_days, older_cursor = _past_dates_with_fittings(account_id, before_iso)
 
         return render_template(
             "past_appointments.html",
             today_iso=today_iso,
             past_days=past_days,
+            before_iso=before_iso,
+            older_cursor=older_cursor,
         )
 
     @app.route("/add_fitting", methods=["GET", "POST"])
@@ -1151,7 +956,7 @@ def init_fittings_routes(
 
         today_iso = _today_iso(user_tz)
 
-        # Mostra TODAS as datas futuras com provas
+        # Mostra as datas com provas da próxima janela
         next_days = _next_dates_with_fittings(account_id, today_iso)
 
         return render_template("debug_agenda.html", next_days=next_days, account_id=account_id, today_iso=today_iso)
@@ -1168,10 +973,8 @@ def init_fittings_routes(
         if request.method == "GET":
             # Buscar a prova pelo fitting_id
             try:
-                resp = fittings_table.scan(
-                    FilterExpression=Attr("account_id").eq(account_id) & Attr("fitting_id").eq(fitting_id)
-                )
-                items = resp.get("Items", [])
+                found = agenda_engine.find_fitting(fittings_table, account_id, fitting_id)
+                items = [found] if found else []
                 if not items:
                     flash("Prova não encontrada.", "danger")
                     return redirect(url_for("agenda"))
@@ -1362,10 +1165,8 @@ def init_fittings_routes(
 
         try:
             # Buscar a prova atual para obter as chaves
-            resp = fittings_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id) & Attr("fitting_id").eq(fitting_id)
-            )
-            items = resp.get("Items", [])
+            found = agenda_engine.find_fitting(fittings_table, account_id, fitting_id)
+            items = [found] if found else []
             if not items:
                 flash("Prova não encontrada.", "danger")
                 return redirect(url_for("agenda"))
@@ -1702,10 +1503,8 @@ def init_fittings_routes(
 
         try:
             # Buscar a prova pelo fitting_id para obter as chaves
-            resp = fittings_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id) & Attr("fitting_id").eq(fitting_id)
-            )
-            items = resp.get("Items", [])
+            found = agenda_engine.find_fitting(fittings_table, account_id, fitting_id)
+            items = [found] if found else []
             if not items:
                 flash("Prova não encontrada.", "danger")
                 return redirect(url_for("agenda"))
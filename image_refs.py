@@ -0,0 +1,235 @@
+"""
+image_refs.py
+Fotos guardadas pelo hash do conteúdo, com contagem de referências.
+
+Chave no S3: images/<sha256 do arquivo enviado>.jpg, mais as versões de
+image_renditions (<sha256>__card.webp, ...). A mesma foto enviada de novo cai na
+mesma chave e não é reprocessada nem reenviada.
+
+Contagem na users_table, no mesmo esquema de account_counters:
+    user_id = "image_ref:<chave no S3>"
+    refs        → itens que apontam para a foto (ADD atômico)
+    stored      → os objetos já estão no S3
+    renditions  → registro das versões (image_renditions.record_for)
+
+Cada URL em item_image_urls de cada item (inclusive na lixeira) vale 1:
+  - upload (image_uploads.upload_images) soma 1;
+  - exclusão definitiva do item chama release, que subtrai 1 e, ao chegar a
+    zero, apaga o registro e os objetos do S3;
+  - foto removida na edição só é liberada se nenhuma transação do item a mostra
+    (transaction_image_urls). As transações copiam as URLs do item e nunca são
+    apagadas de verdade, então a foto que alguma delas mostra fica no S3.
+Nada disso varre a tabela de itens.
+
+Fotos de antes desta contagem não têm registro até rodar backfill_image_refs.py;
+release não apaga fotos sem registro (pode haver outro item usando).
+
+Apagar a foto no S3 e enviar a mesma foto de novo não se atropelam: ao chegar a
+zero, release marca o registro (deleting = epoch, sem stored) antes de apagar os
+objetos e só remove o registro depois. Enquanto a marca existe, acquire_stored
+não soma e register levanta ReleaseInProgress; quem envia espera o registro sumir
+(wait_released) e sobe os objetos de novo. Marca com mais de
+TOMBSTONE_STALE_SECONDS (release interrompido no meio) é assumida por register.
+"""
+
+import datetime
+import hashlib
+import time
+from urllib.parse import urlparse
+
+from boto3.dynamodb.conditions import Attr, Key
+
+import image_renditions
+
+
+REF_PREFIX = "image_ref:"
+TOMBSTONE_STALE_SECONDS = 30
+
+
+class ReleaseInProgress(Exception):
+    """A última referência da foto acabou de ser liberada e os objetos estão sendo apagados."""
+
+
+def ref_key(s3_key):
+    return {"user_id": f"{REF_PREFIX}{s3_key}"}
+
+
+def s3_key_from_url(url):
+    """Chave no S3 de uma URL do bucket (ou None para vazio/"N/A")."""
+    if not url or not isinstance(url, str) or url.strip() in ("", "N/A"):
+        return None
+    key = urlparse(url.strip()).path.lstrip("/")
+    return key or None
+
+
+def content_key(image_file, prefix="images"):
+    """Chave pelo SHA-256 dos bytes enviados (lê o arquivo e volta ao início)."""
+    digest = hashlib.sha256()
+    image_file.seek(0)
+    for chunk in iter(lambda: image_file.read(1024 * 1024), b""):
+        digest.update(chunk)
+    image_file.seek(0)
+    return f"{prefix}/{digest.hexdigest()}.jpg"
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def acquire_stored(users_table, s3_key):
+    """
+    Soma 1 se a foto já está no S3. Retorna o registro das versões ({} se não
+    houver) ou None quando a foto ainda não existe (é preciso subir).
+    """
+    client = users_table.meta.client
+    try:
+        response = users_table.update_item(
+            Key=ref_key(s3_key),
+            UpdateExpression="ADD #refs :one",
+            ConditionExpression=Attr("stored").eq(True),
+            ExpressionAttributeNames={"#refs": "refs"},
+            ExpressionAttributeValues={":one": 1},
+            ReturnValues="ALL_NEW",
+        )
+    except client.exceptions.ConditionalCheckFailedException:
+        return None
+    renditions = response.get("Attributes", {}).get("renditions")
+    return renditions if isinstance(renditions, dict) else {}
+
+
+def register(users_table, s3_key, renditions=None):
+    """
+    Foto recém-enviada: soma 1 e marca como guardada (com as versões).
+    Levanta ReleaseInProgress se a foto está sendo apagada por release.
+    """
+    client = users_table.meta.client
+    try:
+        users_table.update_item(
+            Key=ref_key(s3_key),
+            UpdateExpression="ADD #refs :one SET #stored = :true, renditions = :renditions, "
+            "created_at = if_not_exists(created_at, :now) REMOVE #deleting",
+            ConditionExpression="attribute_not_exists(#deleting) OR #deleting < :stale",
+            # "stored" é palavra reservada do DynamoDB
+            ExpressionAttributeNames={"#refs": "refs", "#stored": "stored", "#deleting": "deleting"},
+            ExpressionAttributeValues={
+                ":one": 1,
+                ":true": True,
+                ":renditions": renditions or {},
+                ":now": _now(),
+                ":stale": int(time.time()) - TOMBSTONE_STALE_SECONDS,
+            },
+        )
+    except client.exceptions.ConditionalCheckFailedException:
+        raise ReleaseInProgress(s3_key)
+
+
+def wait_released(users_table, s3_key, poll_seconds=0.2):
+    """Espera o release em andamento remover o registro (ou a marca ficar velha)."""
+    deadline = time.time() + TOMBSTONE_STALE_SECONDS + 5
+    while time.time() < deadline:
+        record = users_table.get_item(Key=ref_key(s3_key), ConsistentRead=True).get("Item")
+        if not record or "deleting" not in record:
+            return
+        if int(record["deleting"]) < time.time() - TOMBSTONE_STALE_SECONDS:
+            return
+        time.sleep(poll_seconds)
+
+
+def release(users_table, s3, s3_bucket_name, url):
+    """
+    Subtrai 1 da foto. Ao chegar a zero, apaga o registro e os objetos (foto e
+    versões). Retorna True se os objetos foram apagados. Erros só são registrados.
+    """
+    s3_key = s3_key_from_url(url)
+    if not s3_key:
+        return False
+    client = users_table.meta.client
+    try:
+        response = users_table.update_item(
+            Key=ref_key(s3_key),
+            UpdateExpression="ADD #refs :minus",
+            ConditionExpression=Attr("refs").gt(0),
+            ExpressionAttributeNames={"#refs": "refs"},
+            ExpressionAttributeValues={":minus": -1},
+            ReturnValues="ALL_NEW",
+        )
+    except client.exceptions.ConditionalCheckFailedException:
+        print(f"Foto sem contagem de referências, mantida no S3: {s3_key}")
+        return False
+    except Exception as e:
+        print(f"Erro ao liberar referência da foto {s3_key}: {e}")
+        return False
+
+    record = response.get("Attributes", {})
+    if int(record.get("refs") or 0) > 0:
+        return False
+
+    # Marca antes de apagar: só quem marca o registro zerado apaga os objetos, e
+    # a partir daqui acquire_stored/register não aproveitam a foto
+    deleting = int(time.time())
+    try:
+        users_table.update_item(
+            Key=ref_key(s3_key),
+            UpdateExpression="SET #deleting = :deleting REMOVE #stored",
+            ConditionExpression="#refs <= :zero AND attribute_not_exists(#deleting)",
+            ExpressionAttributeNames={"#refs": "refs", "#stored": "stored", "#deleting": "deleting"},
+            ExpressionAttributeValues={":deleting": deleting, ":zero": 0},
+        )
+    except client.exceptions.ConditionalCheckFailedException:
+        return False
+    except Exception as e:
+        print(f"Erro ao marcar a foto {s3_key} para remoção: {e}")
+        return False
+
+    keys = [s3_key] + [k for k in image_renditions.all_keys(record.get("renditions")) if k != s3_key]
+    try:
+        s3.delete_objects(
+            Bucket=s3_bucket_name,
+            Delete={"Objects": [{"Key": k} for k in keys], "Quiet": True},
+        )
+    except Exception as e:
+        # A marca fica; depois de TOMBSTONE_STALE_SECONDS um novo envio assume o registro
+        print(f"Erro ao deletar imagem do S3: {e}")
+        return False
+
+    try:
+        users_table.delete_item(
+            Key=ref_key(s3_key),
+            ConditionExpression=Attr("deleting").eq(deleting),
+        )
+    except client.exceptions.ConditionalCheckFailedException:
+        pass  # marca velha já assumida por um novo envio
+    except Exception as e:
+        print(f"Erro ao remover contagem da foto {s3_key}: {e}")
+    return True
+
+
+def release_all(users_table, s3, s3_bucket_name, urls):
+    """release para cada URL distinta (ignora vazias e "N/A")."""
+    for url in dict.fromkeys(u for u in (urls or []) if s3_key_from_url(u)):
+        release(users_table, s3, s3_bucket_name, url)
+
+
+def transaction_image_urls(transactions_table, item_id):
+    """URLs de foto copiadas nas transações do item (query no item_id-index)."""
+    urls = set()
+    query_kwargs = {
+        "IndexName": "item_id-index",
+        "KeyConditionExpression": Key("item_id").eq(item_id),
+        "ProjectionExpression": "item_image_url, item_image_urls, image_url",
+    }
+    while True:
+        response = transactions_table.query(**query_kwargs)
+        for tx in response.get("Items", []):
+            urls.update(item_image_urls(tx))
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return urls
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+
+def item_image_urls(item):
+    """Todas as fotos referenciadas por um item (lista + principal + campo antigo)."""
+    urls = list(item.get("item_image_urls") or [])
+    urls.extend([item.get("item_image_url"), item.get("image_url")])
+    return [u for u in dict.fromkeys(urls) if s3_key_from_url(u)]
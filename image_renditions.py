@@ -0,0 +1,207 @@
+"""
+image_renditions.py
+Versões de cada foto de item geradas no upload, para as páginas baixarem só o
+tamanho que mostram:
+
+    thumb  320px  (miniaturas, impressão de QR code, listas)
+    card   800px  (cards do estoque e do catálogo, /ver-item)
+    full  1920px  (modal/zoom; o JPEG é o mesmo arquivo de sempre: item_image_url)
+
+Cada tamanho sai em JPEG e, se o Pillow suportar, WebP e AVIF
+(IMAGE_RENDITION_FORMATS, padrão "jpeg,webp,avif"). Tamanhos maiores que a foto
+original não são gerados.
+
+O item guarda as chaves no S3 por URL da foto, em item_image_renditions:
+    {"<url>": {"thumb": {"w": 320, "h": 427, "jpeg": "<chave>", "webp": "<chave>"},
+               "card": {...}, "full": {...}}}
+
+Fotos antigas não têm registro; os filtros de template (utils.get_cloudfront_url
+com rendition, utils.image_srcset) caem para a URL original nesse caso.
+
+open_bounded() é a decodificação usada aqui e em utils.optimize_image: JPEG é
+decodificado direto perto do tamanho final (draft), a orientação do EXIF é
+aplicada e imagens acima de IMAGE_MAX_PIXELS (padrão 40 MP) são recusadas.
+Comparação de memória/tempo: python scripts/benchmark_optimize_image.py
+"""
+
+import io
+import os
+
+from PIL import Image, features
+
+
+RENDITIONS = (("full", 1920), ("card", 800), ("thumb", 320))
+
+# Limite de pixels decodificados (40 MP ≈ 120 MB em RGB). Acima disso a foto é recusada.
+MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", "40000000"))
+
+# Valor da tag Orientation do EXIF → transposição que deixa a foto em pé
+_EXIF_ORIENTATION = 0x0112
+_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# formato → (nome no Pillow, extensão, Content-Type, opções de gravação)
+FORMATS = {
+    "jpeg": ("JPEG", "jpg", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", "webp", "image/webp", {"quality": 80, "method": 4}),
+    "avif": ("AVIF", "avif", "image/avif", {"quality": 60, "speed": 8}),
+}
+
+
+def enabled_formats():
+    """Formatos configurados que o Pillow instalado consegue gravar (JPEG sempre)."""
+    wanted = [f.strip().lower() for f in os.getenv("IMAGE_RENDITION_FORMATS", "jpeg,webp,avif").split(",")]
+    out = ["jpeg"]
+    for fmt in wanted:
+        if fmt in FORMATS and fmt not in out:
+            try:
+                if features.check(fmt):
+                    out.append(fmt)
+            except Exception:
+                pass
+    return out
+
+
+def to_rgb(img):
+    """Achata transparência em fundo branco e converte para RGB (JPEG não tem alfa)."""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        if img.mode == "P":
+            img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        return background
+    if img.mode != "RGB":
+        return img.convert("RGB")
+    return img
+
+
+class ImageTooLarge(ValueError):
+    """A foto passa do limite de pixels (MAX_PIXELS)."""
+
+
+def open_bounded(image_file, max_side, max_pixels=None):
+    """
+    Abre a foto já reduzida para caber em max_side x max_side, em RGB, com a
+    orientação do EXIF aplicada.
+
+    JPEG é decodificado direto em 1/2, 1/4 ou 1/8 do tamanho (draft), sem passar
+    pela resolução original; nos outros formatos o thumbnail reduz por fator
+    inteiro (reduce) antes do LANCZOS. Levanta ImageTooLarge se a imagem a
+    decodificar passar de max_pixels.
+    """
+    max_pixels = max_pixels or MAX_PIXELS
+    image_file.seek(0)
+    try:
+        source = Image.open(image_file)
+    except Image.DecompressionBombError as e:
+        # Acima de ~179 MP o próprio Pillow recusa no open
+        raise ImageTooLarge(str(e)) from e
+    with source:
+        try:
+            orientation = source.getexif().get(_EXIF_ORIENTATION, 1)
+        except Exception:
+            orientation = 1
+        if source.format == "JPEG":
+            # Escolhe a menor escala que ainda cobre max_side (a caixa é quadrada,
+            # então tanto faz se a foto vai girar depois)
+            source.draft("RGB", (max_side, max_side))
+        width, height = source.size
+        if width * height > max_pixels:
+            raise ImageTooLarge(f"Imagem de {width}x{height} passa do limite de {max_pixels} pixels")
+
+        img = source
+        if img.mode in ("P", "1"):
+            # resize com paleta usaria NEAREST
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        img = to_rgb(img)
+        if img is source:
+            img = source.copy()
+
+    if orientation in _TRANSPOSE:
+        img = img.transpose(_TRANSPOSE[orientation])
+    return img
+
+
+def rendition_key(base_key, name, fmt):
+    """Chave no S3 de cada versão. O JPEG full é a própria base_key."""
+    if name == "full" and fmt == "jpeg":
+        return base_key
+    stem = base_key.rsplit(".", 1)[0]
+    return f"{stem}__{name}.{FORMATS[fmt][1]}"
+
+
+def is_rendition_key(key):
+    """Chave de uma versão menor/outro formato (thumb, card, full em WebP/AVIF)."""
+    stem = str(key or "").rsplit(".", 1)[0]
+    return any(stem.endswith(f"__{name}") for name, _ in RENDITIONS)
+
+
+def render(image_file, formats=None):
+    """
+    Gera as versões da foto. Devolve
+    [{"name", "width", "height", "format", "content_type", "data": BytesIO}],
+    do maior para o menor tamanho. Cada tamanho é reduzido a partir do anterior.
+    """
+    formats = formats or enabled_formats()
+    img = open_bounded(image_file, RENDITIONS[0][1])
+
+    out = []
+    for name, bound in RENDITIONS:
+        if name != "full" and max(img.size) <= bound:
+            continue
+        # Os bytes do tamanho anterior já foram gravados: pode reduzir no lugar
+        img.thumbnail((bound, bound), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            pil_format, _, content_type, options = FORMATS[fmt]
+            data = io.BytesIO()
+            img.save(data, format=pil_format, **options)
+            data.seek(0)
+            out.append({
+                "name": name,
+                "width": img.size[0],
+                "height": img.size[1],
+                "format": fmt,
+                "content_type": content_type,
+                "data": data,
+            })
+    return out
+
+
+def record_for(base_key, renditions):
+    """Registro do item (ver docstring do módulo) para as versões gravadas."""
+    record = {}
+    for r in renditions:
+        entry = record.setdefault(r["name"], {"w": r["width"], "h": r["height"]})
+        entry[r["format"]] = rendition_key(base_key, r["name"], r["format"])
+    return record
+
+
+def all_keys(record):
+    """Todas as chaves S3 de um registro (para apagar junto com a foto)."""
+    keys = []
+    for entry in (record or {}).values():
+        if isinstance(entry, dict):
+            keys.extend(v for k, v in entry.items() if k in FORMATS and v)
+    return keys
+
+
+def pick(record, name):
+    """A versão pedida ou, se não foi gerada (foto pequena), a menor maior que ela."""
+    if not isinstance(record, dict) or not record:
+        return None
+    if name in record:
+        return record[name]
+    order = [n for n, _ in reversed(RENDITIONS)]
+    if name in order:
+        for candidate in order[order.index(name) + 1:]:
+            if candidate in record:
+                return record[candidate]
+    return record.get("full")
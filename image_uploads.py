@@ -0,0 +1,165 @@
+"""
+image_uploads.py
+Upload das fotos de um formulário (add_item/edit_item) em paralelo, num pool de
+threads limitado e compartilhado pelo processo.
+
+Cada foto é guardada pelo hash do conteúdo (image_refs). Etapas, todas no pool e
+esperadas pela thread da requisição:
+  1. calcula a chave de cada foto; a mesma foto repetida no formulário vira uma
+     só (1 referência);
+  2. por foto distinta: se já está no S3, só soma a referência; senão gera as
+     versões (image_renditions.render);
+  3. todas as versões novas de todas as fotos sobem para o S3
+     (utils.put_image_rendition) e só então as referências são registradas.
+     Se algum envio falha, as referências já somadas são devolvidas. Se a
+     mesma foto está sendo apagada nesse instante (image_refs.release), espera
+     e sobe de novo.
+
+Quem chama grava o item e, se não gravar (erro ou validação), devolve as
+referências com discard.
+
+Assim o tempo do POST fica perto do da foto mais lenta, e não da soma das fotos.
+Nenhuma tarefa do pool espera outra tarefa do pool, então não há como travar com
+o pool cheio.
+
+    IMAGE_UPLOAD_WORKERS  threads do pool (padrão 4). O pool é do processo, então
+                          também limita uploads de requisições simultâneas.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import image_refs
+import image_renditions
+import utils
+
+
+_lock = threading.Lock()
+_state = {"executor": None}
+
+
+def workers():
+    configured = os.getenv("IMAGE_UPLOAD_WORKERS", "").strip()
+    return int(configured) if configured.isdigit() and int(configured) > 0 else 4
+
+
+def _executor():
+    if _state["executor"] is None:
+        with _lock:
+            if _state["executor"] is None:
+                _state["executor"] = ThreadPoolExecutor(max_workers=workers(), thread_name_prefix="image-upload")
+    return _state["executor"]
+
+
+def _prepare(users_table, image_file, base_key):
+    """
+    (registro das versões já guardadas, versões a subir, motivo da falha).
+    Só uma das três partes vem preenchida.
+    """
+    stored = image_refs.acquire_stored(users_table, base_key)
+    if stored is not None:
+        return stored, None, None
+    try:
+        return None, image_renditions.render(image_file), None
+    except image_renditions.ImageTooLarge as e:
+        print(f"Imagem recusada: {e}")
+        return None, None, "too_large"
+    except Exception as e:
+        print(f"Erro ao gerar versões da imagem: {e}")
+        return None, None, "error"
+
+
+def _upload_original(users_table, image_file, prefix):
+    """Foto que o Pillow não abre: sobe como arquivo único (chave com uuid)."""
+    url = utils.upload_image_to_s3(image_file, prefix=prefix)
+    if url:
+        image_refs.register(users_table, image_refs.s3_key_from_url(url))
+    return url
+
+
+def _register_new(users_table, base_key, renditions, record, attempts=3):
+    """
+    Registra a foto recém-enviada. Se a mesma foto estava sendo apagada (release
+    da última referência), espera o apagamento terminar e sobe as versões de novo.
+    """
+    for attempt in range(attempts):
+        try:
+            image_refs.register(users_table, base_key, record)
+            return
+        except image_refs.ReleaseInProgress:
+            if attempt == attempts - 1:
+                raise
+            image_refs.wait_released(users_table, base_key)
+            for rendition in renditions:
+                utils.put_image_rendition(base_key, rendition)
+
+
+def discard(users_table, urls):
+    """Devolve as referências das fotos enviadas para um item que não foi gravado."""
+    image_refs.release_all(users_table, utils.s3, utils.s3_bucket_name, urls)
+
+
+def upload_images(image_files, users_table, prefix="images"):
+    """
+    Sobe as fotos e retorna [(url, registro de versões)] na mesma ordem de
+    image_files, com 1 referência por foto distinta (image_refs); a mesma foto
+    repetida volta com a mesma URL. Foto recusada pelo limite de pixels vem como
+    ("", {}); foto que o Pillow não abre sobe como arquivo único
+    (utils.upload_image_to_s3). Erros do S3 são levantados.
+    """
+    image_files = list(image_files or [])
+    if not image_files:
+        return []
+
+    executor = _executor()
+    keys = [
+        f.result()
+        for f in [executor.submit(image_refs.content_key, image_file, prefix) for image_file in image_files]
+    ]
+    # Primeira posição de cada foto distinta
+    first_idx = {}
+    for idx, base_key in enumerate(keys):
+        first_idx.setdefault(base_key, idx)
+    prepared = {
+        base_key: future.result()
+        for base_key, future in [
+            (base_key, executor.submit(_prepare, users_table, image_files[idx], base_key))
+            for base_key, idx in first_idx.items()
+        ]
+    }
+
+    by_key = {}
+    pending = []
+    new_keys = {}
+    fallbacks = {}
+    for base_key, (stored, renditions, failure) in prepared.items():
+        if stored is not None:
+            by_key[base_key] = (utils.s3_key_url(base_key), stored)
+        elif renditions:
+            pending.extend(executor.submit(utils.put_image_rendition, base_key, r) for r in renditions)
+            new_keys[base_key] = (renditions, image_renditions.record_for(base_key, renditions))
+        elif failure == "error":
+            image_file = image_files[first_idx[base_key]]
+            fallbacks[base_key] = executor.submit(_upload_original, users_table, image_file, prefix)
+            pending.append(fallbacks[base_key])
+
+    # Espera todos os envios antes de levantar o primeiro erro
+    errors = []
+    for future in pending:
+        try:
+            future.result()
+        except Exception as e:
+            errors.append(e)
+    if errors:
+        acquired = [url for url, _ in by_key.values()]
+        acquired.extend(f.result() for f in fallbacks.values() if f.exception() is None)
+        discard(users_table, acquired)
+        raise errors[0]
+
+    for base_key, (renditions, record) in new_keys.items():
+        _register_new(users_table, base_key, renditions, record)
+        by_key[base_key] = (utils.s3_key_url(base_key), record)
+    for base_key, future in fallbacks.items():
+        by_key[base_key] = (future.result(), {})
+    return [by_key.get(base_key, ("", {})) for base_key in keys]
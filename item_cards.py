@@ -0,0 +1,93 @@
+"""
+item_cards.py
+Cache curto, compartilhado entre requisições, dos dados de item que a agenda
+mostra nas provas (descrição, código, imagem).
+
+    cards = item_cards.get_cards(itens_table, ["id1", "id2", ...])
+    item_cards.invalidate(item_id)   # edit_item chama depois de salvar
+
+Os ids que faltam no cache são buscados juntos com batch_get_item (lotes de 100,
+com retry das UnprocessedKeys, via dynamo_batch.batch_get_items). O cache é
+por processo; com vários workers, outro worker pode mostrar o card antigo até
+ITEM_CARD_TTL segundos (padrão 60).
+"""
+
+import os
+import threading
+import time
+
+import dynamo_batch
+
+
+ITEM_CARD_TTL = float(os.getenv("ITEM_CARD_TTL_SECONDS", "60"))
+MAX_CARDS = int(os.getenv("ITEM_CARD_CACHE_MAX", "5000"))
+
+_lock = threading.Lock()
+_cards = {}  # {item_id: (expira_em, card)}
+
+
+def card_from_item(item):
+    """Só os campos usados para completar as provas (item vazio → card vazio)."""
+    if not item:
+        return {}
+    return {
+        "item_description": (
+            item.get("item_description")
+            or item.get("description")
+            or item.get("descricao")
+            or item.get("nome")
+            or ""
+        ),
+        "item_custom_id": item.get("item_custom_id") or "",
+        "image_url": item.get("image_url") or "",
+    }
+
+
+def get_cards(itens_table, item_ids):
+    """{item_id: card} para os ids pedidos. Itens inexistentes voltam como {}."""
+    wanted = list(dict.fromkeys(str(i) for i in item_ids or [] if i))
+    now = time.time()
+    cards = {}
+    missing = []
+    with _lock:
+        for item_id in wanted:
+            cached = _cards.get(item_id)
+            if cached and cached[0] > now:
+                cards[item_id] = cached[1]
+            else:
+                missing.append(item_id)
+
+    if not missing:
+        return cards
+
+    try:
+        rows = dynamo_batch.batch_get_items(itens_table, missing)
+    except Exception as e:
+        # Não guarda nada: a próxima requisição tenta de novo
+        print(f"Erro ao buscar itens da agenda em lote: {e}")
+        for item_id in missing:
+            cards[item_id] = {}
+        return cards
+    fetched = {str(row.get("item_id")): card_from_item(row) for row in rows}
+
+    expires_at = time.time() + ITEM_CARD_TTL
+    with _lock:
+        for item_id in missing:
+            card = fetched.get(item_id, {})
+            cards[item_id] = card
+            _cards[item_id] = (expires_at, card)
+        if len(_cards) > MAX_CARDS:
+            # Descarta os que vencem primeiro
+            for item_id, _ in sorted(_cards.items(), key=lambda kv: kv[1][0])[: len(_cards) - MAX_CARDS]:
+                _cards.pop(item_id, None)
+    return cards
+
+
+def invalidate(item_id):
+    with _lock:
+        _cards.pop(str(item_id), None)
+
+
+def clear():
+    with _lock:
+        _cards.clear()
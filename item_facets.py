@@ -0,0 +1,306 @@
+"""
+item_facets.py
+Documento de facetas (cores/tamanhos) por conta, com contagem de referências.
+
+Fica na users_table, no mesmo esquema de chave de account_settings:
+    user_id = "account_facets:<account_id>"
+
+Atributos (planos, para que o ADD funcione sem precisar criar mapas antes):
+    "n|<status>|<tipo>|<chave>" → nº de itens naquele status com o valor
+    "d|<tipo>|<chave>"          → valor para exibição (primeira grafia vista)
+    initialized_at              → presente só depois de um rebuild completo
+
+<tipo> é "all", "base", "commercial" ou "size"; <chave> é o valor em casefold.
+add_item, edit_item, rent e as rotas de status chamam item_changed(antigo, novo).
+A reconstrução preguiçosa (get_facets) não sobrescreve o documento: soma a cada
+contagem a diferença entre o total lido dos itens e o valor lido antes, para que um
+item_changed feito durante a leitura não se perca.
+Para reconstruir: python rebuild_item_facets.py <account_id> | --all
+"""
+
+import datetime
+import re
+
+from boto3.dynamodb.conditions import Key
+
+
+FACET_KINDS = ("all", "base", "commercial", "size")
+
+# Atributos por update_item na inicialização (UpdateExpression tem limite de 4 KB)
+INIT_CHUNK = 40
+
+# Campos que alimentam as facetas (para projeções nas consultas)
+FACET_SOURCE_FIELDS = [
+    "cor",
+    "cores",
+    "color",
+    "item_cor",
+    "item_color",
+    "cor_base",
+    "color_base",
+    "cor_comercial",
+    "color_comercial",
+    "tamanho",
+    "size",
+]
+
+
+def facets_key(account_id):
+    return f"account_facets:{account_id}"
+
+
+def split_color_tokens(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        out = []
+        for v in value:
+            out.extend(split_color_tokens(v))
+        return out
+    text = str(value).strip()
+    if not text:
+        return []
+    parts = re.split(r"[/,;]|\s+e\s+", text, flags=re.IGNORECASE)
+    return [p.strip() for p in parts if str(p).strip()]
+
+
+def split_size_tokens(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        out = []
+        for v in value:
+            out.extend(split_size_tokens(v))
+        return out
+    return [p.strip() for p in str(value).split(",") if p.strip()]
+
+
+def item_facet_values(item):
+    """{tipo: {chave: exibição}} com os valores de faceta de um item."""
+    if not isinstance(item, dict):
+        return {}
+
+    base_tokens = split_color_tokens(item.get("cor_base") or item.get("color_base"))
+    commercial_tokens = split_color_tokens(item.get("cor_comercial") or item.get("color_comercial"))
+    fallback_tokens = split_color_tokens(
+        item.get("cor")
+        or item.get("cores")
+        or item.get("color")
+        or item.get("item_cor")
+        or item.get("item_color")
+    )
+    effective_commercial = commercial_tokens or fallback_tokens
+    effective_all = effective_commercial or base_tokens
+    sizes = split_size_tokens(item.get("tamanho") or item.get("size"))
+
+    out = {}
+    for kind, values in (
+        ("all", effective_all),
+        ("base", base_tokens),
+        ("commercial", effective_commercial),
+        ("size", sizes),
+    ):
+        bucket = {}
+        for v in values:
+            key = str(v).strip().casefold()
+            if key and key not in bucket:
+                bucket[key] = str(v).strip()
+        if bucket:
+            out[kind] = bucket
+    return out
+
+
+def _contributions(item):
+    """{(status, tipo, chave): 1} e {(tipo, chave): exibição} de um item."""
+    if not isinstance(item, dict):
+        return {}, {}
+    status = str(item.get("status") or "").strip().casefold()
+    if not status:
+        return {}, {}
+    counts = {}
+    displays = {}
+    for kind, bucket in item_facet_values(item).items():
+        for key, display in bucket.items():
+            counts[(status, kind, key)] = 1
+            displays[(kind, key)] = display
+    return counts, displays
+
+
+def item_changed(users_table, account_id, old_item, new_item):
+    """
+    Ajusta as contagens pela diferença entre o estado antigo e o novo do item.
+    old_item=None para item novo; new_item=None para exclusão definitiva.
+    """
+    account_id = account_id or (new_item or {}).get("account_id") or (old_item or {}).get("account_id")
+    if not account_id:
+        return
+
+    old_counts, _ = _contributions(old_item)
+    new_counts, new_displays = _contributions(new_item)
+
+    deltas = {}
+    for k in old_counts:
+        deltas[k] = deltas.get(k, 0) - 1
+    for k in new_counts:
+        deltas[k] = deltas.get(k, 0) + 1
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+
+    names = {}
+    values = {}
+    add_parts = []
+    set_parts = []
+    for i, ((status, kind, key), delta) in enumerate(deltas.items()):
+        names[f"#n{i}"] = f"n|{status}|{kind}|{key}"
+        values[f":n{i}"] = delta
+        add_parts.append(f"#n{i} :n{i}")
+        if delta > 0 and (kind, key) in new_displays:
+            names[f"#d{i}"] = f"d|{kind}|{key}"
+            values[f":d{i}"] = new_displays[(kind, key)]
+            set_parts.append(f"#d{i} = if_not_exists(#d{i}, :d{i})")
+
+    update_expression = "ADD " + ", ".join(add_parts)
+    if set_parts:
+        update_expression += " SET " + ", ".join(set_parts)
+
+    try:
+        users_table.update_item(
+            Key={"user_id": facets_key(account_id)},
+            UpdateExpression=update_expression,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+    except Exception as e:
+        print(f"Erro ao atualizar facetas da conta {account_id}: {e}")
+
+
+def rebuild(users_table, itens_table, account_id, overwrite=False):
+    """
+    Reconstrói o documento de facetas lendo os itens da conta uma vez.
+    overwrite=True (script de reparo) substitui o documento inteiro; sem ele, só
+    inicializa um documento ainda não inicializado (ver _initialize).
+    """
+    key = {"user_id": facets_key(account_id)}
+    before = {} if overwrite else users_table.get_item(Key=key, ConsistentRead=True).get("Item") or {}
+    if before.get("initialized_at"):
+        return before
+
+    record = {
+        "user_id": facets_key(account_id),
+        "initialized_at": datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    names = {f"#f{i}": f for i, f in enumerate(FACET_SOURCE_FIELDS)}
+    names["#st"] = "status"
+    query_kwargs = {
+        "IndexName": "account_id-created_at-index",
+        "KeyConditionExpression": Key("account_id").eq(account_id),
+        "ProjectionExpression": "item_id, #st, " + ", ".join(k for k in names if k != "#st"),
+        "ExpressionAttributeNames": names,
+    }
+    while True:
+        response = itens_table.query(**query_kwargs)
+        for item in response.get("Items", []):
+            counts, displays = _contributions(item)
+            for (status, kind, key), n in counts.items():
+                attr = f"n|{status}|{kind}|{key}"
+                record[attr] = record.get(attr, 0) + n
+            for (kind, key), display in displays.items():
+                record.setdefault(f"d|{kind}|{key}", display)
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            break
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+    if overwrite:
+        users_table.put_item(Item=record)
+        return record
+    return _initialize(users_table, record, before)
+
+
+def _initialize(users_table, record, before):
+    """
+    Contagens com SET n = if_not_exists(n, 0) + (contado - lido antes) e exibições
+    com if_not_exists, em lotes. O primeiro lote grava initialized_at com a condição
+    attribute_not_exists; os seguintes exigem o mesmo initialized_at. Se outra
+    requisição inicializou antes, fica com o documento dela.
+    """
+    key = {"user_id": record["user_id"]}
+    counts = [a for a in dict.fromkeys(list(record) + list(before)) if a.startswith("n|")]
+    attrs = counts + [a for a in record if a.startswith("d|")]
+    chunks = [attrs[i : i + INIT_CHUNK] for i in range(0, len(attrs), INIT_CHUNK)] or [[]]
+    response = {}
+    for n, chunk in enumerate(chunks):
+        names = {"#init": "initialized_at"}
+        values = {":init": record["initialized_at"]}
+        parts = []
+        if n == 0:
+            parts.append("#init = :init")
+            condition = "attribute_not_exists(#init)"
+        else:
+            condition = "#init = :init"
+        for i, attr in enumerate(chunk):
+            names[f"#a{i}"] = attr
+            if attr.startswith("n|"):
+                values[":zero"] = 0
+                values[f":v{i}"] = int(record.get(attr) or 0) - int(before.get(attr) or 0)
+                parts.append(f"#a{i} = if_not_exists(#a{i}, :zero) + :v{i}")
+            else:
+                values[f":v{i}"] = record[attr]
+                parts.append(f"#a{i} = if_not_exists(#a{i}, :v{i})")
+        try:
+            response = users_table.update_item(
+                Key=key,
+                UpdateExpression="SET " + ", ".join(parts),
+                ConditionExpression=condition,
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+                ReturnValues="ALL_NEW",
+            )
+        except users_table.meta.client.exceptions.ConditionalCheckFailedException:
+            return users_table.get_item(Key=key, ConsistentRead=True).get("Item") or {}
+    return response.get("Attributes") or record
+
+
+def get_facets(users_table, account_id, statuses, itens_table=None):
+    """
+    Lê o documento (1 get_item) e devolve {tipo: [valores]} com os valores que
+    têm contagem > 0 em algum dos `statuses`, ordenados sem diferenciar caixa.
+    Se o documento não foi inicializado e itens_table foi passada, reconstrói.
+    """
+    if not account_id:
+        return {kind: [] for kind in FACET_KINDS}
+    try:
+        record = users_table.get_item(Key={"user_id": facets_key(account_id)}).get("Item") or {}
+    except Exception as e:
+        print(f"Erro ao ler facetas da conta {account_id}: {e}")
+        record = {}
+
+    if not record.get("initialized_at") and itens_table is not None:
+        try:
+            record = rebuild(users_table, itens_table, account_id)
+        except Exception as e:
+            print(f"Erro ao reconstruir facetas da conta {account_id}: {e}")
+
+    wanted = {str(s).strip().casefold() for s in (statuses or []) if str(s).strip()}
+    found = {kind: {} for kind in FACET_KINDS}
+    for attr, value in record.items():
+        if not attr.startswith("n|"):
+            continue
+        parts = attr.split("|", 3)
+        if len(parts) != 4:
+            continue
+        _, status, kind, key = parts
+        if status not in wanted or kind not in found:
+            continue
+        try:
+            if int(value) <= 0:
+                continue
+        except (TypeError, ValueError):
+            continue
+        found[kind][key] = str(record.get(f"d|{kind}|{key}") or key)
+
+    return {
+        kind: sorted(values.values(), key=lambda x: x.casefold())
+        for kind, values in found.items()
+    }
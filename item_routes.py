@@ -2,7 +2,6 @@ import datetime
 import uuid
 import os
 import hashlib
-import re
 from urllib.parse import urlparse, urlencode
 from boto3.dynamodb.conditions import Key, Attr
 
@@ -25,6 +24,15 @@ from utils import get_user_timezone
 
 from boto3.dynamodb.conditions import Key, Attr
 import schemas
+import catalog_snapshot
+import account_counters
+import item_facets
+import visit_buckets
+import visit_recorder
+import availability_index
+import item_cards
+import image_uploads
+import image_refs
 
 ALLOWED_EXTENSIONS = {"jpeg", "jpg", "png", "gif", "webp"}
 MAX_ITEM_IMAGES = 4
@@ -42,7 +50,7 @@ def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[-1].lower() in ALLOWED_EXTENSIONS
 
 
-from utils import upload_image_to_s3, aplicar_filtro, copy_image_in_s3
+from utils import upload_image_to_s3, aplicar_filtro
 import schemas
 
 
@@ -59,9 +67,10 @@ def init_item_routes(
     users_table,
     text_models_table,
     payment_transactions_table,
+    catalog_snapshot_table=None,
+    visits_table=None,
 ):
-
-    _top_visits_cache = {"data": None, "last_updated": 0}
+    visit_recorder.configure(itens_table, visits_table, catalog_snapshot_table)
 
     @app.route("/rented")
     def rented():
@@ -394,25 +403,10 @@ def init_item_routes(
         if request.method == "GET":
 
             #contar itens para limitar plano
-            total_itens = 0
-            exclusive_start_key = None
-            while True:
-              query_kwargs = {
-                  "IndexName": "account_id-created_at-index",
-                  "KeyConditionExpression": Key("account_id").eq(account_id),
-                  "FilterExpression": Attr("status").is_in(["available", "archive"]),
-                  "Select": "COUNT",
-              }
-
-              if exclusive_start_key:
-                  query_kwargs["ExclusiveStartKey"] = exclusive_start_key
-
-              response = itens_table.query(**query_kwargs)
-              total_itens += response.get("Count", 0)
-
-              exclusive_start_key = response.get("LastEvaluatedKey")
-              if not exclusive_start_key:
-                  break
+            counters = account_counters.get_counters(
+                users_table, account_id, itens_table, transactions_table, clients_table
+            )
+            total_itens = account_counters.count(counters, "items", "available", "archive")
 
             user_id = session.get("user_id")
             current_stripe_transaction = get_latest_transaction(user_id, users_table, payment_transactions_table)
@@ -522,19 +516,35 @@ def init_item_routes(
             except Exception:
                 image_bytes_for_ai = None
 
-            image_urls = [upload_image_to_s3(f) for f in image_files if allowed_file(f.filename)]
-            image_urls = [u for u in image_urls if u]
+            image_urls = []
+            image_renditions_by_url = {}
+            allowed_files = [f for f in image_files if allowed_file(f.filename)]
+            for url, renditions in image_uploads.upload_images(allowed_files, users_table):
+                if not url:
+                    continue
+                image_urls.append(url)
+                if renditions:
+                    image_renditions_by_url[url] = renditions
             if not image_urls:
                 flash("Formato de arquivo não permitido. Use JPEG, PNG ou WEBP.", "danger")
                 return redirect(request.url)
-            if len(image_urls) > MAX_ITEM_IMAGES:
-                flash(f"Limite de fotos por item: no máximo {MAX_ITEM_IMAGES}.", "danger")
-                return redirect(request.url)
+
+            def _discard_uploads():
+                # Item não foi gravado: devolve as referências das fotos enviadas
+                image_uploads.discard(users_table, image_urls)
 
             if main_index >= len(image_urls):
                 main_index = 0
 
             main_image_url = image_urls[main_index]
+            # A mesma foto enviada duas vezes aparece uma vez só (1 referência)
+            image_urls = list(dict.fromkeys(image_urls))
+            main_index = image_urls.index(main_image_url)
+
+            if len(image_urls) > MAX_ITEM_IMAGES:
+                _discard_uploads()
+                flash(f"Limite de fotos por item: no máximo {MAX_ITEM_IMAGES}.", "danger")
+                return redirect(request.url)
             
 
             for field in all_fields:
@@ -577,6 +587,7 @@ def init_item_routes(
                         try:
                             value = _parse_money_to_decimal(value)
                         except InvalidOperation:
+                            _discard_uploads()
                             flash(
                                 f"O campo {field.get('label') or field.get('title')} possui um número inválido.",
                                 "danger",
@@ -592,6 +603,8 @@ def init_item_routes(
 
             item_data["item_image_urls"] = image_urls
             item_data["item_main_image_index"] = main_index
+            if image_renditions_by_url:
+                item_data["item_image_renditions"] = image_renditions_by_url
 
             for slug in ["madrinha","formatura","gala","debutante","convidada","mae_dos_noivos","noiva","civil"]:
                 if request.form.get(f"occasion_{slug}") == "on":
@@ -618,6 +631,7 @@ def init_item_routes(
                 active_existing = [i for i in existing if i.get("status") != "deleted"]
 
                 if active_existing:
+                    _discard_uploads()
                     flash("Já existe um item com esse ID. Por favor, use um ID diferente.", "danger")
                     return render_template(
                         "add_item.html",
@@ -648,7 +662,14 @@ def init_item_routes(
 
             item_data = {k: v for k, v in item_data.items() if v is not None and v != ""}
 
-            itens_table.put_item(Item=item_data)
+            try:
+                itens_table.put_item(Item=item_data)
+            except Exception:
+                _discard_uploads()
+                raise
+            account_counters.item_status_changed(users_table, account_id, None, item_data.get("status"))
+            item_facets.item_changed(users_table, account_id, None, item_data)
+            catalog_snapshot.sync_item(catalog_snapshot_table, item_data)
 
 
             flash("Item adicionado com sucesso!", "success")
@@ -693,19 +714,13 @@ def init_item_routes(
 
 
 
-        response = transactions_table.query(
-            IndexName="item_id-index",
-            KeyConditionExpression="item_id = :item_id_val",
-            ExpressionAttributeValues={":item_id_val": item_id},
+        # Períodos ocupados do item (índice de disponibilidade da conta, 1 leitura)
+        availability = availability_index.load(
+            users_table, transaction.get("account_id") or account_id, transactions_table
+        )
+        reserved_ranges = availability_index.item_ranges(
+            availability, item_id, exclude_transaction_id=transaction_id
         )
-
-        reserved_ranges = [
-            [tx["rental_date"], tx["return_date"]]
-            for tx in response.get("Items", [])
-            if tx.get("transaction_status") in ["rented", "reserved"]
-            and tx.get("transaction_id") != transaction_id
-            and tx.get("rental_date") and tx.get("return_date")
-        ]
 
         if request.method == "POST":
             import re
@@ -725,6 +740,12 @@ def init_item_routes(
             updated_values["rental_date"] = rental_date
             updated_values["return_date"] = return_date
 
+            if transaction.get("transaction_status") in availability_index.ACTIVE_STATUSES and availability_index.has_conflict(
+                availability, item_id, rental_date, return_date, exclude_transaction_id=transaction_id
+            ):
+                flash("O item já está reservado ou retirado em parte desse período.", "danger")
+                return redirect(request.url)
+
             for field in fields_transaction:
                 field_id = field["id"]
                 raw_value = request.form.get(field_id, "").strip()
@@ -765,8 +786,11 @@ def init_item_routes(
 
             print("DEBUG update_args:", json.dumps(update_args, indent=2, default=str))
 
+            update_args["ReturnValues"] = "ALL_NEW"
+
             try:
-                transactions_table.update_item(**update_args)
+                updated_transaction = transactions_table.update_item(**update_args).get("Attributes") or {}
+                availability_index.sync_transaction(users_table, updated_transaction)
                 flash("Transação atualizada com sucesso.", "success")
                 return redirect(next_page)
             except Exception as e:
@@ -977,20 +1001,33 @@ def init_item_routes(
 
             uploaded_by_file_idx = {}
             new_urls = []
-            for idx, f in enumerate(image_files):
-                if not allowed_file(getattr(f, "filename", "")):
-                    continue
-                url = upload_image_to_s3(f)
+            image_renditions_by_url = item.get("item_image_renditions")
+            image_renditions_by_url = dict(image_renditions_by_url) if isinstance(image_renditions_by_url, dict) else {}
+            allowed_idx = [idx for idx, f in enumerate(image_files) if allowed_file(getattr(f, "filename", ""))]
+            uploads = image_uploads.upload_images([image_files[idx] for idx in allowed_idx], users_table)
+            for idx, (url, renditions) in zip(allowed_idx, uploads):
                 if not url:
                     continue
                 uploaded_by_file_idx[idx] = url
                 new_urls.append(url)
+                if renditions:
+                    image_renditions_by_url[url] = renditions
 
             if main_selected_url is None and main_selected_new_file_idx is not None:
                 main_selected_url = uploaded_by_file_idx.get(main_selected_new_file_idx)
 
-            merged_urls = [*existing_urls, *new_urls]
+            # Foto enviada de novo que o item já tinha: o item continua com 1 referência
+            previous_image_urls = set(image_refs.item_image_urls(item))
+            image_uploads.discard(users_table, [u for u in new_urls if u in previous_image_urls])
+            new_urls = list(dict.fromkeys(new_urls))
+
+            def _discard_uploads():
+                # Item não foi gravado: devolve as referências das fotos novas
+                image_uploads.discard(users_table, [u for u in new_urls if u not in previous_image_urls])
+
+            merged_urls = list(dict.fromkeys([*existing_urls, *new_urls]))
             if len(merged_urls) > MAX_ITEM_IMAGES:
+                _discard_uploads()
                 flash(f"Limite de fotos por item: no máximo {MAX_ITEM_IMAGES}.", "danger")
                 return redirect(request.url)
 
@@ -1101,6 +1138,7 @@ def init_item_routes(
                     try:
                         value = _parse_money_to_decimal(value)
                     except InvalidOperation:
+                        _discard_uploads()
                         flash(f"O campo {field['label']} possui valor inválido.", "danger")
                         return redirect(request.url)
                 elif field_type in ["cpf", "cnpj", "phone"]:
@@ -1110,6 +1148,9 @@ def init_item_routes(
                 updates[field_id] = value
 
             updates["item_image_urls"] = merged_urls
+            kept_renditions = {u: r for u, r in image_renditions_by_url.items() if u in merged_urls}
+            if kept_renditions or item.get("item_image_renditions"):
+                updates["item_image_renditions"] = kept_renditions
             if requested_main_index_final is not None:
                 updates["item_main_image_index"] = requested_main_index_final
 
@@ -1182,6 +1223,7 @@ def init_item_routes(
             clear_force_vision = (not force_vision) and bool(existing_force_vision)
 
             if not changes and not occasion_changes and not force_vision and not clear_force_vision:
+                _discard_uploads()
                 flash("Nenhuma alteração foi feita.", "warning")
                 return redirect(next_page)
             
@@ -1248,7 +1290,15 @@ def init_item_routes(
                 update_kwargs["ExpressionAttributeValues"] = expression_values
             if expression_names and any(name in update_kwargs["UpdateExpression"] for name in expression_names.keys()):
                 update_kwargs["ExpressionAttributeNames"] = expression_names
-            itens_table.update_item(**update_kwargs)
+            update_kwargs["ReturnValues"] = "ALL_NEW"
+            try:
+                updated_item = itens_table.update_item(**update_kwargs).get("Attributes") or {}
+            except Exception:
+                _discard_uploads()
+                raise
+            item_facets.item_changed(users_table, account_id, item, updated_item)
+            catalog_snapshot.sync_item(catalog_snapshot_table, updated_item)
+            item_cards.invalidate(item_id)
 
 
             # Atualizar transações relacionadas, se marcado
@@ -1279,6 +1329,21 @@ def init_item_routes(
 
                         transactions_table.update_item(**update_kwargs)
 
+            # Fotos que saíram do item perdem a referência, a não ser que alguma
+            # transação do item ainda mostre a foto (a transação copia as URLs)
+            kept_image_urls = set(image_refs.item_image_urls(updated_item))
+            removed_image_urls = [u for u in image_refs.item_image_urls(item) if u not in kept_image_urls]
+            if removed_image_urls:
+                try:
+                    in_transactions = image_refs.transaction_image_urls(transactions_table, item_id)
+                    image_refs.release_all(
+                        users_table,
+                        s3,
+                        s3_bucket_name,
+                        [u for u in removed_image_urls if u not in in_transactions],
+                    )
+                except Exception as e:
+                    print(f"Erro ao liberar fotos removidas do item {item_id}: {e}")
 
             flash("Item atualizado com sucesso.", "success")
             return redirect(next_page)
@@ -1521,6 +1586,17 @@ def init_item_routes(
                 flash("Formato de data inválido. Use DD/MM/AAAA.", "danger")
                 return render_template("rent.html", item={}, client={}, reserved_ranges=[], all_fields=all_fields, cliente_editavel=True, item_editavel=True, ordem=ordem)
 
+            # 🚫 Conflito de datas com reservas/retiradas do item (índice de disponibilidade)
+            if (
+                item_id
+                and item_id != "new"
+                and transaction_fixed_fields.get("transaction_status") in availability_index.ACTIVE_STATUSES
+            ):
+                availability = availability_index.load(users_table, account_id, transactions_table)
+                if availability_index.has_conflict(availability, item_id, rental_date, return_date):
+                    flash("O item já está reservado ou retirado em parte desse período.", "danger")
+                    return redirect(request.referrer or url_for("rent", item_id=item_id))
+
             # 👤 Criar ou atualizar cliente
             if not client_id:
                 client_id = str(uuid.uuid4().hex[:12])
@@ -1533,6 +1609,7 @@ def init_item_routes(
                         **{k: v for k, v in form_data.items() if k.startswith("client_")},
                     }
                 )
+                account_counters.client_added(users_table, account_id)
             else:
                 update_data = {k: v for k, v in form_data.items() if k.startswith("client_")}
                 if update_data:
@@ -1554,6 +1631,9 @@ def init_item_routes(
                     **{k: v for k, v in form_data.items() if k.startswith("item_")},
                 }
                 itens_table.put_item(Item=item)
+                account_counters.item_status_changed(users_table, account_id, None, "available")
+                item_facets.item_changed(users_table, account_id, None, item)
+                catalog_snapshot.sync_item(catalog_snapshot_table, item)
             else:
                 update_data = {k: v for k, v in form_data.items() if k.startswith("item_")}
                 if update_data:
@@ -1590,6 +1670,10 @@ def init_item_routes(
             # 🔐 Salvar
             try:
                 transactions_table.put_item(Item=transaction_item)
+                account_counters.transaction_status_changed(
+                    users_table, account_id, None, transaction_item.get("transaction_status")
+                )
+                availability_index.sync_transaction(users_table, transaction_item)
                 if transaction_item.get("transaction_status") == "reserved":
                     flash("Item <a href='/reserved'>reservado</a> com sucesso!", "success")
                 else:
@@ -1619,18 +1703,13 @@ def init_item_routes(
             response = itens_table.get_item(Key={"item_id": item_id})
             item = response.get("Item") or {}
 
-            # Buscar períodos reservados
-            response = transactions_table.query(
-                IndexName="item_id-index",
-                KeyConditionExpression=Key("item_id").eq(item_id),
+            # Períodos reservados (índice de disponibilidade da conta)
+            reserved_ranges = availability_index.item_ranges(
+                availability_index.load(
+                    users_table, item.get("account_id") or account_id, transactions_table
+                ),
+                item_id,
             )
-            transaction = response.get("Items", [])
-            reserved_ranges = [
-                [tx["rental_date"], tx["return_date"]]
-                for tx in transaction
-                if tx.get("transaction_status") in ["reserved", "rented"]
-                and tx.get("rental_date") and tx.get("return_date")
-            ]
 
         if client_id:
             response = clients_table.get_item(Key={"client_id": client_id})
@@ -1648,39 +1727,11 @@ def init_item_routes(
         all_fields = transaction_fields + client_fields + item_fields
 
         # Totais para controle de plano
-        total_relevant_transactions = 0
-        exclusive_start_key = None
-        while True:
-            query_params = {
-                "IndexName": "account_id-index",
-                "KeyConditionExpression": Key("account_id").eq(account_id),
-                "FilterExpression": Attr("transaction_status").is_in(["rented", "reserved"]),
-                "Select": "COUNT",
-            }
-            if exclusive_start_key:
-                query_params["ExclusiveStartKey"] = exclusive_start_key
-            response = transactions_table.query(**query_params)
-            total_relevant_transactions += response.get("Count", 0)
-            exclusive_start_key = response.get("LastEvaluatedKey")
-            if not exclusive_start_key:
-                break
-
-        total_itens = 0
-        exclusive_start_key = None
-        while True:
-            query_kwargs = {
-                "IndexName": "account_id-created_at-index",
-                "KeyConditionExpression": Key("account_id").eq(account_id),
-                "FilterExpression": Attr("status").is_in(["available", "archive"]),
-                "Select": "COUNT",
-            }
-            if exclusive_start_key:
-                query_kwargs["ExclusiveStartKey"] = exclusive_start_key
-            response = itens_table.query(**query_kwargs)
-            total_itens += response.get("Count", 0)
-            exclusive_start_key = response.get("LastEvaluatedKey")
-            if not exclusive_start_key:
-                break
+        counters = account_counters.get_counters(
+            users_table, account_id, itens_table, transactions_table, clients_table
+        )
+        total_relevant_transactions = account_counters.count(counters, "transactions", "rented", "reserved")
+        total_itens = account_counters.count(counters, "items", "available", "archive")
 
 
         return render_template(
@@ -1701,6 +1752,53 @@ def init_item_routes(
         )
 
     ###########################################################################################################
+    @app.route("/api/itens_livres")
+    def api_free_items():
+        """Itens disponíveis sem reserva/retirada entre ?inicio= e ?fim= (datas ISO)."""
+        if not session.get("logged_in"):
+            return jsonify({"error": "Não autenticado"}), 401
+
+        account_id = session.get("account_id")
+        start, end = availability_index.parse_dates(
+            request.args.get("inicio"), request.args.get("fim")
+        )
+        if not account_id or not start:
+            return jsonify({"error": "Informe inicio (e opcionalmente fim) no formato AAAA-MM-DD."}), 400
+
+        try:
+            busy = availability_index.busy_items(
+                availability_index.load(users_table, account_id, transactions_table), start, end
+            )
+
+            free_items = []
+            query_kwargs = {
+                "IndexName": "account_id-status-index",
+                "KeyConditionExpression": Key("account_id").eq(account_id) & Key("status").eq("available"),
+                "ProjectionExpression": "item_id, item_custom_id, item_description, item_image_url, item_value",
+            }
+            while True:
+                response = itens_table.query(**query_kwargs)
+                for item in response.get("Items", []):
+                    if item.get("item_id") not in busy:
+                        free_items.append(item)
+                last_evaluated_key = response.get("LastEvaluatedKey")
+                if not last_evaluated_key:
+                    break
+                query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+            return jsonify({
+                "inicio": start,
+                "fim": end,
+                "total": len(free_items),
+                "itens": [
+                    {k: (str(v) if isinstance(v, Decimal) else v) for k, v in item.items()}
+                    for item in free_items
+                ],
+            })
+        except Exception as e:
+            print(f"Erro ao buscar itens livres: {e}")
+            return jsonify({"error": "Erro ao buscar itens livres."}), 500
+
     @app.route("/view_calendar/<item_id>")
     def view_calendar(item_id):
         if not session.get("logged_in"):
@@ -1715,23 +1813,13 @@ def init_item_routes(
             flash("Item não encontrado ou já deletado.", "danger")
             return redirect(request.referrer or url_for("inventory"))
 
-        response = transactions_table.query(
-            IndexName="item_id-index",
-            KeyConditionExpression="item_id = :item_id_val",
-            ExpressionAttributeValues={":item_id_val": item_id},
+        reserved_ranges = availability_index.item_ranges(
+            availability_index.load(
+                users_table, item.get("account_id") or session.get("account_id"), transactions_table
+            ),
+            item_id,
         )
 
-        transactions = response.get("Items", [])
-        reserved_ranges = []
-
-        for tx in transactions:
-            if (
-                tx.get("transaction_status") in ["reserved", "rented"]
-                and tx.get("rental_date")
-                and tx.get("return_date")
-            ):
-                reserved_ranges.append([tx["rental_date"], tx["return_date"]])
-
         return render_template(
             "view_calendar.html",
             item=item,
@@ -1816,6 +1904,11 @@ def init_item_routes(
                         ":pending_remove": "pending_remove",
                     },
                 )
+                account_counters.item_status_changed(
+                    users_table, item.get("account_id"), item.get("status"), "deleted"
+                )
+                item_facets.item_changed(users_table, item.get("account_id"), item, {**item, "status": "deleted"})
+                catalog_snapshot.sync_item(catalog_snapshot_table, {**item, "status": "deleted"})
 
                 flash(
                     "Item marcado como deletado!",
@@ -1849,53 +1942,20 @@ def init_item_routes(
                 flash("Apenas itens marcados como deletados podem ser excluídos definitivamente.", "warning")
                 return redirect(url_for("trash_itens"))
 
-            user_id = item.get("user_id")
-            image_url = item.get("item_image_url") or item.get("image_url")
-
-            # Lógica de exclusão de imagem (similar ao purge)
-            deletar_imagem = True
-            if (
-                user_id
-                and image_url
-                and isinstance(image_url, str)
-                and image_url.strip()
-                and image_url != "N/A"
-            ):
-                # Buscar todos os itens com o mesmo user_id para verificar reutilização de imagem
-                response_scan = itens_table.scan(
-                    FilterExpression="user_id = :user_id",
-                    ExpressionAttributeValues={":user_id": user_id},
+            # Remover o item do DynamoDB (condicional: duas exclusões simultâneas não
+            # liberam as fotos duas vezes)
+            try:
+                itens_table.delete_item(
+                    Key={"item_id": item_id},
+                    ConditionExpression=Attr("status").eq("deleted"),
                 )
-
-                itens_do_usuario = response_scan.get("Items", [])
-
-                # Verificar se a imagem está em uso por outro item (que não seja este mesmo)
-                for outro_item in itens_do_usuario:
-                    if outro_item["item_id"] == item_id:
-                        continue
-                        
-                    other_img = outro_item.get("item_image_url") or outro_item.get("image_url")
-                    if other_img == image_url:
-                        deletar_imagem = False
-                        break
-
-            # Se não houver outro item usando a mesma imagem, deletar do S3
-            if (
-                deletar_imagem
-                and image_url
-                and isinstance(image_url, str)
-                and image_url.strip()
-                and image_url != "N/A"
-            ):
-                try:
-                    parsed_url = urlparse(image_url)
-                    object_key = parsed_url.path.lstrip("/")
-                    s3.delete_object(Bucket=s3_bucket_name, Key=object_key)
-                except Exception as e:
-                    print(f"Erro ao deletar imagem do S3: {e}")
-
-            # Remover o item do DynamoDB
-            itens_table.delete_item(Key={"item_id": item_id})
+            except itens_table.meta.client.exceptions.ConditionalCheckFailedException:
+                flash("Item não encontrado.", "danger")
+                return redirect(url_for("trash_itens"))
+            # Cada foto perde uma referência; a última apaga os objetos do S3 (image_refs)
+            image_refs.release_all(users_table, s3, s3_bucket_name, image_refs.item_image_urls(item))
+            account_counters.item_status_changed(users_table, item.get("account_id"), "deleted", None)
+            item_facets.item_changed(users_table, item.get("account_id"), item, None)
 
             flash("Item excluído definitivamente.", "success")
 
@@ -1927,8 +1987,6 @@ def init_item_routes(
 
             for item in itens_deletados:
                 deleted_date_str = item.get("deleted_date")
-                user_id = item.get("user_id")  # Chave primária para verificação
-                image_url = item.get("image_url")
 
                 if deleted_date_str:
                     try:
@@ -1941,46 +1999,25 @@ def init_item_routes(
                         if deleted_date < limite_data:
                             item_id = item["item_id"]
 
-                            # Se a imagem existe, verificar se ela é usada em outro item ativo
-                            deletar_imagem = True
-                            if (
-                                user_id
-                                and image_url
-                                and isinstance(image_url, str)
-                                and image_url.strip()
-                            ):
-                                # Buscar todos os itens com o mesmo user_id
-                                response_email = itens_table.scan(
-                                    FilterExpression="user_id = :user_id",
-                                    ExpressionAttributeValues={":user_id": user_id},
-                                )
-
-                                itens_com_mesmo_user_id = response_email.get(
-                                    "Items", []
+                            # Remover o item do DynamoDB
+                            try:
+                                itens_table.delete_item(
+                                    Key={"item_id": item_id},
+                                    ConditionExpression=Attr("status").eq("deleted"),
                                 )
+                            except itens_table.meta.client.exceptions.ConditionalCheckFailedException:
+                                # Restaurado ou já excluído por outra requisição
+                                continue
 
-                                # Verificar se a imagem está em uso por outro item que não está "deleted"
-                                for outro_item in itens_com_mesmo_user_id:
-                                    if (
-                                        outro_item.get("image_url") == image_url
-                                        and outro_item.get("status") != "deleted"
-                                    ):
-                                        deletar_imagem = False
-                                        total_imagens_preservadas += 1
-                                        break  # Se encontrou um ativo, não precisa verificar mais
-
-                            # Se não houver outro item ativo usando a mesma imagem, deletar do S3
-                            if (
-                                deletar_imagem
-                                and isinstance(image_url, str)
-                                and image_url.strip()
-                            ):
-                                parsed_url = urlparse(image_url)
-                                object_key = parsed_url.path.lstrip("/")
-                                s3.delete_object(Bucket=s3_bucket_name, Key=object_key)
+                            # Cada foto perde uma referência; só a última apaga do S3
+                            for image_url in image_refs.item_image_urls(item):
+                                if not image_refs.release(users_table, s3, s3_bucket_name, image_url):
+                                    total_imagens_preservadas += 1
 
-                            # Remover o item do DynamoDB
-                            itens_table.delete_item(Key={"item_id": item_id})
+                            account_counters.item_status_changed(
+                                users_table, item.get("account_id"), "deleted", None
+                            )
+                            item_facets.item_changed(users_table, item.get("account_id"), item, None)
                             total_itens_removidos += 1
 
                     except ValueError:
@@ -2018,11 +2055,25 @@ def init_item_routes(
             previous_status = item.get("previous_status")
 
             # 🔹 Atualizar o status do item no banco
-            itens_table.update_item(
+            restored = itens_table.update_item(
                 Key={"item_id": item_id},
                 UpdateExpression="SET #status = :previous_status, embedding_status = :pending",
                 ExpressionAttributeNames={"#status": "status"},
                 ExpressionAttributeValues={":previous_status": previous_status, ":pending": "pending"},
+                ReturnValues="ALL_OLD",
+            ).get("Attributes") or {}
+            account_counters.item_status_changed(
+                users_table,
+                restored.get("account_id") or session.get("account_id"),
+                restored.get("status"),
+                previous_status,
+            )
+            if restored:
+                item_facets.item_changed(
+                    users_table, None, restored, {**restored, "status": previous_status}
+                )
+            catalog_snapshot.sync_item_by_id(
+                catalog_snapshot_table, itens_table, item_id, account_id=session.get("account_id")
             )
 
             # flash(f"Item {item_id} restaurado para {previous_status}.", "success")
@@ -2069,13 +2120,25 @@ def init_item_routes(
             transaction_previous_status = transaction.get("transaction_previous_status")
 
             # 🔹 Atualizar o status do item no banco
-            transactions_table.update_item(
+            restored = transactions_table.update_item(
                 Key={"transaction_id": transaction_id},
                 UpdateExpression="SET #transaction_status = :transaction_previous_status",
                 ExpressionAttributeNames={"#transaction_status": "transaction_status"},
                 ExpressionAttributeValues={
                     ":transaction_previous_status": transaction_previous_status
                 },
+                ReturnValues="ALL_OLD",
+            ).get("Attributes") or {}
+            account_counters.transaction_status_changed(
+                users_table,
+                restored.get("account_id") or session.get("account_id"),
+                restored.get("transaction_status"),
+                transaction_previous_status,
+            )
+            availability_index.sync_transaction(
+                users_table,
+                {**restored, "transaction_status": transaction_previous_status},
+                account_id=session.get("account_id"),
             )
 
             status_map = {
@@ -2138,15 +2201,8 @@ def init_item_routes(
                             ExpressionAttributeValues={":zero": 0},
                         )
 
-                import boto3
-
-                dynamodb_resource = boto3.resource(
-                    "dynamodb",
-                    region_name=os.getenv("AWS_REGION", "us-east-1"),
-                    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-                )
-                visits_table = dynamodb_resource.Table("alugueqqc_item_visits")
+                # Descarrega o buffer antes, para não regravar visitas depois do reset
+                visit_recorder.flush()
 
                 deleted_rows = 0
                 with visits_table.batch_writer() as batch:
@@ -2177,6 +2233,8 @@ def init_item_routes(
                             if not last_evaluated_key:
                                 break
 
+                deleted_rows += visit_buckets.reset(visits_table, account_id)
+
                 flash(
                     f"Placar de visualizações zerado com sucesso ({len(item_ids)} itens, {deleted_rows} registros de visitas removidos).",
                     "success",
@@ -2226,87 +2284,18 @@ def init_item_routes(
         username = session.get("username", None)
 
         stats = {}
-        # aqui vamos pegar ps totais, sem filtro de data.
-        # Contadores iniciais
-        stats["total_items_available"] = 0
-        stats["total_items_archived"] = 0
-
-        # Lista de status que queremos contar
-        status_targets = {
-            "available": "total_items_available",
-            "archive": "total_items_archived",
-        }
-
-        # Loop por cada status
-        for status_value, stats_key in status_targets.items():
-            last_evaluated_key = None
-
-            while True:
-                query_params = {
-                    "IndexName": "account_id-status-index",
-                    "KeyConditionExpression": Key("account_id").eq(account_id)
-                    & Key("status").eq(status_value),
-                    "Select": "COUNT",
-                }
-
-                if last_evaluated_key:
-                    query_params["ExclusiveStartKey"] = last_evaluated_key
-
-                response = itens_table.query(**query_params)
-                stats[stats_key] += response.get("Count", 0)
-
-                last_evaluated_key = response.get("LastEvaluatedKey")
-                if not last_evaluated_key:
-                    break
-
-        stats["total_clients"] = 0
-        last_evaluated_key = None
-
-        while True:
-            query_params = {
-                "IndexName": "account_id-index",
-                "KeyConditionExpression": Key("account_id").eq(account_id),
-                "Select": "COUNT",
-            }
-
-            if last_evaluated_key:
-                query_params["ExclusiveStartKey"] = last_evaluated_key
-
-            response = clients_table.query(**query_params)
-            stats["total_clients"] += response.get("Count", 0)
-
-            last_evaluated_key = response.get("LastEvaluatedKey")
-            if not last_evaluated_key:
-                break
-
-        def count_transactions_by_status(account_id, status):
-            total = 0
-            last_evaluated_key = None
-
-            while True:
-                query_params = {
-                    "IndexName": "account_id-transaction_status-index",
-                    "KeyConditionExpression": Key("account_id").eq(account_id)
-                    & Key("transaction_status").eq(status),
-                    "Select": "COUNT",
-                }
-
-                if last_evaluated_key:
-                    query_params["ExclusiveStartKey"] = last_evaluated_key
-
-                response = transactions_table.query(**query_params)
-                total += response.get("Count", 0)
-
-                last_evaluated_key = response.get("LastEvaluatedKey")
-                if not last_evaluated_key:
-                    break
-
-            return total
+        # aqui vamos pegar ps totais, sem filtro de data (um get_item nos contadores da conta)
+        counters = account_counters.get_counters(
+            users_table, account_id, itens_table, transactions_table, clients_table
+        )
+        stats["total_items_available"] = account_counters.count(counters, "items", "available")
+        stats["total_items_archived"] = account_counters.count(counters, "items", "archive")
+        stats["total_clients"] = max(int(counters.get("clients_total") or 0), 0)
 
         # 🔢 Aplicando para cada status
-        stats["total_rented"] = count_transactions_by_status(account_id, "rented")
-        stats["total_returned"] = count_transactions_by_status(account_id, "returned")
-        stats["total_reserved"] = count_transactions_by_status(account_id, "reserved")
+        stats["total_rented"] = account_counters.count(counters, "transactions", "rented")
+        stats["total_returned"] = account_counters.count(counters, "transactions", "returned")
+        stats["total_reserved"] = account_counters.count(counters, "transactions", "reserved")
 
         # Define os valores padrão
         end_date_default = datetime.datetime.now(user_utc).date()
@@ -2394,6 +2383,7 @@ def init_item_routes(
 
         # 🧠 Filtragem por data + filtros extras
 
+        atende_filtros = compilar_filtros_dinamicos(filtros, fields_config, image_url_required)
         filtered_transactions = []
         for transaction in transactions:
             try:
@@ -2407,7 +2397,7 @@ def init_item_routes(
             except Exception as e:
                 continue
 
-            if not entidade_atende_filtros_dinamico(transaction, filtros, fields_config, image_url_required):
+            if not atende_filtros(transaction):
                 continue
 
             filtered_transactions.append(transaction)
@@ -2475,46 +2465,10 @@ def init_item_routes(
 
         # 🔄 Total de transações ativas (rented + reserved)
         current_stripe_transaction = get_latest_transaction(user_id, users_table, payment_transactions_table)
-        total_relevant_transactions = 0
-        exclusive_start_key = None
-        try:
-            while True:
-                query_params = {
-                    "IndexName": "account_id-index",
-                    "KeyConditionExpression": Key("account_id").eq(account_id),
-                    "FilterExpression": Attr("transaction_status").is_in(["rented", "reserved"]),
-                    "Select": "COUNT",
-                }
-                if exclusive_start_key:
-                    query_params["ExclusiveStartKey"] = exclusive_start_key
-                response = transactions_table.query(**query_params)
-                total_relevant_transactions += response.get("Count", 0)
-                exclusive_start_key = response.get("LastEvaluatedKey")
-                if not exclusive_start_key:
-                    break
-        except Exception as e:
-            print(f"Erro ao contar transações ativas: {e}")
+        total_relevant_transactions = account_counters.count(counters, "transactions", "rented", "reserved")
 
         # 🔄 Total de itens ativos (available + archive)
-        total_itens = 0
-        exclusive_start_key = None
-        try:
-            while True:
-                query_kwargs = {
-                    "IndexName": "account_id-created_at-index",
-                    "KeyConditionExpression": Key("account_id").eq(account_id),
-                    "FilterExpression": Attr("status").is_in(["available", "archive"]),
-                    "Select": "COUNT",
-                }
-                if exclusive_start_key:
-                    query_kwargs["ExclusiveStartKey"] = exclusive_start_key
-                response = itens_table.query(**query_kwargs)
-                total_itens += response.get("Count", 0)
-                exclusive_start_key = response.get("LastEvaluatedKey")
-                if not exclusive_start_key:
-                    break
-        except Exception as e:
-            print(f"Erro ao contar itens ativos: {e}")
+        total_itens = account_counters.count(counters, "items", "available", "archive")
 
         top_sort = (request.args.get("top_sort") or "30d").strip().lower()
         if top_sort not in {"30d", "total"}:
@@ -2541,51 +2495,10 @@ def init_item_routes(
                 )
                 all_account_items.extend(response.get("Items", []))
 
-            import boto3
-            import time as _time
             recent_visits_map = {}
-            item_ids = {
-                str(item.get("item_id"))
-                for item in all_account_items
-                if isinstance(item, dict) and item.get("item_id")
-            }
-            if item_ids:
-                _now = _time.time()
-                if _top_visits_cache["data"] is not None and _now - _top_visits_cache["last_updated"] < 1800:
-                    recent_visits_map = _top_visits_cache["data"]
-                else:
-                    dynamodb_resource = boto3.resource(
-                        "dynamodb",
-                        region_name=os.getenv("AWS_REGION", "us-east-1"),
-                        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-                    )
-                    visits_table = dynamodb_resource.Table("alugueqqc_item_visits")
-                    cutoff_date = (datetime.datetime.now() - datetime.timedelta(days=30)).isoformat()
-                    visits_response = visits_table.scan(
-                        FilterExpression=Attr("timestamp").gte(cutoff_date),
-                        ProjectionExpression="item_id",
-                        Limit=50000,
-                    )
-                    visit_rows = visits_response.get("Items", [])
-                    pages = 1
-                    while "LastEvaluatedKey" in visits_response and pages < 5:
-                        visits_response = visits_table.scan(
-                            FilterExpression=Attr("timestamp").gte(cutoff_date),
-                            ProjectionExpression="item_id",
-                            Limit=50000,
-                            ExclusiveStartKey=visits_response["LastEvaluatedKey"],
-                        )
-                        visit_rows.extend(visits_response.get("Items", []))
-                        pages += 1
-
-                    for visit in visit_rows:
-                        visited_item_id = str(visit.get("item_id") or "")
-                        if visited_item_id and visited_item_id in item_ids:
-                            recent_visits_map[visited_item_id] = recent_visits_map.get(visited_item_id, 0) + 1
-
-                    _top_visits_cache["data"] = recent_visits_map
-                    _top_visits_cache["last_updated"] = _now
+            if all_account_items:
+                # Soma exata dos 30 baldes diários da conta (sem scan)
+                recent_visits_map = visit_buckets.recent_counts(visits_table, account_id)
 
             for item in all_account_items:
                 item_id = str(item.get("item_id") or "")
@@ -2708,66 +2621,9 @@ def init_item_routes(
                     if client_ip:
                         visitor_key = f"ip:{hashlib.sha256(client_ip.encode('utf-8')).hexdigest()[:32]}"
 
-            import time
-            import boto3
-
-            timestamp = datetime.datetime.now().isoformat()
-            ttl_value = int(time.time()) + (30 * 24 * 60 * 60)
-
-            dynamodb_resource = boto3.resource(
-                'dynamodb',
-                region_name=os.getenv('AWS_REGION', 'us-east-1'),
-                aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-                aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')
-            )
-            visits_table = dynamodb_resource.Table("alugueqqc_item_visits")
-
-            already_counted = False
-            if visitor_key:
-                try:
-                    query_kwargs = {
-                        "KeyConditionExpression": Key("item_id").eq(item_id),
-                        "FilterExpression": Attr("visitor_key").eq(visitor_key),
-                        "ProjectionExpression": "item_id, #ts",
-                        "ExpressionAttributeNames": {"#ts": "timestamp"},
-                    }
-                    response = visits_table.query(**query_kwargs)
-                    if response.get("Items"):
-                        already_counted = True
-                    while (not already_counted) and response.get("LastEvaluatedKey"):
-                        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
-                        response = visits_table.query(**query_kwargs)
-                        if response.get("Items"):
-                            already_counted = True
-                            break
-                except Exception as e_check:
-                    print(f"Error checking prior visit for item {item_id}: {e_check}")
-
-            if already_counted:
-                return jsonify({"success": True, "counted": False}), 200
-
-            itens_table.update_item(
-                Key={"item_id": item_id},
-                UpdateExpression="ADD visit_count :inc",
-                ExpressionAttributeValues={":inc": 1}
-            )
-
-            try:
-                visits_item = {
-                    "item_id": item_id,
-                    "timestamp": timestamp,
-                    "ttl": ttl_value
-                }
-                if visitor_key:
-                    visits_item["visitor_key"] = visitor_key
-
-                visits_table.put_item(
-                    Item=visits_item
-                )
-            except Exception as e_log:
-                print(f"Error logging visit for item {item_id}: {e_log}")
-
-            return jsonify({"success": True, "counted": True}), 200
+            # Só memória: deduplica e soma no buffer; a thread do visit_recorder grava em lote
+            counted = visit_recorder.record(item_id, visitor_key)
+            return jsonify({"success": True, "counted": counted}), 200
         except Exception as e:
             print(f"Error incrementing visit count for item {item_id}: {e}")
             return jsonify({"error": str(e)}), 500
@@ -2888,25 +2744,45 @@ def list_transactions(
         transaction_id = request.args.get("transaction_id")
 
     # 🔍 Exibe apenas transações específicas, se item_id, client_id ou transaction_id estiverem definidos
+    # Vai direto pela chave (get_item / item_id-index / client_id-index), sem ler a conta inteira
     if item_id or client_id or transaction_id:
-        query_kwargs = {
-            "IndexName": "account_id-created_at-index",
-            "KeyConditionExpression": Key("account_id").eq(account_id),
-            "ScanIndexForward": False,
-        }
-
-        transacoes = transactions_table.query(**query_kwargs).get("Items", [])
+        if transaction_id:
+            txn = transactions_table.get_item(Key={"transaction_id": transaction_id}).get("Item")
+            transacoes = [txn] if txn else []
+        else:
+            if item_id:
+                index_name, key_name, key_value = "item_id-index", "item_id", item_id
+            else:
+                index_name, key_name, key_value = "client_id-index", "client_id", client_id
+            filter_expression = Attr("account_id").eq(account_id)
+            if status_list:
+                filter_expression = filter_expression & Attr("transaction_status").is_in(status_list)
+            query_kwargs = {
+                "IndexName": index_name,
+                "KeyConditionExpression": Key(key_name).eq(key_value),
+                "FilterExpression": filter_expression,
+            }
+            transacoes = []
+            while True:
+                response = transactions_table.query(**query_kwargs)
+                transacoes.extend(response.get("Items", []))
+                last_evaluated_key = response.get("LastEvaluatedKey")
+                if not last_evaluated_key:
+                    break
+                query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+            # Mesma ordem do account_id-created_at-index (mais recentes primeiro)
+            transacoes.sort(key=lambda t: str(t.get("created_at") or ""), reverse=True)
 
         transacoes_filtradas = []
         for txn in transacoes:
+            if txn.get("account_id") != account_id:
+                continue
             if status_list and txn.get("transaction_status") not in status_list:
                 continue
             if item_id and txn.get("item_id") != item_id:
                 continue
             if client_id and txn.get("client_id") != client_id:
                 continue
-            if transaction_id and txn.get("transaction_id") != transaction_id:
-                continue
             transacoes_filtradas.append(process_dates(txn))
 
         return render_template(
@@ -2965,14 +2841,27 @@ def list_transactions(
     last_valid_item = None
     raw_last_evaluated_key = None
 
+    # O que o DynamoDB consegue filtrar vai na query; o resto fica no Python
+    pushdown = traduzir_filtros_dynamo(filtros, fields_config, created_at_na_chave=True)
+    atende_filtros = compilar_filtros_dinamicos(pushdown["residual"], fields_config, image_url_required)
+    key_condition = Key("account_id").eq(account_id)
+    if pushdown["created_range"]:
+        key_condition = key_condition & Key("created_at").between(*pushdown["created_range"])
+    filter_expression = pushdown["filter"]
+    if status_list:
+        status_condition = Attr("transaction_status").is_in(list(status_list))
+        filter_expression = status_condition if filter_expression is None else status_condition & filter_expression
+    avaliados = 0
 
     while len(valid_itens) < limit:
         query_kwargs = {
             "IndexName": "account_id-created_at-index",
-            "KeyConditionExpression": Key("account_id").eq(account_id),
+            "KeyConditionExpression": key_condition,
             "ScanIndexForward": False,
             "Limit": batch_size,
         }
+        if filter_expression is not None:
+            query_kwargs["FilterExpression"] = filter_expression
 
         if exclusive_start_key:
             query_kwargs["ExclusiveStartKey"] = exclusive_start_key
@@ -2980,15 +2869,16 @@ def list_transactions(
         response = transactions_table.query(**query_kwargs)
         transacoes = response.get("Items", [])
         raw_last_evaluated_key = response.get("LastEvaluatedKey")
+        avaliados += response.get("ScannedCount", len(transacoes))
 
-        if not transacoes:
+        if not transacoes and not raw_last_evaluated_key:
             break
 
         for txn in transacoes:
             if status_list and txn.get("transaction_status") not in status_list:
                 continue
             # filtro dinâmico geral
-            if not entidade_atende_filtros_dinamico(txn, filtros, fields_config, image_url_required):
+            if not atende_filtros(txn):
 
                 continue
 
@@ -3002,6 +2892,7 @@ def list_transactions(
         if len(valid_itens) < limit:
             if raw_last_evaluated_key:
                 exclusive_start_key = raw_last_evaluated_key
+                batch_size = tamanho_lote_adaptativo(avaliados, len(valid_itens), limit - len(valid_itens))
             else:
                 break
 
@@ -3105,7 +2996,7 @@ def get_valor_item(item, field):
     field_id = field["id"]
     return item.get(field_id, "")
 
-from utils import entidade_atende_filtros_dinamico  # certifique-se de importar isso corretamente
+from utils import compilar_filtros_dinamicos, traduzir_filtros_dynamo, tamanho_lote_adaptativo
 from utils import converter_intervalo_data_br_para_iso  # certifique-se de importar isso corretamente
 
 
@@ -3182,18 +3073,7 @@ def list_raw_itens(
         return sorted(cleaned, key=lambda x: x.casefold())
 
     def _split_color_tokens(value):
-        if value is None:
-            return []
-        if isinstance(value, (list, tuple, set)):
-            out = []
-            for v in value:
-                out.extend(_split_color_tokens(v))
-            return out
-        text = str(value).strip()
-        if not text:
-            return []
-        parts = re.split(r"[/,;]|\s+e\s+", text, flags=re.IGNORECASE)
-        return [p.strip() for p in parts if str(p).strip()]
+        return item_facets.split_color_tokens(value)
 
     def _merge_unique(existing_map, values):
         for v in values:
@@ -3247,48 +3127,11 @@ def list_raw_itens(
                     _merge_unique(commercial_colors_map, _split_color_tokens(option))
                     _merge_unique(all_colors_map, _split_color_tokens(option))
 
-        exclusive_start_key = None
-
-        while True:
-            query_kwargs = {
-                "IndexName": "account_id-created_at-index",
-                "KeyConditionExpression": Key("account_id").eq(account_id),
-                "ProjectionExpression": "item_id, #st, cor, cores, color, item_cor, item_color, cor_base, color_base, cor_comercial, color_comercial",
-                "ExpressionAttributeNames": {"#st": "status"},
-                "ScanIndexForward": False,
-                "Limit": 200,
-            }
-            if exclusive_start_key:
-                query_kwargs["ExclusiveStartKey"] = exclusive_start_key
-
-            response = itens_table.query(**query_kwargs)
-            items_batch = response.get("Items", [])
-
-            for item in items_batch:
-                status = str(item.get("status") or "").strip().casefold()
-                if status not in allowed:
-                    continue
-
-                base_tokens = _split_color_tokens(item.get("cor_base") or item.get("color_base"))
-                commercial_tokens = _split_color_tokens(item.get("cor_comercial") or item.get("color_comercial"))
-                fallback_tokens = _split_color_tokens(
-                    item.get("cor")
-                    or item.get("cores")
-                    or item.get("color")
-                    or item.get("item_cor")
-                    or item.get("item_color")
-                )
-
-                effective_commercial = commercial_tokens or fallback_tokens
-                effective_all = effective_commercial or base_tokens
-
-                _merge_unique(base_colors_map, base_tokens)
-                _merge_unique(commercial_colors_map, effective_commercial)
-                _merge_unique(all_colors_map, effective_all)
-
-            exclusive_start_key = response.get("LastEvaluatedKey")
-            if not exclusive_start_key:
-                break
+        # Valores usados pelos itens nesses status: um get_item no documento de facetas
+        facets = item_facets.get_facets(users_table, account_id, allowed, itens_table=itens_table)
+        _merge_unique(base_colors_map, facets.get("base") or [])
+        _merge_unique(commercial_colors_map, facets.get("commercial") or [])
+        _merge_unique(all_colors_map, facets.get("all") or [])
 
         all_colors = sorted(all_colors_map.values(), key=lambda x: x.casefold())
         base_colors = sorted(base_colors_map.values(), key=lambda x: x.casefold())
@@ -3317,6 +3160,19 @@ def list_raw_itens(
     item_id = filtros.pop("item_id", None)
     page = int(filtros.pop("page", 1))
 
+    # Filtro "livre entre": itens sem reserva/retirada no período (índice de disponibilidade)
+    busy_item_ids = None
+    livre_de = filtros.pop("livre_de", None)
+    livre_ate = filtros.pop("livre_ate", None)
+    if livre_de:
+        free_start, free_end = availability_index.parse_dates(livre_de, livre_ate)
+        if free_start:
+            busy_item_ids = availability_index.busy_items(
+                availability_index.load(users_table, account_id, transactions_table),
+                free_start,
+                free_end,
+            )
+
     image_url_filter = request.args.get("item_image_url") or None
     image_url_required = image_url_filter.lower() == "true" if image_url_filter is not None else None
 
@@ -3417,6 +3273,21 @@ def list_raw_itens(
         use_occasion_gsi = True
         occasion_index_name = f"occasion_{occasion_filter}-index"
 
+    # Status, ocasiões e os filtros que o DynamoDB expressa vão na query;
+    # o resto (texto, cores, tamanhos, período livre) continua no Python
+    pushdown = traduzir_filtros_dynamo(filtros, fields_config)
+    atende_filtros = compilar_filtros_dinamicos(pushdown["residual"], fields_config, image_url_required)
+    filter_expression = Attr("status").is_in(list(status_list))
+    if selected_occasions:
+        occasion_condition = None
+        for occ in selected_occasions:
+            condition = Attr(f"occasion_{occ}").eq("1")
+            occasion_condition = condition if occasion_condition is None else occasion_condition | condition
+        filter_expression = filter_expression & occasion_condition
+    if pushdown["filter"] is not None:
+        filter_expression = filter_expression & pushdown["filter"]
+    avaliados = 0
+
     while len(valid_itens) < limit:
         stopped_early = False
         if use_occasion_gsi:
@@ -3424,6 +3295,7 @@ def list_raw_itens(
             query_kwargs = {
                 "IndexName": occasion_index_name,
                 "KeyConditionExpression": Key(f"occasion_{occasion_filter}").eq("1") & Key("account_id").eq(account_id),
+                "FilterExpression": filter_expression,
                 "Limit": batch_size,
             }
         else:
@@ -3431,6 +3303,7 @@ def list_raw_itens(
             query_kwargs = {
                 "IndexName": "account_id-created_at-index",
                 "KeyConditionExpression": Key("account_id").eq(account_id),
+                "FilterExpression": filter_expression,
                 "ScanIndexForward": False,
                 "Limit": batch_size,
             }
@@ -3453,8 +3326,9 @@ def list_raw_itens(
             raise
         itens_batch = response.get("Items", [])
         raw_last_evaluated_key = response.get("LastEvaluatedKey")
+        avaliados += response.get("ScannedCount", len(itens_batch))
 
-        if not itens_batch:
+        if not itens_batch and not raw_last_evaluated_key:
             break
 
         last_scanned_item = None
@@ -3476,6 +3350,9 @@ def list_raw_itens(
             if use_occasion_gsi and item.get("status") not in status_list:
                 continue
 
+            if busy_item_ids and item.get("item_id") in busy_item_ids:
+                continue
+
             if selected_occasions:
                 item_matches_any = False
                 for occ in selected_occasions:
@@ -3485,7 +3362,7 @@ def list_raw_itens(
                 if not item_matches_any:
                     continue
 
-            if entidade_atende_filtros_dinamico(item, filtros, fields_config, image_url_required):
+            if atende_filtros(item):
                 valid_itens.append(item)
                 last_valid_item = item
 
@@ -3514,6 +3391,7 @@ def list_raw_itens(
         if len(valid_itens) < limit:
             if raw_last_evaluated_key:
                 exclusive_start_key = raw_last_evaluated_key
+                batch_size = tamanho_lote_adaptativo(avaliados, len(valid_itens), limit - len(valid_itens))
             else:
                 break
 
@@ -0,0 +1,112 @@
+"""
+Migração para a busca de prova por id (agenda_engine.find_fitting):
+
+  1. Preenche fitting_id nas provas antigas que não têm o atributo, a partir do
+     sufixo de date_time_local ("YYYY-MM-DD#HH:MM#<fitting_id>").
+  2. Cria o GSI fitting_id-index (fitting_id HASH, projeção ALL) em
+     alugueqqc_fittings_table. O DynamoDB popula o índice com as provas existentes.
+
+    python migrate_fitting_id_index.py [--dry-run]
+"""
+
+import argparse
+import os
+import time
+
+import boto3
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TABLE_NAME = "alugueqqc_fittings_table"
+INDEX_NAME = "fitting_id-index"
+
+
+def _aws_kwargs():
+    return {
+        "region_name": os.getenv("AWS_REGION", "us-east-1"),
+        "aws_access_key_id": os.getenv("AWS_ACCESS_KEY_ID"),
+        "aws_secret_access_key": os.getenv("AWS_SECRET_ACCESS_KEY"),
+    }
+
+
+def backfill_fitting_ids(dry_run=False):
+    table = boto3.resource("dynamodb", **_aws_kwargs()).Table(TABLE_NAME)
+    scan_kwargs = {"ProjectionExpression": "account_id, date_time_local, fitting_id"}
+    scanned = 0
+    fixed = 0
+    while True:
+        response = table.scan(**scan_kwargs)
+        for fitting in response.get("Items", []):
+            scanned += 1
+            if fitting.get("fitting_id"):
+                continue
+            fitting_id = str(fitting.get("date_time_local") or "").split("#")[-1].strip()
+            if not fitting_id:
+                print(f"[SKIP] Sem id no date_time_local: {fitting}")
+                continue
+            print(f"[FIX] {fitting['account_id']} {fitting['date_time_local']} -> fitting_id={fitting_id}")
+            fixed += 1
+            if dry_run:
+                continue
+            table.update_item(
+                Key={"account_id": fitting["account_id"], "date_time_local": fitting["date_time_local"]},
+                UpdateExpression="SET fitting_id = :fid",
+                ConditionExpression="attribute_not_exists(fitting_id)",
+                ExpressionAttributeValues={":fid": fitting_id},
+            )
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            break
+        scan_kwargs["ExclusiveStartKey"] = last_evaluated_key
+    print(f"{scanned} provas lidas, {fixed} sem fitting_id{' (dry-run)' if dry_run else ' corrigidas'}.")
+
+
+def create_fitting_id_index(dry_run=False):
+    dynamodb = boto3.client("dynamodb", **_aws_kwargs())
+    desc = dynamodb.describe_table(TableName=TABLE_NAME)
+    existing_indexes = [g["IndexName"] for g in desc["Table"].get("GlobalSecondaryIndexes", [])]
+    if INDEX_NAME in existing_indexes:
+        print(f"[SKIP] Índice {INDEX_NAME} já existe.")
+        return
+    if dry_run:
+        print(f"[PLAN] Criaria o índice {INDEX_NAME}.")
+        return
+
+    create_index = {
+        "Create": {
+            "IndexName": INDEX_NAME,
+            "KeySchema": [{"AttributeName": "fitting_id", "KeyType": "HASH"}],
+            "Projection": {"ProjectionType": "ALL"},
+        }
+    }
+    billing_mode = desc["Table"].get("BillingModeSummary", {}).get("BillingMode", "PROVISIONED")
+    if billing_mode != "PAY_PER_REQUEST":
+        create_index["Create"]["ProvisionedThroughput"] = {"ReadCapacityUnits": 1, "WriteCapacityUnits": 1}
+
+    try:
+        dynamodb.update_table(
+            TableName=TABLE_NAME,
+            AttributeDefinitions=[{"AttributeName": "fitting_id", "AttributeType": "S"}],
+            GlobalSecondaryIndexUpdates=[create_index],
+        )
+    except ClientError as e:
+        print(f"[ERRO] {e}")
+        return
+    print(f"[OK] Solicitação enviada para {INDEX_NAME}. Aguardando ficar ACTIVE...")
+    while True:
+        time.sleep(5)
+        gsis = dynamodb.describe_table(TableName=TABLE_NAME)["Table"].get("GlobalSecondaryIndexes", [])
+        status = next((g.get("IndexStatus") for g in gsis if g["IndexName"] == INDEX_NAME), None)
+        print(f"   Status atual: {status}")
+        if status in ("ACTIVE", "FAILED"):
+            break
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Só mostra o que seria feito")
+    args = parser.parse_args()
+    backfill_fitting_ids(dry_run=args.dry_run)
+    create_fitting_id_index(dry_run=args.dry_run)
@@ -0,0 +1,90 @@
+"""
+pending_bookings.py
+Pedidos de agendamento aguardando confirmação por e-mail.
+
+Ficam na scheduling_config_table, numa partição própria da conta (fora da
+partição de configuração que scheduling_config_cache lê):
+    account_id = "pending_booking:<account_id>", config_key = <fitting_id>
+    payload (JSON), created_at, ttl
+
+ttl (epoch) faz o DynamoDB apagar sozinho os pedidos abandonados depois de
+PENDING_BOOKING_TTL_HOURS (padrão 72). Como a remoção por TTL pode atrasar, um
+pedido vencido já é tratado como inexistente na leitura, e o
+sweep_pending_bookings.py apaga em lote os vencidos (e os do formato antigo).
+
+Formato antigo, ainda lido para links já enviados:
+    account_id = <account_id>, config_key = "pending_booking#<fitting_id>"
+"""
+
+import json
+import os
+import time
+
+
+PENDING_TTL = int(float(os.getenv("PENDING_BOOKING_TTL_HOURS", "72")) * 3600)
+PARTITION_PREFIX = "pending_booking:"
+LEGACY_PREFIX = "pending_booking#"
+
+
+def key(account_id, fitting_id):
+    return {"account_id": f"{PARTITION_PREFIX}{account_id}", "config_key": str(fitting_id)}
+
+
+def legacy_key(account_id, fitting_id):
+    return {"account_id": account_id, "config_key": f"{LEGACY_PREFIX}{fitting_id}"}
+
+
+def is_expired(item, now=None):
+    try:
+        return int(item.get("ttl")) <= int(now or time.time())
+    except Exception:
+        return False
+
+
+def save(scheduling_config_table, account_id, fitting_id, payload, created_at=""):
+    """Grava o pedido com ttl. Devolve (ok, mensagem de erro)."""
+    now = int(time.time())
+    try:
+        scheduling_config_table.put_item(
+            Item={
+                **key(account_id, fitting_id),
+                "payload": json.dumps(payload),
+                "created_at": created_at or time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "ttl": now + PENDING_TTL,
+            }
+        )
+        return True, ""
+    except Exception as e:
+        msg = str(e) or e.__class__.__name__
+        print(f"Erro ao salvar pending_booking: {msg}")
+        return False, msg
+
+
+def load(scheduling_config_table, account_id, fitting_id):
+    """
+    (chave, payload) do pedido ainda válido, ou (None, None).
+    A chave serve para apagar o pedido (inclusive dentro de uma transação).
+    """
+    try:
+        for k in (key(account_id, fitting_id), legacy_key(account_id, fitting_id)):
+            item = scheduling_config_table.get_item(Key=k).get("Item")
+            if not item:
+                continue
+            if is_expired(item):
+                return None, None
+            raw = item.get("payload")
+            if not raw:
+                return None, None
+            data = json.loads(raw) if isinstance(raw, str) else raw
+            return (k, data) if isinstance(data, dict) else (None, None)
+    except Exception as e:
+        print(f"Erro ao buscar pending_booking: {e}")
+    return None, None
+
+
+def delete(scheduling_config_table, account_id, fitting_id):
+    try:
+        for k in (key(account_id, fitting_id), legacy_key(account_id, fitting_id)):
+            scheduling_config_table.delete_item(Key=k)
+    except Exception as e:
+        print(f"Erro ao remover pending_booking: {e}")
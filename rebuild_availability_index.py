@@ -0,0 +1,58 @@
+"""
+Reconstrói o índice de disponibilidade (períodos reservados/retirados por item),
+guardado em users_table (user_id = "account_availability:<account_id>").
+Ver availability_index.py.
+
+    python rebuild_availability_index.py <account_id> [<account_id> ...]
+    python rebuild_availability_index.py --all
+"""
+
+import os
+import sys
+
+import boto3
+from dotenv import load_dotenv
+
+import availability_index
+
+
+def main():
+    load_dotenv()
+    dynamodb = boto3.resource(
+        "dynamodb",
+        region_name=os.getenv("AWS_REGION", "us-east-1"),
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    )
+    users_table = dynamodb.Table("alugueqqc_users")
+    transactions_table = dynamodb.Table("alugueqqc_transactions")
+
+    args = sys.argv[1:]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+
+    if args == ["--all"]:
+        account_ids = set()
+        scan_kwargs = {"ProjectionExpression": "account_id"}
+        while True:
+            response = users_table.scan(**scan_kwargs)
+            for row in response.get("Items", []):
+                if row.get("account_id"):
+                    account_ids.add(row["account_id"])
+            if "LastEvaluatedKey" not in response:
+                break
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    else:
+        account_ids = set(args)
+
+    for account_id in sorted(account_ids):
+        record = availability_index.rebuild(
+            users_table, transactions_table, account_id, overwrite=True
+        )
+        total = sum(1 for k in record if k.startswith("t|"))
+        print(f"[OK] {account_id}: {total} períodos ativos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Reconstrói do zero o snapshot do catálogo público (tabela alugueqqc_catalog_snapshot)
+para todas as contas em PUBLIC_CATALOG_ACCOUNT_IDS.
+
+Rode após criar a tabela (create_catalog_snapshot_table.py): o catálogo não
+constrói o snapshot na leitura. Depois disso ele é mantido item a item pelas
+rotas; rode de novo só se suspeitar de divergência.
+
+    python rebuild_catalog_snapshot.py [account_id ...]
+"""
+
+import os
+import sys
+
+import boto3
+from dotenv import load_dotenv
+
+import catalog_snapshot
+
+
+def main():
+    load_dotenv()
+    region = os.getenv("AWS_REGION", "us-east-1")
+    dynamodb = boto3.resource(
+        "dynamodb",
+        region_name=region,
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    )
+    itens_table = dynamodb.Table("alugueqqc_itens")
+    snapshot_table = dynamodb.Table(
+        os.getenv("CATALOG_SNAPSHOT_TABLE", "").strip() or "alugueqqc_catalog_snapshot"
+    )
+
+    account_ids = sys.argv[1:] or catalog_snapshot.get_public_account_ids()
+    for account_id in account_ids:
+        total = catalog_snapshot.rebuild_account_snapshot(snapshot_table, itens_table, account_id)
+        print(f"[OK] {account_id}: {total} itens no snapshot")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Recontagem (reparo) dos contadores por conta guardados em users_table
+(user_id = "account_counters:<account_id>"). Ver account_counters.py.
+
+    python recount_account_counters.py <account_id> [<account_id> ...]
+    python recount_account_counters.py --all
+"""
+
+import os
+import sys
+
+import boto3
+from dotenv import load_dotenv
+
+import account_counters
+
+
+def main():
+    load_dotenv()
+    dynamodb = boto3.resource(
+        "dynamodb",
+        region_name=os.getenv("AWS_REGION", "us-east-1"),
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    )
+    users_table = dynamodb.Table("alugueqqc_users")
+    itens_table = dynamodb.Table("alugueqqc_itens")
+    transactions_table = dynamodb.Table("alugueqqc_transactions")
+    clients_table = dynamodb.Table("alugueqqc_clients")
+
+    args = sys.argv[1:]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+
+    if args == ["--all"]:
+        account_ids = set()
+        scan_kwargs = {"ProjectionExpression": "account_id"}
+        while True:
+            response = users_table.scan(**scan_kwargs)
+            for row in response.get("Items", []):
+                if row.get("account_id"):
+                    account_ids.add(row["account_id"])
+            if "LastEvaluatedKey" not in response:
+                break
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    else:
+        account_ids = set(args)
+
+    for account_id in sorted(account_ids):
+        record = account_counters.recount(
+            users_table, itens_table, transactions_table, clients_table, account_id, overwrite=True
+        )
+        totals = {k: v for k, v in record.items() if k not in ("user_id", "initialized_at")}
+        print(f"[OK] {account_id}: {totals}")
+
+
+if __name__ == "__main__":
+    main()
@@ -40,6 +40,14 @@ from flask import (
     abort,
 )
 
+import account_slugs
+import agenda_engine
+import pending_bookings
+import scheduling_config_cache
+import slot_claims
+import slot_engine
+import slot_occupancy
+
 
 # ── Configuração do fuso horário de Manaus ──────────────────────────
 MANAUS_TZ = pytz.timezone("America/Manaus")  # UTC-4
@@ -57,10 +65,7 @@ def _max_booking_date_iso(account_id: str, scheduling_config_table) -> str:
     """Data máxima para agendamento (público): hoje + N dias (configurável)."""
     days_ahead = 7
     try:
-        resp = scheduling_config_table.get_item(
-            Key={"account_id": account_id, "config_key": "scheduling_settings"}
-        )
-        item = resp.get("Item") or {}
+        item = scheduling_config_cache.row(scheduling_config_table, account_id, "scheduling_settings") or {}
         raw = item.get("max_booking_days_ahead")
         try:
             days_ahead = int(raw)
@@ -137,6 +142,7 @@ def init_public_scheduling_routes(
     def _safe_put_scheduling_config(item: dict) -> tuple[bool, str]:
         try:
             scheduling_config_table.put_item(Item=item)
+            scheduling_config_cache.invalidate(item.get("account_id"))
             return True, ""
         except Exception as e:
             try:
@@ -162,10 +168,7 @@ def init_public_scheduling_routes(
 
     def _get_scheduling_settings(account_id: str) -> dict:
         try:
-            resp = scheduling_config_table.get_item(
-                Key={"account_id": account_id, "config_key": "scheduling_settings"}
-            )
-            item = resp.get("Item") or {}
+            item = scheduling_config_cache.row(scheduling_config_table, account_id, "scheduling_settings") or {}
             raw = item.get("default_fitting_duration_minutes")
             try:
                 val = int(raw)
@@ -251,45 +254,12 @@ def init_public_scheduling_routes(
             }
         )
 
-    def _time_to_minutes(time_local: str) -> int | None:
-        if not time_local:
-            return None
-        t = str(time_local).strip()
-        if not t:
-            return None
-        try:
-            hh, mm = t.split(":")
-            h = int(hh)
-            m = int(mm)
-            if h < 0 or h > 23 or m < 0 or m > 59:
-                return None
-            return h * 60 + m
-        except Exception:
-            return None
-
-    def _infer_slot_minutes(slots: list[str]) -> int:
-        mins = []
-        normalized = []
-        for s in slots or []:
-            m = _time_to_minutes(s)
-            if m is not None:
-                normalized.append(m)
-        normalized = sorted(set(normalized))
-        for i in range(1, len(normalized)):
-            delta = normalized[i] - normalized[i - 1]
-            if delta > 0:
-                mins.append(delta)
-        if not mins:
-            return 30
-        return max(5, min(mins))
+    _time_to_minutes = slot_occupancy.time_to_minutes
 
     def _get_weekly_schedule(account_id: str) -> dict:
         """Retorna horários semanais configurados ou padrão."""
         try:
-            resp = scheduling_config_table.get_item(
-                Key={"account_id": account_id, "config_key": "weekly_schedule"}
-            )
-            item = resp.get("Item")
+            item = scheduling_config_cache.row(scheduling_config_table, account_id, "weekly_schedule")
             if item and item.get("schedule_data"):
                 return json.loads(item["schedule_data"]) if isinstance(item["schedule_data"], str) else item["schedule_data"]
         except Exception as e:
@@ -309,18 +279,7 @@ def init_public_scheduling_routes(
 
     def _get_blocked_dates(account_id: str) -> list:
         """Retorna lista de datas bloqueadas."""
-        try:
-            resp = scheduling_config_table.query(
-                KeyConditionExpression=(
-                    Key("account_id").eq(account_id)
-                    & Key("config_key").begins_with("blocked_date#")
-                )
-            )
-            items = resp.get("Items", [])
-            return [i["config_key"].replace("blocked_date#", "") for i in items]
-        except Exception as e:
-            print(f"Erro ao buscar datas bloqueadas: {e}")
-            return []
+        return scheduling_config_cache.blocked_dates(scheduling_config_table, account_id)
 
     def _block_date(account_id: str, date_iso: str, reason: str = ""):
         return _safe_put_scheduling_config(
@@ -337,6 +296,7 @@ def init_public_scheduling_routes(
             scheduling_config_table.delete_item(
                 Key={"account_id": account_id, "config_key": f"blocked_date#{date_iso}"}
             )
+            scheduling_config_cache.invalidate(account_id)
             return True, ""
         except Exception as e:
             msg = str(e) or e.__class__.__name__
@@ -345,45 +305,23 @@ def init_public_scheduling_routes(
 
     def _get_blocked_slots(account_id: str, date_iso: str) -> list:
         """Retorna horários específicos bloqueados para uma data."""
-        try:
-            resp = scheduling_config_table.query(
-                KeyConditionExpression=(
-                    Key("account_id").eq(account_id)
-                    & Key("config_key").begins_with(f"blocked_slot#{date_iso}#")
-                )
-            )
-            items = resp.get("Items", [])
-            return [i["config_key"].split("#")[2] for i in items]
-        except Exception as e:
-            print(f"Erro ao buscar slots bloqueados: {e}")
-            return []
+        items = scheduling_config_cache.blocked_slot_items(scheduling_config_table, account_id, date_iso)
+        return [i["config_key"].split("#")[2] for i in items]
 
     def _get_blocked_slot_items(account_id: str, date_iso: str) -> list[dict]:
-        try:
-            resp = scheduling_config_table.query(
-                KeyConditionExpression=(
-                    Key("account_id").eq(account_id)
-                    & Key("config_key").begins_with(f"blocked_slot#{date_iso}#")
-                )
+        out = []
+        for it in scheduling_config_cache.blocked_slot_items(scheduling_config_table, account_id, date_iso):
+            parts = str(it.get("config_key") or "").split("#")
+            if len(parts) < 3:
+                continue
+            out.append(
+                {
+                    "time_local": parts[2],
+                    "reason": str(it.get("reason") or ""),
+                }
             )
-            items = resp.get("Items", [])
-            out = []
-            for it in items:
-                cfg = str(it.get("config_key") or "")
-                parts = cfg.split("#")
-                if len(parts) < 3:
-                    continue
-                out.append(
-                    {
-                        "time_local": parts[2],
-                        "reason": str(it.get("reason") or ""),
-                    }
-                )
-            out.sort(key=lambda x: x.get("time_local") or "")
-            return out
-        except Exception as e:
-            print(f"Erro ao buscar slots bloqueados (items): {e}")
-            return []
+        out.sort(key=lambda x: x.get("time_local") or "")
+        return out
 
     def _block_slot(account_id: str, date_iso: str, time_local: str, reason: str = ""):
         return _safe_put_scheduling_config(
@@ -403,63 +341,36 @@ def init_public_scheduling_routes(
                     "config_key": f"blocked_slot#{date_iso}#{time_local}",
                 }
             )
+            scheduling_config_cache.invalidate(account_id)
             return True, ""
         except Exception as e:
             msg = str(e) or e.__class__.__name__
             print(f"Erro ao remover bloqueio de slot: {msg}")
             return False, msg
 
+    def _get_blocked_slots_between(account_id: str, start_iso: str, end_iso: str) -> dict:
+        """{data: [horários bloqueados]} de um período."""
+        return scheduling_config_cache.blocked_slots_between(scheduling_config_table, account_id, start_iso, end_iso)
+
+    def _get_fittings_between(account_id: str, start_iso: str, end_iso: str) -> list:
+        try:
+            return agenda_engine.fittings_between(fittings_table, account_id, start_iso, end_iso)
+        except Exception as e:
+            print(f"Erro ao buscar provas de {start_iso} a {end_iso}: {e}")
+            return []
+
+    def _default_duration(settings: dict) -> int:
+        return int(settings.get("default_fitting_duration_minutes") or DEFAULT_FITTING_DURATION_MINUTES)
+
     def _get_booked_slots(account_id: str, date_iso: str, schedule_slots: list[str] | None = None) -> list:
         """Retorna slots que devem ser bloqueados por sobreposição com provas confirmadas."""
         try:
             settings = _get_scheduling_settings(account_id)
-            default_duration = int(
-                settings.get("default_fitting_duration_minutes") or DEFAULT_FITTING_DURATION_MINUTES
-            )
-            resp = fittings_table.query(
-                KeyConditionExpression=(
-                    Key("account_id").eq(account_id)
-                    & Key("date_time_local").begins_with(date_iso)
-                )
-            )
-            items = resp.get("Items", [])
+            items = _get_fittings_between(account_id, date_iso, date_iso)
             if schedule_slots is None:
-                date_obj = datetime.date.fromisoformat(date_iso)
-                weekday = str(date_obj.weekday())
-                schedule = _get_weekly_schedule(account_id)
-                schedule_slots = list(schedule.get(weekday, []))
-
-            schedule_slots = [str(s).strip() for s in (schedule_slots or []) if str(s).strip()]
-            slot_minutes = _infer_slot_minutes(schedule_slots)
-
-            booked = set()
-            for item in items:
-                status = item.get("status", "").lower()
-                if status in ("confirmado", "confirmed"):
-                    time_local = item.get("time_local", "")
-                    start_min = _time_to_minutes(time_local)
-                    if start_min is None:
-                        booked.add("*")
-                        continue
-
-                    raw_duration = item.get("duration_minutes")
-                    try:
-                        duration = int(raw_duration)
-                    except Exception:
-                        duration = default_duration
-                    if duration <= 0:
-                        duration = default_duration
-
-                    end_min = start_min + duration
-                    for slot in schedule_slots:
-                        slot_start = _time_to_minutes(slot)
-                        if slot_start is None:
-                            continue
-                        slot_end = slot_start + slot_minutes
-                        if slot_start < end_min and start_min < slot_end:
-                            booked.add(str(slot).strip())
-
-            return list(booked)
+                weekday = str(datetime.date.fromisoformat(date_iso).weekday())
+                schedule_slots = list(_get_weekly_schedule(account_id).get(weekday, []))
+            return slot_engine.booked_slots(items, schedule_slots, _default_duration(settings))
         except Exception as e:
             print(f"Erro ao buscar slots agendados: {e}")
             return []
@@ -471,149 +382,97 @@ def init_public_scheduling_routes(
         if date_iso in blocked_dates:
             return []
 
-        # Obter dia da semana (0=seg, 6=dom)
-        date_obj = datetime.date.fromisoformat(date_iso)
-        weekday = str(date_obj.weekday())
-
-        # Horários configurados para este dia da semana
+        # Horários configurados para este dia da semana (0=seg, 6=dom)
+        weekday = str(datetime.date.fromisoformat(date_iso).weekday())
         schedule = _get_weekly_schedule(account_id)
-        all_day_slots = list(schedule.get(weekday, []))
-        available = list(all_day_slots)
-
-        if not available:
+        if not schedule.get(weekday, []):
             return []
 
-        # Remover horários bloqueados manualmente
-        blocked_slots = _get_blocked_slots(account_id, date_iso)
-        available = [t for t in available if t not in blocked_slots]
-
-        # Remover horários já agendados (por sobreposição)
-        booked = _get_booked_slots(account_id, date_iso, schedule_slots=all_day_slots)
-        if "*" in booked:
-            return []
-        available = [t for t in available if t not in booked]
-
-        if not allow_past:
-            settings = _get_scheduling_settings(account_id)
-            lead_minutes = int(settings.get("min_lead_time_minutes") or 0)
-            if lead_minutes < 0:
-                lead_minutes = 0
-            cutoff_dt = _now_manaus() + datetime.timedelta(minutes=lead_minutes)
-
-            filtered = []
-            for t in available:
-                m = _time_to_minutes(t)
-                if m is None:
-                    continue
-                hh = m // 60
-                mm = m % 60
-                slot_naive = datetime.datetime.combine(
-                    date_obj, datetime.time(hour=hh, minute=mm)
-                )
-                slot_dt = MANAUS_TZ.localize(slot_naive)
-                if slot_dt > cutoff_dt:
-                    filtered.append(t)
-            available = filtered
-
-        return sorted(available)
+        settings = _get_scheduling_settings(account_id)
+        return slot_engine.available_slots(
+            date_iso,
+            schedule,
+            blocked_dates,
+            _get_blocked_slots(account_id, date_iso),
+            _get_fittings_between(account_id, date_iso, date_iso),
+            _default_duration(settings),
+            settings.get("min_lead_time_minutes") or 0,
+            _now_manaus(),
+            MANAUS_TZ,
+            allow_past=allow_past,
+        )
 
     def _get_slots_with_status(account_id: str, date_iso: str) -> list[dict]:
         blocked_dates = _get_blocked_dates(account_id)
 
-        date_obj = datetime.date.fromisoformat(date_iso)
-        weekday = str(date_obj.weekday())
-
+        weekday = str(datetime.date.fromisoformat(date_iso).weekday())
         schedule = _get_weekly_schedule(account_id)
-        all_slots = list(schedule.get(weekday, []))
-        if not all_slots:
+        if not schedule.get(weekday, []):
             return []
 
-        all_slots = sorted([str(s).strip() for s in all_slots if str(s).strip()])
-
-        blocked_slots = set([str(s).strip() for s in _get_blocked_slots(account_id, date_iso)])
-        booked_slots = set(
-            [str(s).strip() for s in _get_booked_slots(account_id, date_iso, schedule_slots=all_slots)]
+        settings = _get_scheduling_settings(account_id)
+        return slot_engine.slots_with_status(
+            date_iso,
+            schedule,
+            blocked_dates,
+            _get_blocked_slots(account_id, date_iso),
+            _get_fittings_between(account_id, date_iso, date_iso),
+            _default_duration(settings),
+            settings.get("min_lead_time_minutes") or 0,
+            _now_manaus(),
+            MANAUS_TZ,
         )
-        booked_all = "*" in booked_slots
 
-        now_dt = _now_manaus()
-        today_iso = now_dt.date().isoformat()
+    def _get_month_calendar(account_id: str, first_day: datetime.date, last_day: datetime.date) -> dict:
+        """
+        Status de todos os dias do mês com a configuração lida uma vez e as provas
+        e bloqueios de horário do mês em um query por faixa de chave cada.
+        """
         settings = _get_scheduling_settings(account_id)
-        lead_minutes = int(settings.get("min_lead_time_minutes") or 0)
-        if lead_minutes < 0:
-            lead_minutes = 0
-        cutoff_dt = now_dt + datetime.timedelta(minutes=lead_minutes)
+        now_dt = _now_manaus()
+        today = now_dt.date().isoformat()
+        max_date = (now_dt.date() + datetime.timedelta(days=settings["max_booking_days_ahead"])).isoformat()
+        schedule = _get_weekly_schedule(account_id)
+        blocked_dates = _get_blocked_dates(account_id)
 
-        out = []
-        for t in all_slots:
-            m = _time_to_minutes(t)
-            if m is None:
-                continue
-            hh = m // 60
-            mm = m % 60
-            slot_naive = datetime.datetime.combine(
-                date_obj, datetime.time(hour=hh, minute=mm)
+        # Só o trecho do mês que pode ter dia aberto precisa de provas/bloqueios
+        start_iso = max(first_day.isoformat(), today)
+        end_iso = min(last_day.isoformat(), max_date)
+        blocked_slots_by_date = {}
+        fittings_by_date = {}
+        if start_iso <= end_iso:
+            blocked_slots_by_date = _get_blocked_slots_between(account_id, start_iso, end_iso)
+            fittings_by_date = slot_engine.group_fittings_by_date(
+                _get_fittings_between(account_id, start_iso, end_iso)
             )
-            slot_dt = MANAUS_TZ.localize(slot_naive)
-            if date_iso in blocked_dates:
-                status = "blocked"
-            elif t in blocked_slots:
-                status = "blocked"
-            elif booked_all or t in booked_slots:
-                status = "booked"
-            elif slot_dt <= now_dt:
-                status = "past"
-            elif slot_dt <= cutoff_dt:
-                status = "blocked"
-            else:
-                status = "available"
-            out.append({"time": t, "status": status})
 
-        return out
-
-    def _pending_booking_key(fitting_id: str) -> str:
-        return f"pending_booking#{fitting_id}"
+        days = slot_engine.calendar_days(
+            first_day,
+            last_day,
+            today,
+            max_date,
+            schedule,
+            blocked_dates,
+            blocked_slots_by_date,
+            fittings_by_date,
+            _default_duration(settings),
+            settings.get("min_lead_time_minutes") or 0,
+            now_dt,
+            MANAUS_TZ,
+        )
+        return {"days": days, "today": today, "max_date": max_date}
 
     def _save_pending_booking(account_id: str, fitting_id: str, payload: dict) -> tuple[bool, str]:
-        try:
-            scheduling_config_table.put_item(
-                Item={
-                    "account_id": account_id,
-                    "config_key": _pending_booking_key(fitting_id),
-                    "payload": json.dumps(payload),
-                    "created_at": _now_manaus().isoformat(),
-                }
-            )
-            return True, ""
-        except Exception as e:
-            msg = str(e) or e.__class__.__name__
-            print(f"Erro ao salvar pending_booking: {msg}")
-            return False, msg
+        return pending_bookings.save(
+            scheduling_config_table, account_id, fitting_id, payload, created_at=_now_manaus().isoformat()
+        )
 
-    def _get_pending_booking(account_id: str, fitting_id: str) -> dict | None:
-        try:
-            resp = scheduling_config_table.get_item(
-                Key={"account_id": account_id, "config_key": _pending_booking_key(fitting_id)}
-            )
-            item = resp.get("Item")
-            if not item:
-                return None
-            raw = item.get("payload")
-            if not raw:
-                return None
-            data = json.loads(raw) if isinstance(raw, str) else raw
-            return data if isinstance(data, dict) else None
-        except Exception as e:
-            print(f"Erro ao buscar pending_booking: {e}")
-            return None
+    def _get_pending_booking(account_id: str, fitting_id: str) -> tuple[dict | None, dict | None]:
+        """(chave, payload) do pedido pendente ainda válido, ou (None, None)."""
+        return pending_bookings.load(scheduling_config_table, account_id, fitting_id)
 
     def _delete_pending_booking(account_id: str, fitting_id: str) -> None:
-        try:
-            scheduling_config_table.delete_item(
-                Key={"account_id": account_id, "config_key": _pending_booking_key(fitting_id)}
-            )
-        except Exception as e:
-            print(f"Erro ao remover pending_booking: {e}")
+        pending_bookings.delete(scheduling_config_table, account_id, fitting_id)
 
     def _parse_emails(raw: str) -> list[str]:
         if not raw:
@@ -636,10 +495,7 @@ def init_public_scheduling_routes(
 
     def _get_admin_booking_emails(account_id: str) -> list[str]:
         try:
-            resp = scheduling_config_table.get_item(
-                Key={"account_id": account_id, "config_key": "admin_booking_emails"}
-            )
-            item = resp.get("Item")
+            item = scheduling_config_cache.row(scheduling_config_table, account_id, "admin_booking_emails")
             if not item:
                 return []
             raw = item.get("emails_data")
@@ -753,30 +609,18 @@ def init_public_scheduling_routes(
             print(f"Erro ao enviar notificação admin (SES): {e}")
             return False
 
+    def _default_public_account_id() -> str:
+        raw = str(os.getenv("AI_SYNC_ACCOUNT_ID") or os.getenv("PUBLIC_CATALOG_ACCOUNT_IDS") or "").strip()
+        parts = [p.strip() for p in raw.split(",") if p.strip()]
+        return parts[0] if parts else DEFAULT_PUBLIC_ACCOUNT_ID
+
     def _get_account_by_slug(slug: str) -> dict | None:
-        """Busca conta pelo slug público. Adapte conforme sua tabela de contas."""
+        """Busca conta pelo slug público (mapeamento slug→conta com cache, ver account_slugs)."""
         if slug == "default":
-            raw = str(os.getenv("AI_SYNC_ACCOUNT_ID") or os.getenv("PUBLIC_CATALOG_ACCOUNT_IDS") or "").strip()
-            account_id = DEFAULT_PUBLIC_ACCOUNT_ID
-            if raw:
-                parts = [p.strip() for p in raw.split(",") if p.strip()]
-                if parts:
-                    account_id = parts[0]
             business_name = str(os.getenv("PUBLIC_BOOKING_BUSINESS_NAME") or "").strip()
-            return {"account_id": account_id, "slug": slug, "business_name": business_name}
+            return {"account_id": _default_public_account_id(), "slug": slug, "business_name": business_name}
 
-        # Por enquanto, usamos o scheduling_config para guardar o mapeamento slug→account_id
-        try:
-            resp = scheduling_config_table.scan(
-                FilterExpression=Attr("config_key").eq("account_slug")
-                & Attr("slug").eq(slug)
-            )
-            items = resp.get("Items", [])
-            if items:
-                return {"account_id": items[0]["account_id"], "slug": slug, "business_name": items[0].get("business_name", "")}
-        except Exception as e:
-            print(f"Erro ao buscar conta pelo slug: {e}")
-        return None
+        return account_slugs.resolve(scheduling_config_table, slug)
 
     def _send_confirmation_email(
         to_email: str,
@@ -1023,16 +867,13 @@ def init_public_scheduling_routes(
         if env_slug:
             return redirect(url_for("public_booking", account_slug=env_slug, **qs))
 
-        try:
-            resp = scheduling_config_table.scan(
-                FilterExpression=Attr("config_key").eq("account_slug")
-            )
-            items = resp.get("Items", [])
-            slug = (items[0].get("slug") or "").strip() if items else ""
-            if slug:
-                return redirect(url_for("public_booking", account_slug=slug, **qs))
-        except Exception:
-            pass
+        # Slug da conta pública padrão (registro da conta, em cache)
+        slug_item = scheduling_config_cache.row(
+            scheduling_config_table, _default_public_account_id(), "account_slug"
+        ) or {}
+        slug = str(slug_item.get("slug") or "").strip()
+        if slug:
+            return redirect(url_for("public_booking", account_slug=slug, **qs))
 
         return redirect(url_for("public_booking", account_slug="default", **qs))
 
@@ -1131,55 +972,24 @@ def init_public_scheduling_routes(
         if not month:
             month = _now_manaus().strftime("%Y-%m")
 
-        account_id = account["account_id"]
-        today = _today_manaus_iso()
-        max_date = _max_booking_date_iso(account_id, scheduling_config_table)
-        schedule = _get_weekly_schedule(account_id)
-        blocked_dates = _get_blocked_dates(account_id)
-
         # Calcular primeiro e último dia do mês
-        year, mon = int(month[:4]), int(month[5:7])
-        first_day = datetime.date(year, mon, 1)
+        try:
+            year, mon = int(month[:4]), int(month[5:7])
+            first_day = datetime.date(year, mon, 1)
+        except Exception:
+            return jsonify({"error": "Mês inválido"}), 400
         if mon == 12:
             last_day = datetime.date(year + 1, 1, 1) - datetime.timedelta(days=1)
         else:
             last_day = datetime.date(year, mon + 1, 1) - datetime.timedelta(days=1)
 
-        calendar_days = []
-        current = first_day
-        while current <= last_day:
-            date_str = current.isoformat()
-            weekday = str(current.weekday())
-            day_info = {
-                "date": date_str,
-                "day": current.day,
-                "weekday": weekday,
-            }
-
-            # Verificar se está no intervalo permitido
-            if date_str < today or date_str > max_date:
-                day_info["status"] = "disabled"
-            elif date_str in blocked_dates:
-                day_info["status"] = "blocked"
-            elif not schedule.get(weekday, []):
-                day_info["status"] = "closed"
-            else:
-                # Verificar se tem horários disponíveis
-                available = _get_available_slots(account_id, date_str)
-                if available:
-                    day_info["status"] = "available"
-                    day_info["slots_count"] = len(available)
-                else:
-                    day_info["status"] = "full"
-
-            calendar_days.append(day_info)
-            current += datetime.timedelta(days=1)
+        calendar = _get_month_calendar(account["account_id"], first_day, last_day)
 
         return jsonify({
             "month": month,
-            "days": calendar_days,
-            "today": today,
-            "max_date": max_date,
+            "days": calendar["days"],
+            "today": calendar["today"],
+            "max_date": calendar["max_date"],
         })
 
     def _public_item_payload(item: dict) -> dict:
@@ -1478,7 +1288,7 @@ def init_public_scheduling_routes(
 
         # Buscar e atualizar agendamento
         try:
-            pending = _get_pending_booking(account_id, fitting_id)
+            pending_key, pending = _get_pending_booking(account_id, fitting_id)
             if pending:
                 date_iso = str(pending.get("date_local") or "").strip()
                 time_local = str(pending.get("time_local") or "").strip()
@@ -1543,8 +1353,29 @@ def init_public_scheduling_routes(
                 if items:
                     fitting["items"] = items
 
-                fittings_table.put_item(Item=fitting)
-                _delete_pending_booking(account_id, fitting_id)
+                # Prova + reservas dos horários + remoção do pendente numa transação:
+                # se outra confirmação pegou o horário, nada é gravado
+                weekday = str(datetime.date.fromisoformat(date_iso).weekday())
+                claim_slots = slot_claims.slots_to_claim(
+                    _get_weekly_schedule(account_id).get(weekday, []), time_local, default_duration
+                )
+                try:
+                    slot_claims.reserve(
+                        scheduling_config_table,
+                        fittings_table,
+                        fitting,
+                        claim_slots,
+                        operations=[slot_claims.delete_op(scheduling_config_table, pending_key)],
+                    )
+                except slot_claims.SlotTaken:
+                    _delete_pending_booking(account_id, fitting_id)
+                    return render_template(
+                        "booking_result.html",
+                        success=False,
+                        message="Não foi possível confirmar: este horário já foi agendado por outra pessoa.",
+                        account_slug=account_slug,
+                        business_name=account.get("business_name", ""),
+                    )
 
                 if client_email:
                     _send_booking_confirmed_email(
@@ -1593,10 +1424,8 @@ def init_public_scheduling_routes(
                     },
                 )
 
-            resp = fittings_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id) & Attr("fitting_id").eq(fitting_id)
-            )
-            items = resp.get("Items", [])
+            found = agenda_engine.find_fitting(fittings_table, account_id, fitting_id)
+            items = [found] if found else []
             if not items:
                 return render_template(
                     "booking_result.html",
@@ -1695,11 +1524,8 @@ def init_public_scheduling_routes(
         account_id = account["account_id"]
 
         try:
-            resp = fittings_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id)
-                & Attr("fitting_id").eq(fitting_id)
-            )
-            items = resp.get("Items", [])
+            found = agenda_engine.find_fitting(fittings_table, account_id, fitting_id)
+            items = [found] if found else []
             if not items:
                 return render_template("booking_result.html",
                                        success=False, message="Agendamento não encontrado.",
@@ -1731,6 +1557,7 @@ def init_public_scheduling_routes(
                     ":updated": datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
                 },
             )
+            slot_claims.release(scheduling_config_table, fitting)
 
             return render_template("booking_result.html",
                                    success=True,
@@ -1763,11 +1590,8 @@ def init_public_scheduling_routes(
 
         # Buscar agendamento atual
         try:
-            resp = fittings_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id)
-                & Attr("fitting_id").eq(fitting_id)
-            )
-            items = resp.get("Items", [])
+            found = agenda_engine.find_fitting(fittings_table, account_id, fitting_id)
+            items = [found] if found else []
             if not items:
                 return render_template("booking_result.html",
                                        success=False, message="Agendamento não encontrado.",
@@ -1823,15 +1647,12 @@ def init_public_scheduling_routes(
 
         try:
             old_dt_key = fitting["date_time_local"]
+            old_date = str(fitting.get("date_local") or old_dt_key)[:10]
+            old_claimed_slots = list(fitting.get("claimed_slots") or [])
             new_dt_key = f"{new_date}#{new_time}#{fitting_id}"
             now_utc = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
 
-            # Deletar item antigo
-            fittings_table.delete_item(
-                Key={"account_id": account_id, "date_time_local": old_dt_key}
-            )
-
-            # Criar com nova data/hora
+            # Nova data/hora; a chave antiga sai na mesma transação que grava a nova
             fitting["date_time_local"] = new_dt_key
             fitting["date_local"] = new_date
             fitting["time_local"] = new_time
@@ -1842,7 +1663,30 @@ def init_public_scheduling_routes(
                 fitting["duration_minutes"] = int(
                     settings.get("default_fitting_duration_minutes") or DEFAULT_FITTING_DURATION_MINUTES
                 )
-            fittings_table.put_item(Item=fitting)
+            weekday = str(datetime.date.fromisoformat(new_date).weekday())
+            claim_slots = slot_claims.slots_to_claim(
+                _get_weekly_schedule(account_id).get(weekday, []), new_time, fitting["duration_minutes"]
+            )
+            operations = []
+            if old_dt_key != new_dt_key:
+                operations.append(
+                    slot_claims.delete_op(fittings_table, {"account_id": account_id, "date_time_local": old_dt_key})
+                )
+            try:
+                slot_claims.reserve(
+                    scheduling_config_table,
+                    fittings_table,
+                    fitting,
+                    claim_slots,
+                    operations=operations,
+                    release_date=old_date,
+                    release_slots=old_claimed_slots,
+                )
+            except slot_claims.SlotTaken:
+                flash("Horário não disponível. Escolha outro.", "danger")
+                return redirect(url_for("reschedule_booking",
+                                        account_slug=account_slug,
+                                        fitting_id=fitting_id, token=token))
 
             date_obj = datetime.date.fromisoformat(new_date)
             date_br = date_obj.strftime("%d/%m/%Y")
@@ -1873,6 +1717,9 @@ def init_public_scheduling_routes(
 
         account_id = session.get("account_id")
 
+        # O painel sempre mostra/grava a partir do estado atual da tabela
+        scheduling_config_cache.invalidate(account_id)
+
         if request.method == "POST":
             action = request.form.get("action")
             redirect_blocked_slots_date = ""
@@ -2029,15 +1876,15 @@ def init_public_scheduling_routes(
                 slug = request.form.get("slug", "").strip().lower()
                 business_name = request.form.get("business_name", "").strip()
                 if slug:
-                    ok, err = _safe_put_scheduling_config(
-                        {
-                            "account_id": account_id,
-                            "config_key": "account_slug",
-                            "slug": slug,
-                            "business_name": business_name,
-                            "updated_at": _now_manaus().isoformat(),
-                        }
+                    previous = scheduling_config_cache.row(scheduling_config_table, account_id, "account_slug") or {}
+                    ok, err = account_slugs.claim(
+                        scheduling_config_table,
+                        account_id,
+                        slug,
+                        business_name=business_name,
+                        previous_slug=previous.get("slug", ""),
                     )
+                    scheduling_config_cache.invalidate(account_id)
                     if ok:
                         flash(f"Link público configurado: /agendar/{slug}", "success")
                     else:
@@ -2090,17 +1937,9 @@ def init_public_scheduling_routes(
         )
 
         # Buscar slug atual
-        try:
-            resp = scheduling_config_table.scan(
-                FilterExpression=Attr("account_id").eq(account_id)
-                & Attr("config_key").eq("account_slug")
-            )
-            slug_items = resp.get("Items", [])
-            current_slug = slug_items[0].get("slug", "") if slug_items else ""
-            business_name = slug_items[0].get("business_name", "") if slug_items else ""
-        except Exception:
-            current_slug = ""
-            business_name = ""
+        slug_item = scheduling_config_cache.row(scheduling_config_table, account_id, "account_slug") or {}
+        current_slug = slug_item.get("slug", "")
+        business_name = slug_item.get("business_name", "")
 
         admin_emails = _get_admin_booking_emails(account_id)
 
@@ -0,0 +1,111 @@
+"""
+scheduling_config_cache.py
+Configuração de agendamento de uma conta, lida de uma vez e guardada em memória.
+
+Um único query na partição da conta em scheduling_config_table traz tudo o que
+não é agendamento pendente:
+    scheduling_settings, weekly_schedule, admin_booking_emails, account_slug
+    blocked_date#<data>
+    blocked_slot#<data>#<hora>
+
+    cfg = scheduling_config_cache.load(scheduling_config_table, account_id)
+    scheduling_config_cache.row(scheduling_config_table, account_id, "weekly_schedule")
+    scheduling_config_cache.invalidate(account_id)   # depois de qualquer gravação
+
+O cache é por processo, com validade de SCHEDULING_CONFIG_TTL_SECONDS (padrão 30).
+As gravações deste processo invalidam na hora; outros workers enxergam a mudança
+quando o TTL vence.
+"""
+
+import os
+import threading
+import time
+
+from boto3.dynamodb.conditions import Key, Attr
+
+
+CONFIG_TTL = float(os.getenv("SCHEDULING_CONFIG_TTL_SECONDS", "30"))
+PENDING_PREFIX = "pending_booking#"  # formato antigo; os novos ficam fora da partição (pending_bookings)
+
+_lock = threading.Lock()
+_configs = {}  # {account_id: (expira_em, config)}
+
+
+def _empty():
+    return {"rows": {}, "blocked_dates": [], "blocked_slots": {}}
+
+
+def _fetch(scheduling_config_table, account_id):
+    config = _empty()
+    query_kwargs = {
+        "KeyConditionExpression": Key("account_id").eq(account_id),
+        "FilterExpression": ~Attr("config_key").begins_with(PENDING_PREFIX),
+    }
+    while True:
+        resp = scheduling_config_table.query(**query_kwargs)
+        for item in resp.get("Items", []):
+            config_key = str(item.get("config_key") or "")
+            if config_key.startswith("blocked_date#"):
+                config["blocked_dates"].append(config_key[len("blocked_date#"):])
+            elif config_key.startswith("blocked_slot#"):
+                parts = config_key.split("#")
+                if len(parts) >= 3:
+                    config["blocked_slots"].setdefault(parts[1], []).append(item)
+            else:
+                config["rows"][config_key] = item
+        last_evaluated_key = resp.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            break
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+    config["blocked_dates"].sort()
+    return config
+
+
+def load(scheduling_config_table, account_id):
+    """Configuração da conta (do cache, se ainda válida). Em erro, configuração vazia."""
+    if not account_id:
+        return _empty()
+    now = time.time()
+    with _lock:
+        cached = _configs.get(account_id)
+        if cached and cached[0] > now:
+            return cached[1]
+    try:
+        config = _fetch(scheduling_config_table, account_id)
+    except Exception as e:
+        # Não guarda: a próxima chamada tenta de novo
+        print(f"Erro ao carregar configuração de agendamento da conta {account_id}: {e}")
+        return _empty()
+    with _lock:
+        _configs[account_id] = (time.time() + CONFIG_TTL, config)
+    return config
+
+
+def row(scheduling_config_table, account_id, config_key):
+    """Registro bruto de uma chave simples (ex.: "scheduling_settings"), ou None."""
+    return load(scheduling_config_table, account_id)["rows"].get(config_key)
+
+
+def blocked_dates(scheduling_config_table, account_id):
+    return list(load(scheduling_config_table, account_id)["blocked_dates"])
+
+
+def blocked_slot_items(scheduling_config_table, account_id, date_iso):
+    """Registros blocked_slot# da data, na ordem da chave."""
+    items = load(scheduling_config_table, account_id)["blocked_slots"].get(date_iso, [])
+    return sorted(items, key=lambda item: str(item.get("config_key") or ""))
+
+
+def blocked_slots_between(scheduling_config_table, account_id, start_iso, end_iso):
+    """{data: [horários bloqueados]} para as datas em [start_iso, end_iso]."""
+    slots = load(scheduling_config_table, account_id)["blocked_slots"]
+    return {
+        date_iso: [str(item["config_key"]).split("#")[2] for item in items]
+        for date_iso, items in slots.items()
+        if start_iso <= date_iso <= end_iso
+    }
+
+
+def invalidate(account_id):
+    with _lock:
+        _configs.pop(account_id, None)
@@ -1,13 +1,36 @@
-import boto3
-import os
+"""
+Otimiza em massa as imagens do bucket (utils.optimize_image) e regrava cada uma
+na mesma chave.
+
+  - Pillow roda num pool de processos (--processos, padrão: núcleos da máquina);
+    download, upload e HEAD rodam num pool de threads (--threads).
+  - Cada chave concluída vai para o arquivo de checkpoint (--checkpoint); se o
+    script cair, a próxima execução continua de onde parou.
+  - Objetos com o metadado optimized=1 (gravado aqui e nos uploads do app) e as
+    versões thumb/card/full de image_renditions são pulados sem download.
+  - Se a versão otimizada não ficar menor, o original fica e só ganha o metadado
+    (cópia no próprio S3, sem reenviar os bytes).
+  - --dry-run baixa e otimiza, mas não grava nada: só mostra a economia prevista.
+
+    python scripts/batch_optimize_s3.py [--dry-run] [--prefix images/] [--limite N]
+"""
+
+import argparse
 import io
+import multiprocessing
+import os
 import sys
-from PIL import Image
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import boto3
+from botocore.config import Config
 from dotenv import load_dotenv
 
 # Adiciona o diretório raiz ao path para importar utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import optimize_image
+import image_renditions
+from utils import optimize_image, S3_OPTIMIZED_METADATA
 
 # Carrega variáveis de ambiente do arquivo .env na raiz do projeto
 env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
@@ -18,94 +41,209 @@ AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 
-if not S3_BUCKET_NAME:
-    print("Erro: S3_BUCKET_NAME não configurado no .env")
-    sys.exit(1)
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+CHECKPOINT_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "batch_optimize_s3.checkpoint")
+
+
+def _otimizar_bytes(dados, key):
+    """Roda no pool de processos. Retorna (status, bytes otimizados ou None)."""
+    image_file = io.BytesIO(dados)
+    image_file.filename = key
+    output = optimize_image(image_file)
+    if output is None:
+        return "grande demais", None
+    if output is image_file:
+        # optimize_image devolve o próprio arquivo quando o Pillow não consegue abrir
+        return "erro ao abrir", None
+    return "ok", output.getvalue()
+
+
+class Checkpoint:
+    """Arquivo com uma chave concluída por linha (só cresce; seguro entre threads)."""
+
+    def __init__(self, path, gravar=True):
+        self.path = path
+        self.gravar = gravar
+        self.lock = threading.Lock()
+        self.feitas = set()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.feitas = {linha.rstrip("\n") for linha in f if linha.strip()}
+        self.arquivo = open(path, "a", encoding="utf-8") if (path and gravar) else None
+
+    def __contains__(self, key):
+        return key in self.feitas
+
+    def marcar(self, key):
+        with self.lock:
+            self.feitas.add(key)
+            if self.arquivo:
+                self.arquivo.write(key + "\n")
+                self.arquivo.flush()
+
+    def fechar(self):
+        if self.arquivo:
+            self.arquivo.close()
+
+
+class Otimizador:
+    def __init__(self, s3, processos, dry_run):
+        self.s3 = s3
+        self.processos = processos
+        self.dry_run = dry_run
+        self.lock = threading.Lock()
+        self.contagem = {"otimizadas": 0, "ja_otimizadas": 0, "sem_ganho": 0, "puladas": 0, "erros": 0}
+        self.bytes_antes = 0
+        self.bytes_depois = 0
+
+    def _somar(self, chave, antes=0, depois=0):
+        with self.lock:
+            self.contagem[chave] += 1
+            self.bytes_antes += antes
+            self.bytes_depois += depois
+
+    def _marcar_otimizada(self, key, head):
+        """Só grava o metadado, copiando o objeto sobre ele mesmo no S3."""
+        metadata = dict(head.get("Metadata") or {})
+        metadata.update(S3_OPTIMIZED_METADATA)
+        kwargs = {
+            "Bucket": S3_BUCKET_NAME,
+            "Key": key,
+            "CopySource": {"Bucket": S3_BUCKET_NAME, "Key": key},
+            "Metadata": metadata,
+            "MetadataDirective": "REPLACE",
+        }
+        for campo in ("ContentType", "CacheControl"):
+            if head.get(campo):
+                kwargs[campo] = head[campo]
+        self.s3.copy_object(**kwargs)
+
+    def processar(self, key):
+        """Roda no pool de threads. Retorna uma linha de log."""
+        head = self.s3.head_object(Bucket=S3_BUCKET_NAME, Key=key)
+        if (head.get("Metadata") or {}).get("optimized") == S3_OPTIMIZED_METADATA["optimized"]:
+            self._somar("ja_otimizadas")
+            return f"{key}: já otimizada"
+
+        dados = self.s3.get_object(Bucket=S3_BUCKET_NAME, Key=key)["Body"].read()
+        status, otimizado = self.processos.submit(_otimizar_bytes, dados, key).result()
+        if otimizado is None:
+            self._somar("puladas")
+            return f"{key}: PULADA ({status})"
+
+        if len(otimizado) >= len(dados):
+            if not self.dry_run:
+                self._marcar_otimizada(key, head)
+            self._somar("sem_ganho", len(dados), len(dados))
+            return f"{key}: sem ganho ({len(dados)/1024:.1f} KB), mantida"
+
+        if not self.dry_run:
+            self.s3.put_object(
+                Bucket=S3_BUCKET_NAME,
+                Key=key,
+                Body=otimizado,
+                ContentType='image/jpeg',  # optimize_image sempre converte para JPEG
+                CacheControl='max-age=31536000',
+                Metadata=S3_OPTIMIZED_METADATA,
+            )
+        self._somar("otimizadas", len(dados), len(otimizado))
+        reducao = (1 - len(otimizado) / len(dados)) * 100
+        return f"{key}: {len(dados)/1024:.1f} KB -> {len(otimizado)/1024:.1f} KB (-{reducao:.1f}%)"
+
+
+def _listar(s3, prefix):
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=S3_BUCKET_NAME, Prefix=prefix or ""):
+        for obj in page.get('Contents', []):
+            yield obj['Key']
+
+
+def batch_optimize_images(dry_run=False, prefix="", processos=None, threads=16, checkpoint_path=CHECKPOINT_PADRAO, limite=None):
+    print(f"Iniciando otimização em massa no bucket: {S3_BUCKET_NAME}{' (dry-run)' if dry_run else ''}")
 
-def batch_optimize_images():
-    print(f"Iniciando otimização em massa no bucket: {S3_BUCKET_NAME}")
-    
     s3 = boto3.client(
         "s3",
         aws_access_key_id=AWS_ACCESS_KEY_ID,
         aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=AWS_REGION
+        region_name=AWS_REGION,
+        config=Config(max_pool_connections=threads + 4, retries={"mode": "adaptive", "max_attempts": 5}),
     )
+    # Dry-run lê o checkpoint, mas não marca nada como feito
+    checkpoint = Checkpoint(checkpoint_path, gravar=not dry_run)
+    if checkpoint.feitas:
+        print(f"Checkpoint {checkpoint_path}: {len(checkpoint.feitas)} chaves já concluídas serão puladas.")
 
-    paginator = s3.get_paginator('list_objects_v2')
-    page_iterator = paginator.paginate(Bucket=S3_BUCKET_NAME)
-
-    processed_count = 0
-    error_count = 0
-    skipped_count = 0
-
-    for page in page_iterator:
-        if 'Contents' not in page:
-            continue
-
-        for obj in page['Contents']:
-            key = obj['Key']
-            size = obj['Size']
-            
-            # Filtra apenas imagens comuns
-            if not key.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
-                continue
-                
-            print(f"Processando: {key} ({size/1024:.2f} KB)...", end=" ", flush=True)
-
-            try:
-                # Download do arquivo para memória
-                response = s3.get_object(Bucket=S3_BUCKET_NAME, Key=key)
-                file_content = response['Body'].read()
-                image_file = io.BytesIO(file_content)
-                image_file.filename = key # Simula atributo filename para compatibilidade se necessário
-
-                # Otimiza a imagem
-                # optimize_image espera um objeto tipo arquivo e retorna BytesIO ou o original
-                # A função optimize_image já trata seek(0)
-                optimized_output = optimize_image(image_file)
-                
-                # Verifica se houve otimização real (se retornou BytesIO diferente do input)
-                # Na nossa implementação atual, optimize_image sempre retorna um BytesIO novo se der certo,
-                # ou o original se der erro.
-                
-                # Para saber se vale a pena substituir, podemos comparar tamanhos?
-                # O usuário pediu para aplicar o ajuste. Vamos aplicar.
-                # Mas se a imagem já for pequena e otimizada, o PIL pode até aumentar se a qualidade for diferente.
-                # Vamos confiar na função optimize_image.
-                
-                optimized_size = optimized_output.getbuffer().nbytes
-                
-                # Se o tamanho otimizado for MAIOR que o original, talvez não valha a pena?
-                # Exceto se a dimensão for gigante. A função optimize_image reduz dimensão.
-                # Se reduziu dimensão, mesmo que o tamanho em bytes não caia muito (difícil), vale pela dimensão.
-                # Se a dimensão não mudou (já era pequena) e o tamanho aumentou (recompressão JPEG), talvez pular?
-                # Mas para padronização (tudo JPEG), melhor sobrescrever.
-                
-                # Upload de volta (Sobrescreve)
-                # Importante: Definir ContentType correto
-                content_type = 'image/jpeg' # optimize_image sempre converte para JPEG
-                
-                s3.put_object(
-                    Bucket=S3_BUCKET_NAME,
-                    Key=key,
-                    Body=optimized_output.getvalue(),
-                    ContentType=content_type,
-                    CacheControl='max-age=31536000' # Opcional: Cache longo
-                )
-                
-                reduction = (1 - (optimized_size / size)) * 100
-                print(f"OK! Redução: {reduction:.1f}% ({optimized_size/1024:.2f} KB)")
-                processed_count += 1
-
-            except Exception as e:
-                print(f"ERRO: {e}")
-                error_count += 1
+    enviadas = 0
+    # spawn: os processos sobem a partir das threads de I/O, e fork com threads rodando pode travar
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as pool_processos, ThreadPoolExecutor(max_workers=threads) as pool_threads:
+        otimizador = Otimizador(s3, pool_processos, dry_run)
+        pendentes = {}
+
+        def _coletar(futuros):
+            for futuro in futuros:
+                key = pendentes.pop(futuro)
+                try:
+                    print(futuro.result())
+                    checkpoint.marcar(key)
+                except Exception as e:
+                    # Sem checkpoint: a chave é tentada de novo na próxima execução
+                    print(f"{key}: ERRO {e}")
+                    otimizador._somar("erros")
+
+        try:
+            for key in _listar(s3, prefix):
+                if not key.lower().endswith(EXTENSIONS):
+                    continue
+                if image_renditions.is_rendition_key(key) or key in checkpoint:
+                    continue
+                if limite is not None and enviadas >= limite:
+                    break
+                # Limita o que fica em memória (cada tarefa segura a imagem baixada)
+                while len(pendentes) >= threads * 2:
+                    concluidos, _ = wait(list(pendentes), return_when=FIRST_COMPLETED)
+                    _coletar(concluidos)
+                pendentes[pool_threads.submit(otimizador.processar, key)] = key
+                enviadas += 1
+            _coletar(wait(list(pendentes)).done)
+        finally:
+            checkpoint.fechar()
 
+    c = otimizador.contagem
     print("\n--- Resumo ---")
-    print(f"Processados: {processed_count}")
-    print(f"Erros: {error_count}")
-    print(f"Pulados: {skipped_count}")
+    print(f"Otimizadas: {c['otimizadas']}")
+    print(f"Já otimizadas (metadado): {c['ja_otimizadas']}")
+    print(f"Sem ganho (mantidas): {c['sem_ganho']}")
+    print(f"Puladas: {c['puladas']}")
+    print(f"Erros: {c['erros']}")
+    if otimizador.bytes_antes:
+        economia = otimizador.bytes_antes - otimizador.bytes_depois
+        verbo = "Economia prevista" if dry_run else "Economia"
+        print(
+            f"{verbo}: {economia/1024/1024:.1f} MB de {otimizador.bytes_antes/1024/1024:.1f} MB "
+            f"({economia / otimizador.bytes_antes * 100:.1f}%)"
+        )
+
 
 if __name__ == "__main__":
-    batch_optimize_images()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Não grava nada; mostra a economia prevista")
+    parser.add_argument("--prefix", default="", help="Só chaves com este prefixo (ex.: images/)")
+    parser.add_argument("--processos", type=int, default=None, help="Processos para o Pillow (padrão: núcleos)")
+    parser.add_argument("--threads", type=int, default=16, help="Threads de download/upload")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PADRAO, help="Arquivo com as chaves já concluídas")
+    parser.add_argument("--limite", type=int, default=None, help="Processa no máximo N imagens nesta execução")
+    args = parser.parse_args()
+
+    if not S3_BUCKET_NAME:
+        print("Erro: S3_BUCKET_NAME não configurado no .env")
+        sys.exit(1)
+
+    batch_optimize_images(
+        dry_run=args.dry_run,
+        prefix=args.prefix,
+        processos=args.processos,
+        threads=args.threads,
+        checkpoint_path=args.checkpoint,
+        limite=args.limite,
+    )
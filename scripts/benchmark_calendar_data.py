@@ -0,0 +1,191 @@
+"""
+Conta as chamadas ao DynamoDB de /api/calendar_data/<slug> (cálculo do mês de
+uma vez) e compara com o caminho por dia (_get_available_slots para cada dia
+aberto, que era o que o calendário fazia), usando tabelas em memória.
+
+Cada requisição medida começa com o cache de configuração vazio (pior caso).
+
+Também confere que o número de horários livres de cada dia no calendário é o
+mesmo que /api/available_slots devolve para aquele dia.
+
+    python scripts/benchmark_calendar_data.py [--provas 120] [--meses 2]
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+import scheduling_config_cache
+from schedul_example.public_scheduling_routes import init_public_scheduling_routes, _now_manaus
+
+
+ACCOUNT_ID = "conta-benchmark"
+
+
+def _avaliar(condicao, item):
+    """Avalia uma condição do boto3 (Key/Attr) contra um dict."""
+    expr = condicao.get_expression()
+    op = expr["operator"]
+    valores = expr["values"]
+    if op == "AND":
+        return all(_avaliar(v, item) for v in valores)
+    if op == "OR":
+        return any(_avaliar(v, item) for v in valores)
+    if op == "NOT":
+        return not _avaliar(valores[0], item)
+    atual = item.get(valores[0].name)
+    if op == "=":
+        return atual == valores[1]
+    if atual is None:
+        return False
+    if op == "BETWEEN":
+        return valores[1] <= atual <= valores[2]
+    if op == "begins_with":
+        return str(atual).startswith(valores[1])
+    if op == "<":
+        return atual < valores[1]
+    if op == "<=":
+        return atual <= valores[1]
+    if op == ">":
+        return atual > valores[1]
+    if op == ">=":
+        return atual >= valores[1]
+    if op == "IN":
+        return atual in valores[1:]
+    raise ValueError(f"Operador não suportado no benchmark: {op}")
+
+
+class TabelaEmMemoria:
+    def __init__(self, nome, hash_key, range_key, chamadas):
+        self.name = nome
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.linhas = {}
+        self.chamadas = chamadas
+
+    def _chave(self, item):
+        return (item[self.hash_key], item.get(self.range_key))
+
+    def put_item(self, Item, **kwargs):
+        self.chamadas[(self.name, "put_item")] += 1
+        self.linhas[self._chave(Item)] = dict(Item)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        self.chamadas[(self.name, "get_item")] += 1
+        item = self.linhas.get(self._chave(Key))
+        return {"Item": dict(item)} if item else {}
+
+    def query(self, KeyConditionExpression, FilterExpression=None, **kwargs):
+        self.chamadas[(self.name, "query")] += 1
+        itens = [i for i in self.linhas.values() if _avaliar(KeyConditionExpression, i)]
+        if FilterExpression is not None:
+            itens = [i for i in itens if _avaliar(FilterExpression, i)]
+        itens.sort(key=lambda i: str(i.get(self.range_key)), reverse=not kwargs.get("ScanIndexForward", True))
+        return {"Items": [dict(i) for i in itens]}
+
+    def scan(self, FilterExpression=None, **kwargs):
+        self.chamadas[(self.name, "scan")] += 1
+        itens = [i for i in self.linhas.values() if FilterExpression is None or _avaliar(FilterExpression, i)]
+        return {"Items": [dict(i) for i in itens]}
+
+
+def _popular(fittings_table, config_table, provas, seed=7):
+    rnd = random.Random(seed)
+    hoje = _now_manaus().date()
+    config_table.put_item(Item={
+        "account_id": ACCOUNT_ID,
+        "config_key": "scheduling_settings",
+        "default_fitting_duration_minutes": 60,
+        "max_booking_days_ahead": 60,
+        "min_lead_time_minutes": 120,
+    })
+    config_table.put_item(Item={
+        "account_id": ACCOUNT_ID,
+        "config_key": f"blocked_date#{(hoje + datetime.timedelta(days=9)).isoformat()}",
+    })
+    for _ in range(15):
+        dia = (hoje + datetime.timedelta(days=rnd.randint(0, 60))).isoformat()
+        hora = rnd.choice(["09:00", "10:30", "14:00", "16:00"])
+        config_table.put_item(Item={"account_id": ACCOUNT_ID, "config_key": f"blocked_slot#{dia}#{hora}"})
+    for i in range(provas):
+        dia = (hoje + datetime.timedelta(days=rnd.randint(-10, 70))).isoformat()
+        hora = rnd.choice(["09:00", "09:30", "10:00", "11:00", "14:00", "15:30", "17:00", ""])
+        fitting_id = f"f{i:05d}"
+        fittings_table.put_item(Item={
+            "account_id": ACCOUNT_ID,
+            "date_time_local": f"{dia}#{hora}#{fitting_id}",
+            "fitting_id": fitting_id,
+            "time_local": hora,
+            "status": rnd.choice(["confirmado", "confirmado", "pendente", "cancelado"]),
+            "duration_minutes": rnd.choice([30, 60, 90]),
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provas", type=int, default=120)
+    parser.add_argument("--meses", type=int, default=2)
+    args = parser.parse_args()
+
+    os.environ["AI_SYNC_ACCOUNT_ID"] = ACCOUNT_ID  # slug "default" não consulta tabela
+    chamadas = Counter()
+    fittings_table = TabelaEmMemoria("fittings", "account_id", "date_time_local", chamadas)
+    config_table = TabelaEmMemoria("scheduling_config", "account_id", "config_key", chamadas)
+    _popular(fittings_table, config_table, args.provas)
+    chamadas.clear()
+
+    app = Flask(__name__)
+    app.secret_key = "benchmark"
+    init_public_scheduling_routes(app, fittings_table, config_table, itens_table=None, clients_table=None)
+    client = app.test_client()
+
+    hoje = _now_manaus().date()
+    divergencias = 0
+    print(f"{'mês':<10}{'dias abertos':>14}{'por dia (chamadas)':>22}{'mês inteiro (chamadas)':>26}")
+    for n in range(args.meses):
+        ano, mes = divmod(hoje.month - 1 + n, 12)
+        month = f"{hoje.year + ano}-{mes + 1:02d}"
+
+        scheduling_config_cache.invalidate(ACCOUNT_ID)
+        chamadas.clear()
+        dados = client.get(f"/api/calendar_data/default?month={month}").get_json()
+        custo_mes = sum(chamadas.values())
+
+        # Custo fixo de /api/available_slots (max_date) medido num dia fora do período
+        scheduling_config_cache.invalidate(ACCOUNT_ID)
+        chamadas.clear()
+        client.get(f"/api/available_slots/default?date={(hoje - datetime.timedelta(days=1)).isoformat()}")
+        custo_fixo = sum(chamadas.values())
+
+        custo_por_dia = 0
+        abertos = 0
+        for dia in dados["days"]:
+            if dia["status"] not in ("available", "full"):
+                continue
+            abertos += 1
+            scheduling_config_cache.invalidate(ACCOUNT_ID)
+            chamadas.clear()
+            slots = client.get(f"/api/available_slots/default?date={dia['date']}").get_json()["slots"]
+            custo_por_dia += sum(chamadas.values()) - custo_fixo
+            if len(slots) != dia.get("slots_count", 0):
+                divergencias += 1
+                print(f"  [DIVERGE] {dia['date']}: calendário={dia.get('slots_count', 0)} dia={len(slots)}")
+
+        print(f"{month:<10}{abertos:>14}{custo_por_dia:>22}{custo_mes:>26}")
+
+    if divergencias:
+        print(f"\n[ERRO] {divergencias} dias com resultado diferente entre o mês e o cálculo por dia.")
+        sys.exit(1)
+    print("\n[OK] Horários livres idênticos nos dois caminhos.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Compara entidade_atende_filtros_dinamico (por linha) com o predicado de
+compilar_filtros_dinamicos (montado uma vez) em transações sintéticas.
+Confere também que as duas dão exatamente o mesmo resultado em cada linha.
+
+    python scripts/benchmark_filtros.py [--linhas 10000] [--repeticoes 5]
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import schemas
+from utils import compilar_filtros_dinamicos, entidade_atende_filtros_dinamico
+
+
+NOMES = ["Ana Souza", "Beatriz Lima", "Carla Mendes", "Daniela Rocha", "Elaine Costa", "Fernanda Alves"]
+CORES = ["Azul", "Azul Marinho", "Rosa / Nude", "Verde e Dourado", "Preto", "Marsala", "Off White"]
+TAMANHOS = ["P", "M", "G", "P, M", "M, G", "Extra G"]
+STATUS = ["reserved", "rented", "returned"]
+
+
+def _fields_config():
+    # Mesma montagem de list_transactions (transação tem prioridade nos ids repetidos)
+    fields = (
+        schemas.get_schema_fields("transaction")
+        + schemas.get_schema_fields("client")
+        + schemas.get_schema_fields("item")
+    )
+    seen = set()
+    out = []
+    for f in fields:
+        if f["id"] not in seen:
+            out.append(f)
+            seen.add(f["id"])
+    return out
+
+
+def _transacoes(n, seed=42):
+    rnd = random.Random(seed)
+    base = datetime.date(2025, 1, 1)
+    rows = []
+    for i in range(n):
+        rental = base + datetime.timedelta(days=rnd.randint(0, 600))
+        ret = rental + datetime.timedelta(days=rnd.randint(1, 5))
+        created = rental - datetime.timedelta(days=rnd.randint(0, 60))
+        rows.append({
+            "transaction_id": f"tx{i:06d}",
+            "transaction_status": rnd.choice(STATUS),
+            "rental_date": rental.isoformat(),
+            "return_date": ret.isoformat(),
+            "transaction_date": rental.isoformat(),
+            "created_at": f"{created.isoformat()} {rnd.randint(8, 19):02d}:{rnd.randint(0, 59):02d}:00",
+            "transaction_value": Decimal(rnd.randint(150, 2500)),
+            "item_value": Decimal(rnd.randint(500, 9000)),
+            "client_name": rnd.choice(NOMES) + f" {i % 97}",
+            "item_custom_id": f"V{rnd.randint(1, 800):04d}",
+            "item_title": f"Vestido {rnd.choice(['longo', 'midi', 'curto'])}",
+            "cor_comercial": rnd.choice(CORES),
+            "tamanho": rnd.choice(TAMANHOS),
+            "item_image_url": rnd.choice(["", "N/A", f"https://example.com/{i}.jpg"]),
+        })
+    return rows
+
+
+CENARIOS = [
+    ("sem filtros", {}, None),
+    ("nome do cliente", {"client_name": "ana"}, None),
+    ("período de retirada", {"start_rental_date": "2025-03-01", "end_rental_date": "2025-06-30"}, None),
+    ("created_at + valor", {"start_created_at": "2025-02-01", "end_created_at": "2025-12-31",
+                            "min_transaction_value": "300", "max_transaction_value": "1500"}, None),
+    ("cor + tamanho + imagem", {"cor_comercial": "azul", "tamanho": ["M", "G"]}, True),
+    ("tudo junto", {"client_name": "a", "start_rental_date": "2025-01-15", "end_return_date": "2026-01-01",
+                    "cor_comercial": "Rosa", "tamanho": "P", "min_item_value": "1000",
+                    "start_transaction_date": "2025-02-01"}, None),
+]
+
+
+def _medir(fn, repeticoes):
+    melhor = None
+    resultado = None
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        resultado = fn()
+        dt = time.perf_counter() - t0
+        melhor = dt if melhor is None else min(melhor, dt)
+    return melhor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=10000)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    fields_config = _fields_config()
+    rows = _transacoes(args.linhas)
+
+    print(f"{args.linhas} transações, melhor de {args.repeticoes} execuções\n")
+    print(f"{'cenário':<26}{'aprovadas':>10}{'original (ms)':>16}{'compilado (ms)':>16}{'ganho':>8}")
+    divergencias = 0
+    for nome, filtros, imagem in CENARIOS:
+        t_orig, r_orig = _medir(
+            lambda: [entidade_atende_filtros_dinamico(r, filtros, fields_config, imagem) for r in rows],
+            args.repeticoes,
+        )
+
+        def _compilado():
+            predicado = compilar_filtros_dinamicos(filtros, fields_config, imagem)
+            return [predicado(r) for r in rows]
+
+        t_comp, r_comp = _medir(_compilado, args.repeticoes)
+        if r_orig != r_comp:
+            divergencias += sum(1 for a, b in zip(r_orig, r_comp) if a != b)
+        print(
+            f"{nome:<26}{sum(r_comp):>10}{t_orig * 1000:>16.1f}{t_comp * 1000:>16.1f}"
+            f"{(t_orig / t_comp if t_comp else 0):>7.1f}x"
+        )
+
+    if divergencias:
+        print(f"\n[ERRO] {divergencias} linhas com resultado diferente entre as versões.")
+        sys.exit(1)
+    print("\n[OK] Resultados idênticos em todos os cenários.")
+
+
+if __name__ == "__main__":
+    main()
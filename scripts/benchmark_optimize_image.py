@@ -0,0 +1,132 @@
+"""
+Compara utils.optimize_image (decodificação limitada, image_renditions.open_bounded)
+com a versão anterior, que abria a foto na resolução original antes do thumbnail.
+
+Para cada entrada (JPEG 24 MP com EXIF de rotação, PNG RGBA e WebP grandes) e
+cada versão, roda num processo novo e mede:
+  - pico de memória (VmHWM) acima do processo já com a entrada carregada;
+  - latência mediana de --repeticoes chamadas.
+
+    python scripts/benchmark_optimize_image.py [--repeticoes 3]
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+
+ENTRADAS = (
+    ("jpeg-24mp", "JPEG", (6000, 4000)),
+    ("png-12mp-rgba", "PNG", (4000, 3000)),
+    ("webp-16mp", "WEBP", (4900, 3300)),
+)
+
+
+def optimize_image_antigo(image_file, max_width=1920, quality=85):
+    """utils.optimize_image antes da decodificação limitada (referência)."""
+    image_file.seek(0)
+    img = Image.open(image_file)
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+    width, height = img.size
+    if width > max_width or height > max_width:
+        img.thumbnail((max_width, max_width), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=quality, optimize=True)
+    output.seek(0)
+    return output
+
+
+def _gerar(formato, tamanho, destino):
+    """Foto sintética com gradiente e ruído (comprime como foto, não como cor lisa)."""
+    ruido = Image.effect_noise(tamanho, 40)
+    gradiente = Image.linear_gradient("L").resize(tamanho)
+    canais = [Image.blend(gradiente, ruido, 0.5), ruido, gradiente.transpose(Image.Transpose.ROTATE_180)]
+    img = Image.merge("RGB", canais)
+    kwargs = {}
+    if formato == "PNG":
+        img.putalpha(gradiente)
+    elif formato == "JPEG":
+        exif = Image.Exif()
+        exif[0x0112] = 6  # celular segurado em pé
+        kwargs = {"quality": 92, "exif": exif.tobytes()}
+    elif formato == "WEBP":
+        kwargs = {"quality": 90}
+    img.save(destino, format=formato, **kwargs)
+
+
+def _pico_rss_kb():
+    """
+    Pico de memória residente do processo em KB. Lê VmHWM (Linux), que começa do
+    zero no processo novo; ru_maxrss herdaria o pico do processo pai.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _medir(caminho, versao, repeticoes, fila):
+    with open(caminho, "rb") as f:
+        dados = f.read()
+    if versao == "atual":
+        from utils import optimize_image as funcao
+    else:
+        funcao = optimize_image_antigo
+    base = _pico_rss_kb()
+    tempos = []
+    saida = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        saida = funcao(io.BytesIO(dados))
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    pico = _pico_rss_kb() - base
+    with Image.open(saida) as resultado:
+        dimensoes = resultado.size
+        progressivo = bool(resultado.info.get("progressive") or resultado.info.get("progression"))
+    fila.put((statistics.median(tempos), pico / 1024, dimensoes, progressivo))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'entrada':<16}{'versão':<9}{'mediana (ms)':>14}{'pico RSS (MB)':>15}  {'saída':<11}progressivo")
+    with tempfile.TemporaryDirectory() as pasta:
+        for nome, formato, tamanho in ENTRADAS:
+            caminho = os.path.join(pasta, f"{nome}.{formato.lower()}")
+            _gerar(formato, tamanho, caminho)
+            for versao in ("anterior", "atual"):
+                fila = ctx.Queue()
+                processo = ctx.Process(target=_medir, args=(caminho, versao, args.repeticoes, fila))
+                processo.start()
+                mediana, pico, dimensoes, progressivo = fila.get()
+                processo.join()
+                saida = f"{dimensoes[0]}x{dimensoes[1]}"
+                print(f"{nome:<16}{versao:<9}{mediana:>14.0f}{pico:>15.1f}  {saida:<11}{'sim' if progressivo else 'não'}")
+
+
+if __name__ == "__main__":
+    main()
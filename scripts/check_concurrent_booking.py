@@ -0,0 +1,322 @@
+"""
+Dispara confirmações simultâneas de agendamento público contra tabelas em memória
+(escritas condicionais e transact_write_items atômicos) e confere a reserva de
+horário (slot_claims):
+
+  1. N clientes pedem e confirmam o MESMO horário ao mesmo tempo: exatamente uma
+     prova é gravada; os outros recebem "horário já agendado".
+  2. N clientes confirmam horários DIFERENTES ao mesmo tempo: todos confirmam, e o
+     tempo total fica perto do de uma confirmação (nada é serializado).
+  3. A prova vencedora é cancelada direto na tabela (como o painel faz, sem liberar
+     a reserva): um novo cliente consegue o horário (reserva órfã é recuperada).
+
+    python scripts/check_concurrent_booking.py [--clientes 20] [--latencia-ms 5]
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from jinja2 import DictLoader
+
+from schedul_example.public_scheduling_routes import (
+    DEFAULT_WEEKLY_SCHEDULE,
+    _generate_confirmation_token,
+    _now_manaus,
+    init_public_scheduling_routes,
+)
+
+
+ACCOUNT_ID = "conta-concorrencia"
+
+TEMPLATES = {
+    "booking_pending.html": "{{ fitting_id }}",
+    "booking_result.html": "{{ 'OK' if success else 'FALHA' }}|{{ message }}",
+}
+
+
+def _avaliar(condicao, item):
+    """Avalia uma condição do boto3 (Key/Attr) contra um dict (None = item inexistente)."""
+    item = item or {}
+    expr = condicao.get_expression()
+    op = expr["operator"]
+    valores = expr["values"]
+    if op == "AND":
+        return all(_avaliar(v, item) for v in valores)
+    if op == "OR":
+        return any(_avaliar(v, item) for v in valores)
+    if op == "NOT":
+        return not _avaliar(valores[0], item)
+    if op == "attribute_not_exists":
+        return valores[0].name not in item
+    if op == "attribute_exists":
+        return valores[0].name in item
+    atual = item.get(valores[0].name)
+    if op == "=":
+        return atual == valores[1]
+    if atual is None:
+        return False
+    if op == "BETWEEN":
+        return valores[1] <= atual <= valores[2]
+    if op == "begins_with":
+        return str(atual).startswith(valores[1])
+    raise ValueError(f"Operador não suportado: {op}")
+
+
+def _avaliar_texto(condicao, valores, item):
+    """Condições em texto das transações: termos "attribute_not_exists(a)" / "a = :v" com OR."""
+    item = item or {}
+    for termo in condicao.split(" OR "):
+        termo = termo.strip()
+        if termo.startswith("attribute_not_exists(") and termo.endswith(")"):
+            if termo[len("attribute_not_exists("):-1] not in item:
+                return True
+            continue
+        campo, _, valor = [p.strip() for p in termo.partition("=")]
+        if not valor.startswith(":"):
+            raise ValueError(f"Condição não suportada: {termo}")
+        if item.get(campo) == valores[valor]:
+            return True
+    return False
+
+
+class TransactionCanceledException(Exception):
+    def __init__(self, reasons):
+        super().__init__("Transaction cancelled")
+        self.response = {"Error": {"Code": "TransactionCanceledException"}, "CancellationReasons": reasons}
+
+
+class ConditionalCheckFailedException(Exception):
+    pass
+
+
+class BancoEmMemoria:
+    """Várias tabelas com um único lock: cada escrita/transação é atômica."""
+
+    def __init__(self, latencia):
+        self.lock = threading.Lock()
+        self.tabelas = {}
+        self.latencia = latencia
+        self.transacoes = 0
+        self.exceptions = type(
+            "Exceptions",
+            (),
+            {
+                "TransactionCanceledException": TransactionCanceledException,
+                "ConditionalCheckFailedException": ConditionalCheckFailedException,
+            },
+        )
+
+    def transact_write_items(self, TransactItems):
+        time.sleep(self.latencia)
+        with self.lock:
+            self.transacoes += 1
+            planos = []
+            motivos = []
+            for op in TransactItems:
+                tipo, params = next(iter(op.items()))
+                tabela = self.tabelas[params["TableName"]]
+                chave = tabela._chave(params["Item"] if tipo == "Put" else params["Key"])
+                condicao = params.get("ConditionExpression")
+                ok = condicao is None or _avaliar_texto(
+                    condicao, params.get("ExpressionAttributeValues") or {}, tabela.linhas.get(chave)
+                )
+                motivos.append({"Code": "None" if ok else "ConditionalCheckFailed"})
+                planos.append((tipo, tabela, chave, params.get("Item")))
+            if any(m["Code"] != "None" for m in motivos):
+                raise TransactionCanceledException(motivos)
+            for tipo, tabela, chave, item in planos:
+                if tipo == "Put":
+                    tabela.linhas[chave] = dict(item)
+                else:
+                    tabela.linhas.pop(chave, None)
+        return {}
+
+
+class TabelaEmMemoria:
+    def __init__(self, banco, nome, hash_key, range_key):
+        self.banco = banco
+        self.name = nome
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.linhas = {}
+        self.meta = type("Meta", (), {"client": banco})
+        banco.tabelas[nome] = self
+
+    def _chave(self, item):
+        return (item[self.hash_key], item.get(self.range_key))
+
+    def _checar(self, chave, ConditionExpression=None, **kwargs):
+        if ConditionExpression is not None and not _avaliar(ConditionExpression, self.linhas.get(chave)):
+            raise ConditionalCheckFailedException()
+
+    def put_item(self, Item, **kwargs):
+        time.sleep(self.banco.latencia)
+        with self.banco.lock:
+            self._checar(self._chave(Item), **kwargs)
+            self.linhas[self._chave(Item)] = dict(Item)
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        time.sleep(self.banco.latencia)
+        with self.banco.lock:
+            self._checar(self._chave(Key), **kwargs)
+            self.linhas.pop(self._chave(Key), None)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        time.sleep(self.banco.latencia)
+        with self.banco.lock:
+            item = self.linhas.get(self._chave(Key))
+        return {"Item": dict(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        # Só o formato usado pelas rotas: "SET a = :a, #b = :b"
+        time.sleep(self.banco.latencia)
+        nomes = ExpressionAttributeNames or {}
+        with self.banco.lock:
+            item = self.linhas.setdefault(self._chave(Key), dict(Key))
+            for parte in UpdateExpression.replace("SET ", "", 1).split(","):
+                campo, valor = [p.strip() for p in parte.split("=")]
+                item[nomes.get(campo, campo)] = ExpressionAttributeValues[valor]
+        return {}
+
+    def query(self, KeyConditionExpression, FilterExpression=None, **kwargs):
+        time.sleep(self.banco.latencia)
+        with self.banco.lock:
+            itens = [dict(i) for i in self.linhas.values() if _avaliar(KeyConditionExpression, i)]
+        if FilterExpression is not None:
+            itens = [i for i in itens if _avaliar(FilterExpression, i)]
+        itens.sort(key=lambda i: str(i.get(self.range_key)), reverse=not kwargs.get("ScanIndexForward", True))
+        return {"Items": itens}
+
+
+def _proximo_dia_aberto(minimo_horarios):
+    """Primeiro dia a partir de depois de amanhã com pelo menos N horários na grade."""
+    dia = _now_manaus().date() + datetime.timedelta(days=2)
+    while len(DEFAULT_WEEKLY_SCHEDULE.get(str(dia.weekday()), [])) < minimo_horarios:
+        dia += datetime.timedelta(days=1)
+    return dia.isoformat()
+
+
+def _agendar(app, date_iso, time_local, nome, barreira=None):
+    """Pede o horário e confirma pelo link. Devolve (confirmou, mensagem)."""
+    client = app.test_client()
+    resp = client.post(
+        "/agendar/default/submit",
+        data={
+            "date_iso": date_iso,
+            "time_local": time_local,
+            "client_name": nome,
+            "client_phone": "92999999999",
+            "client_email": f"{nome}@example.com",
+        },
+    )
+    if barreira is not None:
+        barreira.wait()
+    if resp.status_code != 200:
+        return False, f"pedido recusado ({resp.status_code})"
+    fitting_id = resp.get_data(as_text=True).strip()
+    token = _generate_confirmation_token(fitting_id)
+    texto = client.get(f"/agendar/default/confirmar/{fitting_id}/{token}").get_data(as_text=True)
+    status, _, mensagem = texto.partition("|")
+    return status == "OK", mensagem
+
+
+def _disparar(app, pedidos):
+    barreira = threading.Barrier(len(pedidos))
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(pedidos)) as pool:
+        futuros = [pool.submit(_agendar, app, d, t, n, barreira) for d, t, n in pedidos]
+        resultados = [f.result() for f in futuros]
+    return resultados, time.perf_counter() - inicio
+
+
+def _provas_confirmadas(fittings_table, date_iso, time_local):
+    return [
+        f for f in fittings_table.linhas.values()
+        if f.get("date_local") == date_iso
+        and f.get("time_local") == time_local
+        and str(f.get("status") or "").lower() == "confirmado"
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=20)
+    parser.add_argument("--latencia-ms", type=float, default=5.0, help="Latência simulada por chamada à tabela")
+    args = parser.parse_args()
+
+    os.environ["AI_SYNC_ACCOUNT_ID"] = ACCOUNT_ID  # slug "default"
+    banco = BancoEmMemoria(args.latencia_ms / 1000.0)
+    fittings_table = TabelaEmMemoria(banco, "fittings", "account_id", "date_time_local")
+    config_table = TabelaEmMemoria(banco, "scheduling_config", "account_id", "config_key")
+    config_table.linhas[(ACCOUNT_ID, "scheduling_settings")] = {
+        "account_id": ACCOUNT_ID,
+        "config_key": "scheduling_settings",
+        "default_fitting_duration_minutes": 30,
+        "max_booking_days_ahead": 30,
+        "min_lead_time_minutes": 0,
+    }
+
+    app = Flask(__name__)
+    app.secret_key = "concorrencia"
+    app.jinja_loader = DictLoader(TEMPLATES)
+    init_public_scheduling_routes(app, fittings_table, config_table, itens_table=None, clients_table=None)
+
+    erros = 0
+    n = args.clientes
+    date_iso = _proximo_dia_aberto(3)
+    horario = DEFAULT_WEEKLY_SCHEDULE[str(datetime.date.fromisoformat(date_iso).weekday())][0]
+
+    # 1. Todos no mesmo horário
+    resultados, segundos = _disparar(app, [(date_iso, horario, f"cliente{i}") for i in range(n)])
+    confirmados = sum(1 for ok, _ in resultados if ok)
+    gravadas = _provas_confirmadas(fittings_table, date_iso, horario)
+    print(f"[1] mesmo horário: {n} clientes, {confirmados} confirmados, {len(gravadas)} provas gravadas ({segundos:.2f}s)")
+    for ok, mensagem in resultados:
+        if not ok and "já" not in mensagem and "disponível" not in mensagem:
+            print(f"    resposta inesperada: {mensagem}")
+    if confirmados != 1 or len(gravadas) != 1:
+        erros += 1
+        print("    [ERRO] esperado exatamente 1 confirmado e 1 prova gravada")
+
+    # 2. Horários diferentes em paralelo (comparado com uma confirmação sozinha)
+    grade = DEFAULT_WEEKLY_SCHEDULE[str(datetime.date.fromisoformat(date_iso).weekday())]
+    _, segundos_um = _disparar(app, [(date_iso, grade[1], "sozinho")])
+    pedidos = [(date_iso, t, f"outro{i}") for i, t in enumerate(grade[2:2 + n])]
+    resultados, segundos = _disparar(app, pedidos)
+    confirmados = sum(1 for ok, _ in resultados if ok)
+    print(
+        f"[2] horários diferentes: {len(pedidos)} clientes, {confirmados} confirmados "
+        f"({segundos:.2f}s; uma confirmação sozinha: {segundos_um:.2f}s)"
+    )
+    if confirmados != len(pedidos):
+        erros += 1
+        print("    [ERRO] todos deveriam confirmar")
+
+    # 3. Vencedor cancelado sem liberar a reserva
+    vencedora = gravadas[0] if gravadas else None
+    if vencedora:
+        fittings_table.linhas[fittings_table._chave(vencedora)]["status"] = "Cancelado"
+        ok, mensagem = _agendar(app, date_iso, horario, "depois_do_cancelamento")
+        print(f"[3] horário de prova cancelada: {'confirmado' if ok else 'recusado: ' + mensagem}")
+        if not ok:
+            erros += 1
+            print("    [ERRO] a reserva da prova cancelada deveria ser liberada")
+
+    print(f"\n{banco.transacoes} transações enviadas.")
+    if erros:
+        sys.exit(1)
+    print("[OK] Reserva de horário consistente sob concorrência.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+slot_claims.py
+Reserva de horário de prova com escrita condicional, sem corrida entre duas
+confirmações do mesmo horário.
+
+Cada horário da grade ocupado por uma prova confirmada pela agenda pública tem um
+registro de reserva numa partição própria da conta em scheduling_config_table:
+    account_id = "slot_claim:<account_id>", config_key = "<YYYY-MM-DD>#<HH:MM>"
+    fitting_id, date_local, time_local, duration_minutes, ttl
+
+ttl (epoch) é o fim do dia da prova mais SLOT_CLAIM_TTL_DAYS (padrão 7), para o
+DynamoDB apagar sozinho as reservas de datas que já passaram (o TTL da tabela é o
+mesmo de pending_bookings, habilitado pelo sweep_pending_bookings.py).
+
+A prova é gravada na mesma transação (transact_write_items) que as reservas, e
+cada reserva tem a condição "não existe ou já é desta prova". Se outra confirmação
+pegou algum dos horários, a transação inteira é cancelada e quem perdeu recebe
+SlotTaken na hora. Não há trava na aplicação: confirmações de horários diferentes
+seguem em paralelo.
+
+Provas canceladas, apagadas ou remarcadas pelo painel não liberam a reserva. Isso
+é tratado no conflito: se a prova dona da reserva não existe mais, foi cancelada ou
+mudou de data/horário, a reserva é apagada e a transação é tentada mais uma vez.
+
+Teste local com requisições simultâneas: python scripts/check_concurrent_booking.py
+"""
+
+import calendar
+import datetime
+import os
+import time
+
+from boto3.dynamodb.conditions import Attr
+
+import slot_occupancy
+
+
+CLAIM_PREFIX = "slot_claim:"
+CLAIM_TTL = int(float(os.getenv("SLOT_CLAIM_TTL_DAYS", "7")) * 86400)
+RELEASED_STATUSES = ("cancelado", "cancelled", "rejected")
+
+
+class SlotTaken(Exception):
+    """Algum horário pedido já está reservado por outra prova."""
+
+    def __init__(self, slots):
+        super().__init__(f"Horário já reservado: {', '.join(slots)}")
+        self.slots = list(slots)
+
+
+def claim_key(account_id, date_iso, slot):
+    return {"account_id": f"{CLAIM_PREFIX}{account_id}", "config_key": f"{date_iso}#{slot}"}
+
+
+def claim_ttl(date_iso):
+    """Epoch em que a reserva do dia `date_iso` pode ser apagada pelo TTL."""
+    try:
+        day = datetime.datetime.strptime(str(date_iso)[:10], "%Y-%m-%d")
+        return calendar.timegm(day.timetuple()) + 86400 + CLAIM_TTL
+    except ValueError:
+        return int(time.time()) + CLAIM_TTL
+
+
+def slots_to_claim(schedule_slots, time_local, duration_minutes):
+    """
+    Horários da grade que a prova ocupa (mesma regra de slot_engine.booked_slots).
+    O horário de início entra sempre, mesmo fora da grade.
+    """
+    start = slot_occupancy.time_to_minutes(time_local)
+    if start is None:
+        return []
+    duration = max(1, int(duration_minutes or 0) or 1)
+    occupancy = slot_occupancy.DayOccupancy([(start, start + duration)])
+    slots = occupancy.occupied_slots(schedule_slots)
+    time_local = str(time_local).strip()
+    if time_local not in slots:
+        slots.insert(0, time_local)
+    return slots
+
+
+# Em transact_write_items as condições vão como texto (Attr/Key só são convertidos
+# nas chamadas de uma tabela)
+_OWNED_BY = "attribute_not_exists(account_id) OR fitting_id = :fitting_id"
+
+
+def _with_condition(params, condition, values):
+    if condition:
+        params["ConditionExpression"] = condition
+        if values:
+            params["ExpressionAttributeValues"] = values
+    return params
+
+
+def put_op(table, item, condition=None, values=None):
+    return {"Put": _with_condition({"TableName": table.name, "Item": item}, condition, values)}
+
+
+def delete_op(table, key, condition=None, values=None):
+    return {"Delete": _with_condition({"TableName": table.name, "Key": key}, condition, values)}
+
+
+def _claim_ops(scheduling_config_table, fitting, slots):
+    account_id = fitting["account_id"]
+    fitting_id = fitting["fitting_id"]
+    date_iso = fitting["date_local"]
+    return [
+        put_op(
+            scheduling_config_table,
+            {
+                **claim_key(account_id, date_iso, slot),
+                "fitting_id": fitting_id,
+                "date_local": date_iso,
+                "time_local": fitting["time_local"],
+                "duration_minutes": fitting.get("duration_minutes"),
+                "ttl": claim_ttl(date_iso),
+            },
+            _OWNED_BY,
+            {":fitting_id": fitting_id},
+        )
+        for slot in slots
+    ]
+
+
+def _is_stale(fittings_table, account_id, claim):
+    """
+    Reserva cuja prova dona não ocupa mais aquele horário. A chave da prova sai da
+    própria reserva (data#hora#fitting_id): remarcada ou apagada, ela não existe mais.
+    """
+    fitting_id = claim.get("fitting_id")
+    if not fitting_id:
+        return True
+    holder = fittings_table.get_item(
+        Key={
+            "account_id": account_id,
+            "date_time_local": f"{claim.get('date_local')}#{claim.get('time_local')}#{fitting_id}",
+        },
+        ConsistentRead=True,
+    ).get("Item")
+    if not holder:
+        return True
+    return str(holder.get("status") or "").lower() in RELEASED_STATUSES
+
+
+def _clear_stale(scheduling_config_table, fittings_table, account_id, date_iso, slots):
+    """Apaga as reservas órfãs de `slots`. True se todas foram liberadas."""
+    client = scheduling_config_table.meta.client
+    for slot in slots:
+        key = claim_key(account_id, date_iso, slot)
+        claim = scheduling_config_table.get_item(Key=key).get("Item")
+        if not claim:
+            # Outra transação em andamento no mesmo horário
+            return False
+        if not _is_stale(fittings_table, account_id, claim):
+            return False
+        try:
+            scheduling_config_table.delete_item(
+                Key=key,
+                ConditionExpression=Attr("fitting_id").eq(claim.get("fitting_id")),
+            )
+        except client.exceptions.ConditionalCheckFailedException:
+            return False
+        print(f"Reserva órfã liberada: {account_id} {date_iso} {slot} (prova {claim.get('fitting_id')})")
+    return True
+
+
+def reserve(
+    scheduling_config_table,
+    fittings_table,
+    fitting,
+    slots,
+    operations=(),
+    release_date="",
+    release_slots=(),
+):
+    """
+    Grava a prova junto com as reservas de `slots` numa única transação.
+
+    operations: operações extras na mesma transação (put_op/delete_op), como apagar
+        o pedido pendente ou a chave antiga da prova remarcada.
+    release_date/release_slots: reservas antigas da prova a liberar (remarcação).
+
+    A prova sai com claimed_slots preenchido. Levanta SlotTaken se algum horário é
+    de outra prova.
+    """
+    account_id = fitting["account_id"]
+    fitting_id = fitting["fitting_id"]
+    date_iso = fitting["date_local"]
+    slots = list(dict.fromkeys(slots))
+    fitting["claimed_slots"] = slots
+
+    claim_ops = _claim_ops(scheduling_config_table, fitting, slots)
+    release_ops = [
+        delete_op(
+            scheduling_config_table,
+            claim_key(account_id, release_date, slot),
+            _OWNED_BY,
+            {":fitting_id": fitting_id},
+        )
+        for slot in dict.fromkeys(release_slots or [])
+        if release_date and not (release_date == date_iso and slot in slots)
+    ]
+    transact_items = claim_ops + [put_op(fittings_table, fitting)] + list(operations) + release_ops
+
+    client = scheduling_config_table.meta.client
+    for attempt in range(2):
+        try:
+            client.transact_write_items(TransactItems=transact_items)
+            return fitting
+        except client.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get("CancellationReasons") or []
+            if reasons:
+                taken = [
+                    slot
+                    for slot, reason in zip(slots, reasons)
+                    if reason.get("Code") in ("ConditionalCheckFailed", "TransactionConflict")
+                ]
+                if not taken:
+                    raise
+            else:
+                taken = slots
+            if attempt or not _clear_stale(scheduling_config_table, fittings_table, account_id, date_iso, taken):
+                raise SlotTaken(taken)
+    return fitting
+
+
+def release(scheduling_config_table, fitting):
+    """Libera as reservas da prova (cancelamento). Erros só são registrados."""
+    date_iso = str(fitting.get("date_local") or fitting.get("date_time_local") or "")[:10]
+    fitting_id = fitting.get("fitting_id")
+    client = scheduling_config_table.meta.client
+    for slot in fitting.get("claimed_slots") or []:
+        try:
+            scheduling_config_table.delete_item(
+                Key=claim_key(fitting["account_id"], date_iso, slot),
+                ConditionExpression=Attr("fitting_id").eq(fitting_id),
+            )
+        except client.exceptions.ConditionalCheckFailedException:
+            pass
+        except Exception as e:
+            print(f"Erro ao liberar reserva {date_iso} {slot} da prova {fitting_id}: {e}")
@@ -0,0 +1,183 @@
+"""
+slot_engine.py
+Cálculo dos horários de prova (disponível/ocupado/bloqueado) a partir de dados já
+carregados. Sem I/O: quem chama lê a configuração e as provas e passa aqui.
+
+A agenda pública usa as mesmas funções para um dia (_get_available_slots,
+_get_slots_with_status) e para o mês inteiro (calendar_days), que recebe a
+configuração lida uma vez e as provas do mês de um único query por faixa de chave.
+A ocupação de cada dia vem de slot_occupancy (intervalos unidos + busca binária).
+"""
+
+import datetime
+
+import slot_occupancy
+from slot_occupancy import time_to_minutes
+
+
+CONFIRMED_STATUSES = ("confirmado", "confirmed")
+
+
+def booked_slots(fittings, schedule_slots, default_duration):
+    """
+    Horários da grade que se sobrepõem a provas confirmadas do dia.
+    ["*"] = prova confirmada sem horário (o dia inteiro fica ocupado).
+    """
+    occupancy = slot_occupancy.day_occupancy(
+        fittings,
+        default_duration,
+        statuses=CONFIRMED_STATUSES,
+        untimed_blocks_day=True,
+    )
+    if occupancy.all_day:
+        return ["*"]
+    return occupancy.occupied_slots(schedule_slots)
+
+
+def _slot_datetime(date_obj, minutes, tz):
+    naive = datetime.datetime.combine(date_obj, datetime.time(hour=minutes // 60, minute=minutes % 60))
+    return tz.localize(naive)
+
+
+def available_slots(
+    date_iso,
+    schedule,
+    blocked_dates,
+    blocked_slots,
+    fittings,
+    default_duration,
+    lead_minutes,
+    now,
+    tz,
+    allow_past=False,
+):
+    """Horários livres do dia, ordenados (mesmas regras de _get_available_slots)."""
+    if date_iso in blocked_dates:
+        return []
+
+    date_obj = datetime.date.fromisoformat(date_iso)
+    all_day_slots = list(schedule.get(str(date_obj.weekday()), []))
+    if not all_day_slots:
+        return []
+
+    available = [t for t in all_day_slots if t not in blocked_slots]
+
+    booked = booked_slots(fittings, all_day_slots, default_duration)
+    if "*" in booked:
+        return []
+    available = [t for t in available if t not in booked]
+
+    if not allow_past:
+        cutoff_dt = now + datetime.timedelta(minutes=max(0, int(lead_minutes or 0)))
+        filtered = []
+        for t in available:
+            m = time_to_minutes(t)
+            if m is not None and _slot_datetime(date_obj, m, tz) > cutoff_dt:
+                filtered.append(t)
+        available = filtered
+
+    return sorted(available)
+
+
+def slots_with_status(
+    date_iso,
+    schedule,
+    blocked_dates,
+    blocked_slots,
+    fittings,
+    default_duration,
+    lead_minutes,
+    now,
+    tz,
+):
+    """[{"time", "status"}] de toda a grade do dia (available/booked/blocked/past)."""
+    date_obj = datetime.date.fromisoformat(date_iso)
+    all_slots = sorted(str(s).strip() for s in schedule.get(str(date_obj.weekday()), []) if str(s).strip())
+    if not all_slots:
+        return []
+
+    blocked_slots = set(str(s).strip() for s in blocked_slots or [])
+    booked = set(str(s).strip() for s in booked_slots(fittings, all_slots, default_duration))
+    booked_all = "*" in booked
+    cutoff_dt = now + datetime.timedelta(minutes=max(0, int(lead_minutes or 0)))
+    day_blocked = date_iso in blocked_dates
+
+    out = []
+    for t in all_slots:
+        m = time_to_minutes(t)
+        if m is None:
+            continue
+        slot_dt = _slot_datetime(date_obj, m, tz)
+        if day_blocked or t in blocked_slots:
+            status = "blocked"
+        elif booked_all or t in booked:
+            status = "booked"
+        elif slot_dt <= now:
+            status = "past"
+        elif slot_dt <= cutoff_dt:
+            status = "blocked"
+        else:
+            status = "available"
+        out.append({"time": t, "status": status})
+    return out
+
+
+def group_fittings_by_date(fittings):
+    by_date = {}
+    for fitting in fittings or []:
+        date_part = str(fitting.get("date_time_local") or "")[:10]
+        if date_part:
+            by_date.setdefault(date_part, []).append(fitting)
+    return by_date
+
+
+def calendar_days(
+    first_day,
+    last_day,
+    today_iso,
+    max_date_iso,
+    schedule,
+    blocked_dates,
+    blocked_slots_by_date,
+    fittings_by_date,
+    default_duration,
+    lead_minutes,
+    now,
+    tz,
+):
+    """Status de cada dia de [first_day, last_day] para o calendário público."""
+    blocked_dates = set(blocked_dates or [])
+    days = []
+    current = first_day
+    while current <= last_day:
+        date_str = current.isoformat()
+        weekday = str(current.weekday())
+        day_info = {"date": date_str, "day": current.day, "weekday": weekday}
+
+        if date_str < today_iso or date_str > max_date_iso:
+            day_info["status"] = "disabled"
+        elif date_str in blocked_dates:
+            day_info["status"] = "blocked"
+        elif not schedule.get(weekday, []):
+            day_info["status"] = "closed"
+        else:
+            available = available_slots(
+                date_str,
+                schedule,
+                blocked_dates,
+                blocked_slots_by_date.get(date_str, []),
+                fittings_by_date.get(date_str, []),
+                default_duration,
+                lead_minutes,
+                now,
+                tz,
+            )
+            if available:
+                day_info["status"] = "available"
+                day_info["slots_count"] = len(available)
+            else:
+                day_info["status"] = "full"
+
+        days.append(day_info)
+        current += datetime.timedelta(days=1)
+    return days
@@ -0,0 +1,134 @@
+"""
+slot_occupancy.py
+Ocupação de um dia de provas como intervalos de minutos [início, fim) ordenados e
+já unidos. As provas do dia são convertidas uma vez; depois cada pergunta
+("quais horários da grade estão ocupados", "[início, fim) sobrepõe alguma prova")
+é uma busca binária, em vez de comparar cada prova com cada horário.
+
+    occ = slot_occupancy.day_occupancy(provas, 60, statuses=("confirmado", "confirmed"))
+    occ.occupied_slots(["09:00", "09:30", ...])   # agenda pública
+    occ.overlaps(600, 660)                        # painel (_has_overlap)
+"""
+
+from bisect import bisect_right
+
+
+def time_to_minutes(time_local):
+    if not time_local:
+        return None
+    t = str(time_local).strip()
+    if not t:
+        return None
+    try:
+        hh, mm = t.split(":")
+        h = int(hh)
+        m = int(mm)
+        if h < 0 or h > 23 or m < 0 or m > 59:
+            return None
+        return h * 60 + m
+    except Exception:
+        return None
+
+
+def fitting_duration(fitting, default_duration):
+    try:
+        duration = int(fitting.get("duration_minutes"))
+    except Exception:
+        duration = default_duration
+    if duration <= 0:
+        duration = default_duration
+    return duration
+
+
+def infer_slot_minutes(slots):
+    """Menor intervalo entre horários da grade (mínimo 5, padrão 30)."""
+    normalized = sorted(set(m for m in (time_to_minutes(s) for s in slots or []) if m is not None))
+    deltas = [b - a for a, b in zip(normalized, normalized[1:]) if b - a > 0]
+    if not deltas:
+        return 30
+    return max(5, min(deltas))
+
+
+def merge_intervals(intervals):
+    """Ordena e une intervalos [início, fim) que se tocam ou se sobrepõem."""
+    merged = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+class DayOccupancy:
+    """Intervalos ocupados de um dia. all_day = prova sem horário (dia inteiro ocupado)."""
+
+    def __init__(self, intervals, all_day=False):
+        merged = merge_intervals(intervals)
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+        self.all_day = all_day
+
+    def overlaps(self, start_min, end_min):
+        """True se [start_min, end_min) encosta em algum minuto ocupado."""
+        if self.all_day:
+            return True
+        # Primeiro intervalo que termina depois do início pedido
+        i = bisect_right(self.ends, start_min)
+        return i < len(self.starts) and self.starts[i] < end_min
+
+    def occupied_slots(self, schedule_slots, slot_minutes=None):
+        """
+        Horários da grade que se sobrepõem a alguma prova.
+        Cada horário dura slot_minutes (padrão: o menor intervalo da grade).
+        """
+        slots = [str(s).strip() for s in (schedule_slots or []) if str(s).strip()]
+        if slot_minutes is None:
+            slot_minutes = infer_slot_minutes(slots)
+        occupied = []
+        for slot in slots:
+            start = time_to_minutes(slot)
+            if start is not None and self.overlaps(start, start + slot_minutes):
+                occupied.append(slot)
+        return occupied
+
+
+def day_occupancy(
+    fittings,
+    default_duration,
+    statuses=None,
+    exclude_statuses=None,
+    exclude_fitting_id=None,
+    untimed_blocks_day=False,
+):
+    """
+    Converte as provas de um dia em DayOccupancy.
+
+    statuses: só conta provas com esses status (None = todos).
+    exclude_statuses: ignora provas com esses status.
+    untimed_blocks_day: prova sem horário ocupa o dia inteiro (senão é ignorada).
+    """
+    statuses = {s.lower() for s in statuses} if statuses else None
+    exclude_statuses = {s.lower() for s in exclude_statuses or ()}
+    exclude_fitting_id = str(exclude_fitting_id or "")
+
+    intervals = []
+    all_day = False
+    for fitting in fittings or []:
+        if exclude_fitting_id and str(fitting.get("fitting_id") or "") == exclude_fitting_id:
+            continue
+        status = str(fitting.get("status") or "").lower()
+        if statuses is not None and status not in statuses:
+            continue
+        if status in exclude_statuses:
+            continue
+        start = time_to_minutes(fitting.get("time_local", ""))
+        if start is None:
+            if untimed_blocks_day:
+                all_day = True
+            continue
+        intervals.append((start, start + fitting_duration(fitting, default_duration)))
+    return DayOccupancy(intervals, all_day=all_day)
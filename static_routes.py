@@ -8,16 +8,12 @@ from flask import (
     send_from_directory,
 )
 
-import os
 import random
-import pickle
-import re
-import unicodedata
 
 import uuid
 from decimal import Decimal
 import datetime
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.conditions import Key
 from flask import render_template_string
 from utils import get_user_timezone, get_account_plan
 from flask import jsonify
@@ -25,12 +21,15 @@ import qrcode
 import io
 import base64
 from flask import request
-import os
 import schemas
+import heapq
+import catalog_snapshot
+import visit_buckets
+import availability_index
 
 
 # Account ID principal da London Noivas
-LONDON_NOIVAS_ACCOUNT_ID = "37d5b37f-c920-4090-a682-7e1ed2e31a0f"
+LONDON_NOIVAS_ACCOUNT_ID = catalog_snapshot.LONDON_NOIVAS_ACCOUNT_ID
 
 def init_static_routes(
     app,
@@ -41,98 +40,22 @@ def init_static_routes(
     text_models_table,
     users_table,
     payment_transactions_table,
+    catalog_snapshot_table=None,
+    visits_table=None,
 ):
-    env_ids = os.getenv("PUBLIC_CATALOG_ACCOUNT_IDS", "").strip()
-    public_account_ids = [
-        v.strip()
-        for v in ([env_ids] if env_ids and "," not in env_ids else env_ids.split(","))
-        if v.strip()
-    ]
-    if not public_account_ids:
-        public_account_ids = [LONDON_NOIVAS_ACCOUNT_ID, "london_noivas"]
-
-    ai_meta_cache = {"mtime": None, "by_id": None}
+    public_account_ids = catalog_snapshot.get_public_account_ids()
 
     def _normalize_text(text):
-        text = str(text or "").lower()
-        text = unicodedata.normalize("NFKD", text)
-        text = "".join([c for c in text if not unicodedata.combining(c)])
-        text = re.sub(r"\s+", " ", text).strip()
-        return text
+        return catalog_snapshot.normalize_text(text)
 
     def _slugify(text):
-        text = _normalize_text(text)
-        text = re.sub(r"[^a-z0-9]+", "-", text).strip("-")
-        return text
+        return catalog_snapshot.slugify(text)
 
     def _get_item_occasions(item):
-        if not isinstance(item, dict):
-            return []
-            
-        # Check DynamoDB flags first
-        slugs_map = {
-            "madrinha": "Madrinha",
-            "formatura": "Formatura",
-            "gala": "Gala",
-            "debutante": "Debutante",
-            "convidada": "Convidada",
-            "mae_dos_noivos": "Mãe dos Noivos",
-            "noiva": "Noiva",
-            "civil": "Civil"
-        }
-        
-        occasions = []
-        for slug, label in slugs_map.items():
-            if item.get(f"occasion_{slug}") == "1":
-                occasions.append(label)
-                
-        if occasions:
-            return occasions
-
-        # Fallback to AI metadata if no flags are set (backward compatibility)
-        meta_by_id = _load_ai_meta_by_id()
-        item_id = item.get("item_id")
-        if item_id and str(item_id) in meta_by_id:
-            meta = meta_by_id.get(str(item_id)) or {}
-            mf = meta.get("metadata_filters")
-            if isinstance(mf, dict):
-                occ = mf.get("occasions")
-                if isinstance(occ, list):
-                    return [str(o) for o in occ if str(o).strip()]
-        return []
+        return catalog_snapshot.resolve_item_occasions(item)
 
     def _load_ai_meta_by_id():
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        pkl_path = os.path.join(base_dir, "vector_store_metadata.pkl")
-        if not os.path.exists(pkl_path):
-            ai_meta_cache["mtime"] = None
-            ai_meta_cache["by_id"] = {}
-            return ai_meta_cache["by_id"]
-
-        try:
-            mtime = os.path.getmtime(pkl_path)
-            if ai_meta_cache["by_id"] is not None and ai_meta_cache["mtime"] == mtime:
-                return ai_meta_cache["by_id"]
-
-            with open(pkl_path, "rb") as f:
-                raw = pickle.load(f)
-
-            by_id = {}
-            if isinstance(raw, list):
-                for entry in raw:
-                    if not isinstance(entry, dict):
-                        continue
-                    cid = entry.get("custom_id") or entry.get("item_id")
-                    if cid:
-                        by_id[str(cid)] = entry
-
-            ai_meta_cache["mtime"] = mtime
-            ai_meta_cache["by_id"] = by_id
-            return by_id
-        except Exception:
-            ai_meta_cache["mtime"] = None
-            ai_meta_cache["by_id"] = {}
-            return ai_meta_cache["by_id"]
+        return catalog_snapshot.load_ai_meta_by_id()
 
     def _category_slug(item):
         if isinstance(item, dict):
@@ -607,19 +530,7 @@ def init_static_routes(
     @app.route("/")
     def index():
         try:
-            # Fetch ALL available items for vitrine (filtered by account)
-            response = itens_table.scan(
-                FilterExpression=Attr("status").eq("available") & Attr("account_id").is_in(public_account_ids)
-            )
-            all_items = response.get("Items", [])
-            
-            while "LastEvaluatedKey" in response:
-                response = itens_table.scan(
-                    FilterExpression=Attr("status").eq("available") & Attr("account_id").is_in(public_account_ids),
-                    ExclusiveStartKey=response["LastEvaluatedKey"]
-                )
-                all_items.extend(response.get("Items", []))
-
+            # A vitrine não lista itens (eles vêm do /catalogo), então nada de scan aqui
             occasion_tabs = [
                 {"slug": "noiva", "label": "Noiva"},
                 {"slug": "civil", "label": "Civil"},
@@ -647,51 +558,18 @@ def init_static_routes(
 
     def _get_recent_visits_map():
         import time
-        import boto3
-        from boto3.dynamodb.conditions import Attr
-        
+
         now = time.time()
         if now - _recent_visits_cache["last_updated"] < 1800: # 30 minutes cache
             return _recent_visits_cache["data"]
-            
+
         try:
-            # Initialize resource locally
-            dynamodb_resource = boto3.resource(
-                'dynamodb',
-                region_name=os.getenv('AWS_REGION', 'us-east-1'),
-                aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-                aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')
-            )
-            visits_table = dynamodb_resource.Table("alugueqqc_item_visits")
-            
-            cutoff_date = (datetime.datetime.now() - datetime.timedelta(days=30)).isoformat()
-            
-            # Scan with filter — capped at 50 000 items to avoid full-table reads
-            response = visits_table.scan(
-                FilterExpression=Attr("timestamp").gte(cutoff_date),
-                ProjectionExpression="item_id",
-                Limit=50000
-            )
-            items = response.get("Items", [])
-
-            pages = 1
-            while "LastEvaluatedKey" in response and pages < 5:
-                response = visits_table.scan(
-                    FilterExpression=Attr("timestamp").gte(cutoff_date),
-                    ProjectionExpression="item_id",
-                    Limit=50000,
-                    ExclusiveStartKey=response["LastEvaluatedKey"]
-                )
-                items.extend(response.get("Items", []))
-                pages += 1
-                
-            # Count
+            # Soma dos baldes diários (30 registros por conta pública), exata e sem scan
             counts = {}
-            for i in items:
-                iid = i.get("item_id")
-                if iid:
-                    counts[iid] = counts.get(iid, 0) + 1
-                    
+            for acc in public_account_ids:
+                for iid, n in visit_buckets.recent_counts(visits_table, acc).items():
+                    counts[iid] = counts.get(iid, 0) + n
+
             _recent_visits_cache["data"] = counts
             _recent_visits_cache["last_updated"] = now
             return counts
@@ -717,19 +595,31 @@ def init_static_routes(
             requested_item_id = request.args.get("item", "", type=str)
             per_page = 48
             
-            # Fetch all available items (same as index) but filtered by account
-            response = itens_table.scan(
-                FilterExpression=Attr("status").eq("available") & Attr("account_id").is_in(public_account_ids)
-            )
-            all_items = response.get("Items", [])
-            
-            while "LastEvaluatedKey" in response:
-                response = itens_table.scan(
-                    FilterExpression=Attr("status").eq("available") & Attr("account_id").is_in(public_account_ids),
-                    ExclusiveStartKey=response["LastEvaluatedKey"]
+            # Índice do snapshot por conta pública (sem scan na tabela de itens)
+            recent_map = _get_recent_visits_map()
+            indexes = []
+            for acc in public_account_ids:
+                index = catalog_snapshot.load_index(catalog_snapshot_table, acc, recent_map)
+                if index:
+                    indexes.append((acc, index))
+
+            entries_by_id = {}
+            ordered_lists = []
+            for acc, index in indexes:
+                entries = index.get("entries") or {}
+                for iid, entry in entries.items():
+                    entries_by_id[iid] = (acc, entry)
+                ordered_lists.append([iid for iid in index.get("order") or [] if iid in entries])
+
+            # Cada lista já está ordenada por visitas; só intercala entre contas
+            all_ids = list(
+                heapq.merge(
+                    *ordered_lists,
+                    key=lambda iid: catalog_snapshot.ranking_key(iid, entries_by_id[iid][1]),
+                    reverse=True,
                 )
-                all_items.extend(response.get("Items", []))
-            
+            )
+
             occasion_tabs = [
                 {"slug": "noiva", "label": "Noiva"},
                 {"slug": "civil", "label": "Civil"},
@@ -762,26 +652,15 @@ def init_static_routes(
     
             active_occasion_description = occasion_descriptions.get(active_occasion, "")
     
-            filtered_items = []
-            for item in all_items:
-                occ = item.get("_occasions") if isinstance(item, dict) else None
-                if not isinstance(occ, list):
-                    occ = _get_item_occasions(item)
-    
-                if any(_slugify(o) == active_occasion for o in occ):
-                    filtered_items.append(item)
+            filtered_ids = [
+                iid for iid in all_ids if active_occasion in (entries_by_id[iid][1].get("o") or [])
+            ]
     
             commercial_color_counts = {}
             commercial_color_display_by_norm = {}
-            for item in filtered_items:
-                if not isinstance(item, dict):
-                    continue
-                raw_color = item.get("cor_comercial") or item.get("corCommercial")
-                colors = raw_color if isinstance(raw_color, list) else [raw_color]
-                for c in colors:
-                    if not isinstance(c, str) or not c.strip():
-                        continue
-                    display = c.strip()
+            for iid in filtered_ids:
+                for c in entries_by_id[iid][1].get("c") or []:
+                    display = str(c).strip()
                     norm = _normalize_text(display)
                     if not norm:
                         continue
@@ -798,18 +677,8 @@ def init_static_routes(
     
             size_counts = {}
             size_display_by_norm = {}
-            for item in filtered_items:
-                if not isinstance(item, dict):
-                    continue
-                raw_size = item.get("tamanho") or item.get("size")
-                sizes = raw_size if isinstance(raw_size, list) else [raw_size]
-                expanded = []
-                for s in sizes:
-                    if not isinstance(s, str):
-                        continue
-                    parts = [p.strip() for p in s.split(",")]
-                    expanded.extend([p for p in parts if p])
-                for s in expanded:
+            for iid in filtered_ids:
+                for s in entries_by_id[iid][1].get("s") or []:
                     norm = str(s).strip().casefold()
                     if not norm:
                         continue
@@ -824,141 +693,51 @@ def init_static_routes(
                 )
             ]
     
-            itens = filtered_items
+            item_ids = filtered_ids
             if active_cor_comercial:
                 target_norm = _normalize_text(active_cor_comercial)
                 if target_norm:
-                    color_filtered = []
-                    for item in itens:
-                        if not isinstance(item, dict):
-                            continue
-                        raw_color = item.get("cor_comercial") or item.get("corCommercial")
-                        colors = raw_color if isinstance(raw_color, list) else [raw_color]
-                        if any(
-                            isinstance(c, str) and _normalize_text(c) == target_norm
-                            for c in colors
-                            if c is not None
-                        ):
-                            color_filtered.append(item)
-                    itens = color_filtered
+                    item_ids = [
+                        iid
+                        for iid in item_ids
+                        if any(_normalize_text(c) == target_norm for c in entries_by_id[iid][1].get("c") or [])
+                    ]
     
             if active_tamanho:
                 target_size_norm = active_tamanho.strip().casefold()
                 if target_size_norm:
-                    size_filtered = []
-                    for item in itens:
-                        if not isinstance(item, dict):
-                            continue
-                        raw_size = item.get("tamanho") or item.get("size")
-                        sizes = raw_size if isinstance(raw_size, list) else [raw_size]
-                        expanded = []
-                        for s in sizes:
-                            if not isinstance(s, str):
-                                continue
-                            parts = [p.strip() for p in s.split(",")]
-                            expanded.extend([p for p in parts if p])
-                        item_norms = {str(s).strip().casefold() for s in expanded if str(s).strip()}
-                        if target_size_norm in item_norms:
-                            size_filtered.append(item)
-                    itens = size_filtered
-    
-            for item in itens:
-                if isinstance(item, dict):
-                    occ = item.get("_occasions") or []
-                    item["category"] = occ[0] if occ else "Outros"
-    
-            # Carregar mapa de visitas recentes
-            recent_map = _get_recent_visits_map()
-            for item in itens:
-                if isinstance(item, dict):
-                    iid = item.get("item_id")
-                    item["recent_visits"] = recent_map.get(iid, 0)
-    
-            def to_int(value):
-                try:
-                    return int(value or 0)
-                except (ValueError, TypeError):
-                    return 0
-
-            recent_first = []
-            total_second = []
-            remaining_last = []
-
-            for item in itens:
-                rv = to_int(item.get("recent_visits")) if isinstance(item, dict) else 0
-                vc = to_int(item.get("visit_count")) if isinstance(item, dict) else 0
-                if rv > 0:
-                    recent_first.append(item)
-                elif vc > 0:
-                    total_second.append(item)
-                else:
-                    remaining_last.append(item)
-
-            recent_first.sort(
-                key=lambda item: (
-                    to_int(item.get("recent_visits")) if isinstance(item, dict) else 0,
-                    to_int(item.get("visit_count")) if isinstance(item, dict) else 0,
-                    item.get("item_id", "") if isinstance(item, dict) else "",
-                ),
-                reverse=True,
-            )
-            total_second.sort(
-                key=lambda item: (
-                    to_int(item.get("visit_count")) if isinstance(item, dict) else 0,
-                    item.get("item_id", "") if isinstance(item, dict) else "",
-                ),
-                reverse=True,
-            )
-            remaining_last.sort(
-                key=lambda item: item.get("item_id", "") if isinstance(item, dict) else "",
-                reverse=True,
-            )
+                    item_ids = [
+                        iid
+                        for iid in item_ids
+                        if target_size_norm
+                        in {str(s).strip().casefold() for s in entries_by_id[iid][1].get("s") or []}
+                    ]
 
-            itens = recent_first + total_second + remaining_last
-            
             fields_config = schemas.get_schema_fields("item")
     
-            # Paginação em memória
-            total_items = len(itens)
+            # Paginação sobre o índice; só os itens da página são lidos
+            total_items = len(item_ids)
             total_pages = max((total_items + per_page - 1) // per_page, 1)
             if page > total_pages:
                 page = total_pages
             
             start = (page - 1) * per_page
             end = start + per_page
-            current_itens = itens[start:end]
-    
-            if requested_item_id:
-                found_in_page = any(
-                    isinstance(item, dict) and str(item.get("item_id")) == str(requested_item_id)
-                    for item in current_itens
-                )
-                if not found_in_page:
-                    target_item = next(
-                        (
-                            item
-                            for item in itens
-                            if isinstance(item, dict) and str(item.get("item_id")) == str(requested_item_id)
-                        ),
-                        None,
-                    )
-                    if not target_item:
-                        target_item = next(
-                            (
-                                item
-                                for item in all_items
-                                if isinstance(item, dict) and str(item.get("item_id")) == str(requested_item_id)
-                            ),
-                            None,
-                        )
-                    if target_item:
-                        current_itens = [target_item] + [
-                            item
-                            for item in current_itens
-                            if not (isinstance(item, dict) and str(item.get("item_id")) == str(requested_item_id))
-                        ]
-                        if len(current_itens) > per_page:
-                            current_itens = current_itens[:per_page]
+            page_ids = item_ids[start:end]
+
+            # Item fixado via ?item=: entra no topo da página se não estiver nela
+            if requested_item_id and requested_item_id not in page_ids and requested_item_id in entries_by_id:
+                page_ids = [requested_item_id] + page_ids
+                if len(page_ids) > per_page:
+                    page_ids = page_ids[:per_page]
+
+            current_itens = catalog_snapshot.get_page_rows(
+                catalog_snapshot_table,
+                [(entries_by_id[iid][0], iid) for iid in page_ids],
+            )
+            for item in current_itens:
+                entry = entries_by_id.get(item.get("item_id"), (None, {}))[1]
+                item["recent_visits"] = entry.get("r", 0)
             
             return render_template(
                 "catalogo.html", 
@@ -1065,18 +844,14 @@ def init_static_routes(
     @app.route("/item_reserved_ranges/<item_id>")
     def item_reserved_ranges(item_id):
         try:
-            response = transactions_table.query(
-                IndexName="item_id-index",
-                KeyConditionExpression=Key("item_id").eq(item_id),
+            item = itens_table.get_item(
+                Key={"item_id": item_id}, ProjectionExpression="account_id"
+            ).get("Item") or {}
+            account_id = item.get("account_id") or session.get("account_id")
+            reserved_ranges = availability_index.item_ranges(
+                availability_index.load(users_table, account_id, transactions_table),
+                item_id,
             )
-            items = response.get("Items", [])
-            reserved_ranges = [
-                [tx["rental_date"], tx["return_date"]]
-                for tx in items
-                if tx.get("transaction_status") in ["reserved", "rented"]
-                and tx.get("rental_date")
-                and tx.get("return_date")
-            ]
 
             return jsonify(reserved_ranges)
         except Exception as e:
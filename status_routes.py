@@ -11,10 +11,15 @@ from flask import (
 from decimal import Decimal
 from utils import get_user_timezone
 
-from utils import copy_image_in_s3
+import catalog_snapshot
+import account_counters
+import item_facets
+import availability_index
 
 
-def init_status_routes(app, itens_table, transactions_table, users_table):
+def init_status_routes(
+    app, itens_table, transactions_table, users_table, catalog_snapshot_table=None
+):
 
     @app.route("/mark_returned/<transaction_id>", methods=["GET", "POST"])
     def mark_returned(transaction_id):
@@ -27,7 +32,7 @@ def init_status_routes(app, itens_table, transactions_table, users_table):
         dev_date = datetime.datetime.now(user_utc).strftime("%Y-%m-%d %H:%M:%S")
 
         # Atualiza status para 'returned', adiciona a data de devolução e marca como retirado=True
-        transactions_table.update_item(
+        old = transactions_table.update_item(
             Key={"transaction_id": transaction_id},
             UpdateExpression="SET #transaction_status = :s, dev_date = :d",
             ExpressionAttributeNames={
@@ -37,6 +42,16 @@ def init_status_routes(app, itens_table, transactions_table, users_table):
                 ":s": "returned",
                 ":d": dev_date,  # já definido anteriormente
             },
+            ReturnValues="ALL_OLD",
+        ).get("Attributes") or {}
+        account_counters.transaction_status_changed(
+            users_table,
+            old.get("account_id") or session.get("account_id"),
+            old.get("transaction_status"),
+            "returned",
+        )
+        availability_index.sync_transaction(
+            users_table, {**old, "transaction_status": "returned"}, account_id=session.get("account_id")
         )
 
         flash(
@@ -95,6 +110,15 @@ def init_status_routes(app, itens_table, transactions_table, users_table):
             ExpressionAttributeNames=expression_names,
             ExpressionAttributeValues=expression_values,
         )
+        account_counters.transaction_status_changed(
+            users_table,
+            transaction.get("account_id") or session.get("account_id"),
+            transaction.get("transaction_status"),
+            "rented",
+        )
+        availability_index.sync_transaction(
+            users_table, {**transaction, "transaction_status": "rented"}, account_id=session.get("account_id")
+        )
 
         flash("Item <a href='/rented'>retirado</a> com sucesso.", "success")
         return redirect(next_page)
@@ -108,11 +132,23 @@ def init_status_routes(app, itens_table, transactions_table, users_table):
 
         try:
             # Atualiza apenas o campo "status"
-            itens_table.update_item(
+            old = itens_table.update_item(
                 Key={"item_id": item_id},
                 UpdateExpression="SET #st = :val",
                 ExpressionAttributeNames={"#st": "status"},
                 ExpressionAttributeValues={":val": "archive"},
+                ReturnValues="ALL_OLD",
+            ).get("Attributes") or {}
+            account_counters.item_status_changed(
+                users_table,
+                old.get("account_id") or session.get("account_id"),
+                old.get("status"),
+                "archive",
+            )
+            if old:
+                item_facets.item_changed(users_table, None, old, {**old, "status": "archive"})
+            catalog_snapshot.sync_item_by_id(
+                catalog_snapshot_table, itens_table, item_id, account_id=session.get("account_id")
             )
             flash("Item arquivado com sucesso!", "success")
         except Exception as e:
@@ -145,6 +181,12 @@ def init_status_routes(app, itens_table, transactions_table, users_table):
             },  # 🔹 Evita palavra reservada
             ExpressionAttributeValues={":s": "available"},
         )
+        account_counters.item_status_changed(
+            users_table, item.get("account_id"), item.get("status"), "available"
+        )
+        item_facets.item_changed(users_table, None, item, {**item, "status": "available"})
+        item["status"] = "available"
+        catalog_snapshot.sync_item(catalog_snapshot_table, item)
 
         flash(
             "Item agora está <a href='/inventory'>disponível</a> no seu inventário.",
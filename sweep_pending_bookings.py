@@ -0,0 +1,111 @@
+"""
+Apaga em lote os pedidos de agendamento pendentes vencidos (pending_bookings.py):
+
+  - partição própria ("pending_booking:<account_id>") com ttl já vencido;
+  - formato antigo ("pending_booking#<fitting_id>" na partição de configuração da
+    conta) criados há mais de PENDING_BOOKING_TTL_HOURS.
+
+Com --enable-ttl também liga o TTL da tabela no atributo "ttl", para o DynamoDB
+apagar sozinho os próximos pedidos abandonados.
+
+    python sweep_pending_bookings.py [--dry-run] [--enable-ttl]
+"""
+
+import argparse
+import datetime
+import os
+import time
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+from dotenv import load_dotenv
+
+import pending_bookings
+
+load_dotenv()
+
+TABLE_NAME = os.getenv("SCHEDULING_CONFIG_TABLE", "").strip() or "alugueqqc_scheduling_config_table"
+
+
+def _aws_kwargs():
+    return {
+        "region_name": os.getenv("AWS_REGION", "us-east-1"),
+        "aws_access_key_id": os.getenv("AWS_ACCESS_KEY_ID"),
+        "aws_secret_access_key": os.getenv("AWS_SECRET_ACCESS_KEY"),
+    }
+
+
+def _created_epoch(value):
+    """Epoch de created_at (ISO com fuso ou "YYYY-MM-DD HH:MM:SS" em UTC), ou None."""
+    try:
+        dt = datetime.datetime.fromisoformat(str(value).strip())
+    except Exception:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+
+def _is_expired(item, now):
+    if str(item.get("account_id") or "").startswith(pending_bookings.PARTITION_PREFIX):
+        return pending_bookings.is_expired(item, now)
+    created = _created_epoch(item.get("created_at"))
+    return created is not None and created + pending_bookings.PENDING_TTL <= now
+
+
+def sweep(dry_run=False):
+    table = boto3.resource("dynamodb", **_aws_kwargs()).Table(TABLE_NAME)
+    scan_kwargs = {
+        "FilterExpression": Attr("account_id").begins_with(pending_bookings.PARTITION_PREFIX)
+        | Attr("config_key").begins_with(pending_bookings.LEGACY_PREFIX),
+        "ProjectionExpression": "account_id, config_key, created_at, #ttl",
+        "ExpressionAttributeNames": {"#ttl": "ttl"},
+    }
+    now = time.time()
+    found = 0
+    expired = []
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get("Items", []):
+            found += 1
+            if _is_expired(item, now):
+                expired.append({"account_id": item["account_id"], "config_key": item["config_key"]})
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            break
+        scan_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+    print(f"{found} pedidos pendentes, {len(expired)} vencidos.")
+    if dry_run or not expired:
+        return
+    # batch_writer agrupa em lotes de 25 e reenvia os não processados
+    with table.batch_writer() as batch:
+        for key in expired:
+            batch.delete_item(Key=key)
+    print(f"[OK] {len(expired)} pedidos vencidos apagados.")
+
+
+def enable_ttl(dry_run=False):
+    client = boto3.client("dynamodb", **_aws_kwargs())
+    desc = client.describe_time_to_live(TableName=TABLE_NAME).get("TimeToLiveDescription", {})
+    if desc.get("TimeToLiveStatus") in ("ENABLED", "ENABLING"):
+        print(f"[SKIP] TTL já ativo em {TABLE_NAME} ({desc.get('AttributeName')}).")
+        return
+    if dry_run:
+        print(f"[PLAN] Ativaria TTL no atributo ttl de {TABLE_NAME}.")
+        return
+    client.update_time_to_live(
+        TableName=TABLE_NAME,
+        TimeToLiveSpecification={"Enabled": True, "AttributeName": "ttl"},
+    )
+    print(f"[OK] TTL ativado no atributo ttl de {TABLE_NAME}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Só mostra o que seria feito")
+    parser.add_argument("--enable-ttl", action="store_true", help="Liga o TTL da tabela no atributo ttl")
+    args = parser.parse_args()
+    if args.enable_ttl:
+        enable_ttl(dry_run=args.dry_run)
+    sweep(dry_run=args.dry_run)
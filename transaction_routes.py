@@ -10,6 +10,8 @@ from flask import (
 import datetime
 
 from utils import get_user_timezone
+import account_counters
+import availability_index
 
 
 def init_transaction_routes(
@@ -61,6 +63,15 @@ def init_transaction_routes(
                     ":deleted_by": deleted_by,
                 },
             )
+            account_counters.transaction_status_changed(
+                users_table,
+                transaction.get("account_id") or session.get("account_id"),
+                current_status,
+                "deleted",
+            )
+            availability_index.sync_transaction(
+                users_table, {**transaction, "transaction_status": "deleted"}, account_id=session.get("account_id")
+            )
 
             flash(
                 "Transação deletada!",
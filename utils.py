@@ -2,28 +2,34 @@ import os
 import uuid
 import datetime
 import io
-from PIL import Image
+import re
+import functools
 from flask import Flask, request, session
 
-import boto3
+import aws_clients
+import image_renditions
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from werkzeug.utils import secure_filename
 from urllib.parse import urlparse
 
-# AWS configuration
-aws_region = "us-east-1"
-aws_access_key_id = os.getenv("AWS_ACCESS_KEY_ID")
-aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
+# AWS configuration (clientes compartilhados em aws_clients.py)
 s3_bucket_name = "alugueqqc-images"
 cloudfront_domain = os.getenv("CLOUDFRONT_DOMAIN")
 
-s3 = boto3.client(
-    "s3",
-    region_name=aws_region,
-    aws_access_key_id=aws_access_key_id,
-    aws_secret_access_key=aws_secret_access_key,
+s3 = aws_clients.client("s3")
+
+# Arquivos acima de 8 MB sobem em partes paralelas (multipart). Fotos otimizadas
+# raramente chegam lá; o paralelismo entre fotos fica em image_uploads.py.
+s3_transfer_config = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=int(os.getenv("IMAGE_UPLOAD_PART_CONCURRENCY", "4")),
 )
 
+# Metadado dos objetos já otimizados (scripts/batch_optimize_s3.py pula esses)
+S3_OPTIMIZED_METADATA = {"optimized": "1"}
+
 
 # Email functions
 def send_password_reset_email(email, username, reset_link):
@@ -181,39 +187,26 @@ def send_admin_notification_email(admin_email, new_user_email, new_user_username
 def optimize_image(image_file, max_width=1920, quality=85):
     """
     Redimensiona e comprime a imagem para otimização web.
-    Retorna um objeto BytesIO com a imagem otimizada em formato JPEG.
+    Retorna um objeto BytesIO com a imagem otimizada em JPEG progressivo, ou
+    None se a imagem passar do limite de pixels (image_renditions.MAX_PIXELS).
+
+    A decodificação é limitada ao tamanho final (image_renditions.open_bounded),
+    então uma foto de celular de 24 MP não ocupa a memória inteira do worker.
     """
     try:
-        # Abre a imagem usando Pillow
         # Se image_file for um FileStorage (Flask), ele se comporta como arquivo
-        image_file.seek(0)
-        img = Image.open(image_file)
-        
-        # Trata transparência (PNG/WEBP) convertendo para fundo branco antes de virar JPEG
-        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[-1])
-            img = background
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-            
-        # Redimensiona se necessário (limita maior dimensão)
-        width, height = img.size
-        
-        # Se alguma dimensão for maior que o máximo permitido
-        if width > max_width or height > max_width:
-            # Usa thumbnail para redimensionar proporcionalmente
-            # max_width é usado como limite para ambas dimensões (bounding box)
-            img.thumbnail((max_width, max_width), Image.Resampling.LANCZOS)
-            
+        # max_width é usado como limite para ambas dimensões (bounding box)
+        img = image_renditions.open_bounded(image_file, max_width)
+
         # Salva em um buffer de memória
         output = io.BytesIO()
-        img.save(output, format='JPEG', quality=quality, optimize=True)
+        img.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
         output.seek(0)
-        
+
         return output
+    except image_renditions.ImageTooLarge as e:
+        print(f"Imagem recusada: {e}")
+        return None
     except Exception as e:
         print(f"Erro ao otimizar imagem: {e}")
         # Se der erro, retorna o arquivo original (resetando o ponteiro)
@@ -226,7 +219,9 @@ def upload_image_to_s3(image_file, prefix="images"):
     if image_file:
         # Otimiza a imagem antes do upload
         optimized_file = optimize_image(image_file)
-        
+        if optimized_file is None:
+            return ""
+
         # Define o nome do arquivo
         # Se a otimização funcionou, o formato será JPEG
         original_filename = secure_filename(image_file.filename)
@@ -242,18 +237,34 @@ def upload_image_to_s3(image_file, prefix="images"):
         s3_key = f"{prefix}/{item_id}_{filename}"
         
         extra_args = {'ContentType': content_type} if content_type else {}
+        if not hasattr(optimized_file, 'filename'):
+            extra_args['Metadata'] = S3_OPTIMIZED_METADATA
         
-        s3.upload_fileobj(optimized_file, s3_bucket_name, s3_key, ExtraArgs=extra_args)
+        s3.upload_fileobj(optimized_file, s3_bucket_name, s3_key, ExtraArgs=extra_args, Config=s3_transfer_config)
         image_url = f"https://{s3_bucket_name}.s3.amazonaws.com/{s3_key}"
         return image_url
     return ""
 
 
+def put_image_rendition(base_key, rendition):
+    """Sobe uma versão gerada por image_renditions.render (ver image_uploads)."""
+    s3.upload_fileobj(
+        # Cópia: upload_fileobj fecha o arquivo, e a versão pode ser reenviada
+        io.BytesIO(rendition["data"].getvalue()),
+        s3_bucket_name,
+        image_renditions.rendition_key(base_key, rendition["name"], rendition["format"]),
+        ExtraArgs={
+            "ContentType": rendition["content_type"],
+            # A chave é o hash do conteúdo: nunca muda de bytes, pode ficar em cache para sempre
+            "CacheControl": "public, max-age=31536000, immutable",
+            "Metadata": S3_OPTIMIZED_METADATA,
+        },
+        Config=s3_transfer_config,
+    )
+
+
 def copy_image_in_s3(original_url):
     """Creates a copy of an image in S3 and returns the new URL."""
-    # Inicializa o cliente S3
-    s3 = boto3.client("s3")
-
     # Analisa a URL
     parsed_url = urlparse(original_url)
     if not parsed_url.netloc or not parsed_url.path:
@@ -281,13 +292,27 @@ def copy_image_in_s3(original_url):
     return f"https://{bucket_name}.s3.amazonaws.com/{new_key}"
 
 
-def get_cloudfront_url(url):
+def s3_key_url(key):
+    return f"https://{s3_bucket_name}.s3.amazonaws.com/{key}"
+
+
+def get_cloudfront_url(url, rendition=None, renditions=None, fmt="jpeg"):
     """
     Transforma uma URL do S3 em URL do CloudFront se configurado.
     Ex: https://bucket.s3.amazonaws.com/key -> https://domain.cloudfront.net/key
+
+    Com rendition ("thumb", "card", "full") e o item_image_renditions do item,
+    devolve a versão daquele tamanho (ver image_renditions); sem registro para a
+    foto, devolve a própria foto.
+        {{ item.item_image_url | cloudfront_url('card', item.item_image_renditions) }}
     """
     if not url or not isinstance(url, str):
         return url
+
+    if rendition and isinstance(renditions, dict):
+        entry = image_renditions.pick(renditions.get(url), rendition)
+        if entry and entry.get(fmt):
+            url = s3_key_url(entry[fmt])
     
     cf_domain = os.getenv("CLOUDFRONT_DOMAIN")
     if not cf_domain:
@@ -302,6 +327,34 @@ def get_cloudfront_url(url):
     return url
 
 
+def image_srcset(url, renditions, fmt="jpeg"):
+    """
+    Valor de srcset ("<url> 320w, <url> 800w, ...") com as versões da foto no
+    formato pedido. Vazio se a foto não tem versões (imagens antigas).
+        <img src="..." srcset="{{ url | image_srcset(item.item_image_renditions) }}" sizes="...">
+    """
+    if not url or not isinstance(renditions, dict):
+        return ""
+    record = renditions.get(url)
+    if not isinstance(record, dict):
+        return ""
+    parts = []
+    seen_widths = set()
+    for name, _ in reversed(image_renditions.RENDITIONS):
+        entry = record.get(name)
+        if not isinstance(entry, dict) or not entry.get(fmt):
+            continue
+        try:
+            width = int(entry.get("w"))
+        except Exception:
+            continue
+        if width in seen_widths:
+            continue
+        seen_widths.add(width)
+        parts.append(f"{get_cloudfront_url(s3_key_url(entry[fmt]))} {width}w")
+    return ", ".join(parts)
+
+
 def aplicar_filtro(
     items,
     filtro,
@@ -500,16 +553,7 @@ def get_user_ip():
     return ip
 
 
-_dynamodb_kwargs = {"region_name": aws_region}
-if aws_access_key_id and aws_secret_access_key:
-    _dynamodb_kwargs.update(
-        {
-            "aws_access_key_id": aws_access_key_id,
-            "aws_secret_access_key": aws_secret_access_key,
-        }
-    )
-
-dynamodb = boto3.resource("dynamodb", **_dynamodb_kwargs)
+dynamodb = aws_clients.resource("dynamodb")
 accounts_table = dynamodb.Table("alugueqqc_accounts_table")
 
 
@@ -661,7 +705,6 @@ def entidade_atende_filtros_dinamico(item, filtros, fields_config, image_url_req
                     if selected_norm and not (item_norm & selected_norm):
                         return False
             elif filtro and filtro.lower() not in str(valor).lower():
-                print("false")
                 return False
 
         # NÚMEROS E VALORES
@@ -702,6 +745,353 @@ def entidade_atende_filtros_dinamico(item, filtros, fields_config, image_url_req
     return True
 
 
+_FILTRO_TIPOS_TEXTO = frozenset([
+    "text", "client_name", "client_phone", "client_email", "client_address",
+    "client_cpf", "client_cnpj", "client_notes",
+    "item_custom_id", "item_description", "item_obs",
+])
+_FILTRO_TIPOS_NUMERO = frozenset(["number", "value", "item_value", "transaction_price"])
+_FILTRO_TIPOS_OPCAO = frozenset(["dropdown", "transaction_status"])
+_TOKENS_SEPARADOR = re.compile(r"[/,]|\s+e\s+", flags=re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=8192)
+def _data_ymd(texto):
+    """strptime("%Y-%m-%d") com cache; None se inválida (as datas se repetem muito entre linhas)."""
+    try:
+        return datetime.datetime.strptime(texto, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _data_ymd_valor(valor, como_str=False):
+    if como_str:
+        valor = str(valor)
+    return _data_ymd(valor) if isinstance(valor, str) else None
+
+
+@functools.lru_cache(maxsize=8192)
+def _data_iso(texto):
+    return datetime.datetime.fromisoformat(texto).date()
+
+
+def _tokens_normalizados(value):
+    """Mesmos tokens de entidade_atende_filtros_dinamico, já em casefold, como frozenset."""
+    if value is None:
+        return frozenset()
+    if isinstance(value, (list, tuple, set)):
+        out = set()
+        for v in value:
+            out |= _tokens_normalizados(v)
+        return frozenset(out)
+    return _tokens_texto(str(value))
+
+
+@functools.lru_cache(maxsize=8192)
+def _tokens_texto(text):
+    text = text.strip()
+    if not text:
+        return frozenset()
+    return frozenset(
+        t for t in (str(p).strip().casefold() for p in _TOKENS_SEPARADOR.split(text) if p) if t
+    )
+
+
+def compilar_filtros_dinamicos(filtros, fields_config, image_url_required=None):
+    """
+    Versão compilada de entidade_atende_filtros_dinamico: monta uma vez por
+    requisição um predicado item -> bool com as datas/números dos filtros já
+    convertidos, os conjuntos de tokens já normalizados e só os campos que têm
+    filtro ativo. O resultado é o mesmo da função original para qualquer linha.
+    """
+    from decimal import Decimal, InvalidOperation
+
+    checks = []
+
+    def _sempre_falso(item):
+        return False
+
+    # Imagem
+    if image_url_required is not None:
+        def _check_imagem(item):
+            imagem = str(item.get("item_image_url", "")).strip().lower()
+            return image_url_required == (bool(imagem) and imagem != "n/a")
+        checks.append(_check_imagem)
+
+    # Datas fixas da transação (qualquer erro de conversão reprova a linha)
+    limites_fixos = []
+    for campo, chave, depois_de in (
+        ("rental_date", "start_rental_date", True),
+        ("rental_date", "end_rental_date", False),
+        ("return_date", "start_return_date", True),
+        ("return_date", "end_return_date", False),
+    ):
+        bruto = filtros.get(chave)
+        if bruto:
+            limites_fixos.append((campo, _data_ymd_valor(bruto), depois_de))
+    if limites_fixos:
+        if any(limite is None for _, limite, _ in limites_fixos):
+            return _sempre_falso
+
+        def _check_datas_fixas(item):
+            for campo, limite, depois_de in limites_fixos:
+                data = _data_ymd_valor(item.get(campo, ""))
+                if data is None:
+                    return False
+                if depois_de and data < limite:
+                    return False
+                if not depois_de and data > limite:
+                    return False
+            return True
+        checks.append(_check_datas_fixas)
+
+    # created_at (como na original, só é avaliado quando há data inicial)
+    created_start = filtros.get("start_created_at")
+    created_end = filtros.get("end_created_at")
+    if created_start:
+        inicio = _data_ymd_valor(created_start)
+        fim = _data_ymd_valor(created_end) if created_end else None
+        limites_validos = inicio is not None and (not created_end or fim is not None)
+
+        def _check_created_at(item):
+            created_at_str = item.get("created_at", "")
+            if not created_at_str:
+                return True
+            try:
+                date_val = _data_iso(created_at_str) if isinstance(created_at_str, str) else datetime.datetime.fromisoformat(created_at_str).date()
+            except ValueError:
+                return False
+            if not limites_validos:
+                return False
+            if date_val < inicio:
+                return False
+            if fim is not None and date_val > fim:
+                return False
+            return True
+        checks.append(_check_created_at)
+
+    # Campos dinâmicos: só os que têm filtro preenchido
+    for field in fields_config:
+        field_id = field["id"]
+        field_type = field.get("type")
+
+        if field_type in _FILTRO_TIPOS_TEXTO:
+            filtro = filtros.get(field_id)
+            if not filtro:
+                continue
+
+            if field_id in ("cor", "cor_base", "cor_comercial"):
+                selecionados = _tokens_normalizados(filtro)
+                if not selecionados:
+                    continue
+                if field_id == "cor_base":
+                    fontes = ("cor_base", "color_base")
+                elif field_id == "cor_comercial":
+                    fontes = ("cor_comercial", "color_comercial", "cor", "cores", "color")
+                else:
+                    fontes = ("cor_comercial", "color_comercial", "cor", "cores", "color", "cor_base", "color_base")
+
+                def _check_cor(item, fontes=fontes, selecionados=selecionados):
+                    fonte = None
+                    for f in fontes:
+                        fonte = item.get(f)
+                        if fonte:
+                            break
+                    return not selecionados.isdisjoint(_tokens_normalizados(fonte))
+                checks.append(_check_cor)
+
+            elif field_id == "tamanho":
+                lista = filtro if isinstance(filtro, (list, tuple, set)) else [filtro]
+                selecionados = frozenset(
+                    t for t in (str(v or "").strip().casefold() for v in lista) if t
+                )
+                if not selecionados:
+                    continue
+
+                def _check_tamanho(item, field_id=field_id, selecionados=selecionados):
+                    return not selecionados.isdisjoint(_tokens_normalizados(item.get(field_id, "")))
+                checks.append(_check_tamanho)
+
+            else:
+                agulha = filtro.lower()
+
+                def _check_texto(item, field_id=field_id, agulha=agulha):
+                    return agulha in str(item.get(field_id, "")).lower()
+                checks.append(_check_texto)
+
+        elif field_type in _FILTRO_TIPOS_NUMERO:
+            min_val = filtros.get(f"min_{field_id}")
+            max_val = filtros.get(f"max_{field_id}")
+            if not min_val and not max_val:
+                continue
+            try:
+                minimo = Decimal(min_val) if min_val else None
+                maximo = Decimal(max_val) if max_val else None
+            except (InvalidOperation, ValueError, TypeError):
+                return _sempre_falso
+
+            def _check_numero(item, field_id=field_id, minimo=minimo, maximo=maximo):
+                try:
+                    valor = Decimal(str(item.get(field_id, "")))
+                    if minimo is not None and valor < minimo:
+                        return False
+                    if maximo is not None and valor > maximo:
+                        return False
+                except (InvalidOperation, ValueError, TypeError):
+                    return False
+                return True
+            checks.append(_check_numero)
+
+        elif field_type in _FILTRO_TIPOS_OPCAO:
+            selected = filtros.get(field_id)
+            if not selected:
+                continue
+
+            def _check_opcao(item, field_id=field_id, selected=selected):
+                return selected == item.get(field_id, "")
+            checks.append(_check_opcao)
+
+        elif field_type == "date":
+            start_date = filtros.get(f"start_{field_id}")
+            end_date = filtros.get(f"end_{field_id}")
+            if not start_date and not end_date:
+                continue
+            inicio = _data_ymd_valor(start_date) if start_date else None
+            fim = _data_ymd_valor(end_date) if end_date else None
+            if (start_date and inicio is None) or (end_date and fim is None):
+                return _sempre_falso
+
+            def _check_data(item, field_id=field_id, inicio=inicio, fim=fim):
+                data = _data_ymd_valor(item.get(field_id, ""), como_str=True)
+                if data is None:
+                    return False
+                if inicio is not None and data < inicio:
+                    return False
+                if fim is not None and data > fim:
+                    return False
+                return True
+            checks.append(_check_data)
+
+    if not checks:
+        return lambda item: True
+    if len(checks) == 1:
+        return checks[0]
+
+    def _predicado(item):
+        for check in checks:
+            if not check(item):
+                return False
+        return True
+    return _predicado
+
+
+def traduzir_filtros_dynamo(filtros, fields_config, created_at_na_chave=False):
+    """
+    Traduz o que dá para expressar no DynamoDB a partir dos filtros dinâmicos:
+        - opções (dropdown/transaction_status): igualdade exata
+        - datas (campos "date" e rental/return_date): faixa em string ISO
+        - números: faixa numérica OU atributo gravado como string (superconjunto;
+          o Python confere de novo, porque Decimal(str(valor)) aceita "1500")
+        - created_at: faixa para KeyCondition `between` (se created_at_na_chave)
+    Textos, cores, tamanhos e imagem ficam no Python: o filtro de texto não
+    diferencia maiúsculas e o contains do DynamoDB diferencia.
+
+    Devolve {"filter": condição ou None, "created_range": (início, fim) ou None,
+             "residual": filtros que o Python ainda precisa avaliar}.
+    """
+    from decimal import Decimal, InvalidOperation
+    from boto3.dynamodb.conditions import Attr
+
+    residual = dict(filtros)
+    condicoes = []
+
+    def _faixa_data(campo, chave_inicio, chave_fim):
+        inicio = filtros.get(chave_inicio)
+        fim = filtros.get(chave_fim)
+        if not inicio and not fim:
+            return
+        # Limite inválido: deixa para o Python (que reprova tudo, como antes)
+        if (inicio and _data_ymd_valor(inicio) is None) or (fim and _data_ymd_valor(fim) is None):
+            return
+        if inicio and fim:
+            condicoes.append(Attr(campo).between(_data_ymd_valor(inicio).isoformat(), _data_ymd_valor(fim).isoformat()))
+        elif inicio:
+            condicoes.append(Attr(campo).gte(_data_ymd_valor(inicio).isoformat()))
+        else:
+            condicoes.append(Attr(campo).lte(_data_ymd_valor(fim).isoformat()))
+        residual.pop(chave_inicio, None)
+        residual.pop(chave_fim, None)
+
+    _faixa_data("rental_date", "start_rental_date", "end_rental_date")
+    _faixa_data("return_date", "start_return_date", "end_return_date")
+
+    created_range = None
+    created_start = filtros.get("start_created_at")
+    created_end = filtros.get("end_created_at")
+    if created_at_na_chave and created_start and _data_ymd_valor(created_start) is not None:
+        if not created_end or _data_ymd_valor(created_end) is not None:
+            inicio = _data_ymd_valor(created_start).isoformat()
+            fim = f"{_data_ymd_valor(created_end).isoformat()} 23:59:59" if created_end else "9999-12-31 23:59:59"
+            created_range = (inicio, fim)
+            residual.pop("start_created_at", None)
+            residual.pop("end_created_at", None)
+
+    ja_vistos = set()
+    for field in fields_config:
+        field_id = field["id"]
+        field_type = field.get("type")
+        if field_id in ja_vistos:
+            continue
+        ja_vistos.add(field_id)
+
+        if field_type in _FILTRO_TIPOS_OPCAO:
+            selected = filtros.get(field_id)
+            if selected and isinstance(selected, str):
+                condicoes.append(Attr(field_id).eq(selected))
+                residual.pop(field_id, None)
+
+        elif field_type == "date":
+            _faixa_data(field_id, f"start_{field_id}", f"end_{field_id}")
+
+        elif field_type in _FILTRO_TIPOS_NUMERO:
+            min_val = filtros.get(f"min_{field_id}")
+            max_val = filtros.get(f"max_{field_id}")
+            if not min_val and not max_val:
+                continue
+            try:
+                minimo = Decimal(min_val) if min_val else None
+                maximo = Decimal(max_val) if max_val else None
+            except (InvalidOperation, ValueError, TypeError):
+                continue
+            if minimo is not None and maximo is not None:
+                faixa = Attr(field_id).between(minimo, maximo)
+            elif minimo is not None:
+                faixa = Attr(field_id).gte(minimo)
+            else:
+                faixa = Attr(field_id).lte(maximo)
+            condicoes.append(faixa | Attr(field_id).attribute_type("S"))
+
+    filtro = None
+    for condicao in condicoes:
+        filtro = condicao if filtro is None else filtro & condicao
+
+    return {"filter": filtro, "created_range": created_range, "residual": residual}
+
+
+def tamanho_lote_adaptativo(avaliados, aprovados, faltando, minimo=10, maximo=500):
+    """
+    Próximo Limit de uma listagem paginada, pela seletividade observada até aqui:
+    quantas linhas avaliar para achar as `faltando` que ainda completam a página.
+    Sem nenhuma aprovada ainda, cresce em progressão geométrica.
+    """
+    if faltando <= 0:
+        return minimo
+    if aprovados <= 0:
+        return max(minimo, min(maximo, max(avaliados, minimo) * 2))
+    estimado = int(faltando * avaliados / aprovados * 1.25) + 1
+    return max(minimo, min(maximo, estimado))
+
+
 def converter_intervalo_data_br_para_iso(filtros, chave, destino_inicio, destino_fim):
     """Converte filtros do tipo 'dd/mm/yyyy - dd/mm/yyyy' para 'yyyy-mm-dd'"""
     intervalo = filtros.get(chave)
@@ -0,0 +1,132 @@
+"""
+visit_buckets.py
+Agregado diário de visitas por conta, para que "últimos 30 dias" seja uma soma
+de 30 registros pequenos (exata em qualquer volume), sem scan na tabela de visitas.
+
+Os baldes ficam na própria tabela alugueqqc_item_visits, numa partição por conta:
+    item_id   = "daily#<account_id>"
+    timestamp = "YYYY-MM-DD"
+    "v|<item_id>" → visitas contadas do item naquele dia (ADD atômico)
+    ttl           → expira alguns dias depois da janela
+
+O visit_recorder soma as visitas de cada descarga com record_visits.
+"""
+
+import datetime
+import time
+
+from boto3.dynamodb.conditions import Key
+
+
+VISITS_TABLE_NAME = "alugueqqc_item_visits"
+WINDOW_DAYS = 30
+_BUCKET_TTL_DAYS = WINDOW_DAYS + 5
+# Itens por update_item em record_visits
+_ATTRS_PER_UPDATE = 50
+
+
+def bucket_partition(account_id):
+    return f"daily#{account_id}"
+
+
+def _day(value=None):
+    value = value or datetime.datetime.now()
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return value.isoformat()
+
+
+def bucket_ttl(day):
+    """Epoch de expiração do balde de `day` ("YYYY-MM-DD")."""
+    expires = datetime.datetime.fromisoformat(str(day)[:10]) + datetime.timedelta(days=_BUCKET_TTL_DAYS)
+    return int(time.mktime(expires.timetuple()))
+
+
+def record_visit(visits_table, account_id, item_id, when=None, amount=1):
+    """Soma `amount` visitas do item no balde do dia (um update_item)."""
+    if item_id:
+        record_visits(visits_table, account_id, {item_id: amount}, when=when)
+
+
+def record_visits(visits_table, account_id, item_counts, when=None):
+    """
+    Soma {item_id: visitas} no balde do dia da conta. Os itens vão em lotes de
+    _ATTRS_PER_UPDATE por update_item (a expressão do DynamoDB tem limite de 4 KB).
+    """
+    item_counts = {k: int(v) for k, v in (item_counts or {}).items() if k and int(v or 0)}
+    if not account_id or not item_counts:
+        return
+    day = _day(when)
+    items = list(item_counts.items())
+    for start in range(0, len(items), _ATTRS_PER_UPDATE):
+        names = {"#ttl": "ttl"}
+        values = {":ttl": bucket_ttl(day)}
+        parts = []
+        for i, (item_id, n) in enumerate(items[start:start + _ATTRS_PER_UPDATE]):
+            names[f"#v{i}"] = f"v|{item_id}"
+            values[f":v{i}"] = n
+            parts.append(f"#v{i} :v{i}")
+        try:
+            visits_table.update_item(
+                Key={"item_id": bucket_partition(account_id), "timestamp": day},
+                UpdateExpression="ADD " + ", ".join(parts) + " SET #ttl = if_not_exists(#ttl, :ttl)",
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+            )
+        except Exception as e:
+            print(f"Erro ao registrar visitas no balde diário da conta {account_id}: {e}")
+
+
+def recent_counts(visits_table, account_id, days=WINDOW_DAYS, today=None):
+    """{item_id: visitas} somando os baldes dos últimos `days` dias (inclui hoje)."""
+    counts = {}
+    if not account_id:
+        return counts
+    today = datetime.date.fromisoformat(_day(today))
+    query_kwargs = {
+        "KeyConditionExpression": Key("item_id").eq(bucket_partition(account_id))
+        & Key("timestamp").between(
+            (today - datetime.timedelta(days=days - 1)).isoformat(), today.isoformat()
+        ),
+    }
+    while True:
+        response = visits_table.query(**query_kwargs)
+        for bucket in response.get("Items", []):
+            for attr, value in bucket.items():
+                if not attr.startswith("v|"):
+                    continue
+                try:
+                    n = int(value or 0)
+                except (TypeError, ValueError):
+                    continue
+                if n > 0:
+                    item_id = attr[2:]
+                    counts[item_id] = counts.get(item_id, 0) + n
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return counts
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+
+def reset(visits_table, account_id):
+    """Apaga todos os baldes da conta. Devolve quantos registros foram removidos."""
+    if not account_id:
+        return 0
+    deleted = 0
+    query_kwargs = {
+        "KeyConditionExpression": Key("item_id").eq(bucket_partition(account_id)),
+        "ProjectionExpression": "item_id, #ts",
+        "ExpressionAttributeNames": {"#ts": "timestamp"},
+    }
+    with visits_table.batch_writer() as batch:
+        while True:
+            response = visits_table.query(**query_kwargs)
+            for bucket in response.get("Items", []):
+                batch.delete_item(
+                    Key={"item_id": bucket["item_id"], "timestamp": bucket["timestamp"]}
+                )
+                deleted += 1
+            last_evaluated_key = response.get("LastEvaluatedKey")
+            if not last_evaluated_key:
+                return deleted
+            query_kwargs["ExclusiveStartKey"] = last_evaluated_key
@@ -0,0 +1,180 @@
+"""
+visit_recorder.py
+Registro de visitas com escrita adiada (write-behind) para /api/item/<id>/visit.
+
+O beacon só mexe em memória (deduplicação + soma no buffer) e responde na hora.
+Uma thread de fundo descarrega o buffer a cada FLUSH_INTERVAL segundos:
+    - um update_item ADD visit_count por item (com o total acumulado), e o novo
+      total na linha do índice do catálogo público (catalog_snapshot)
+    - update_item por conta/dia nos baldes diários, em lotes de 50 itens (visit_buckets)
+    - as linhas de log de visita via batch_writer
+Também descarrega no encerramento do processo (atexit).
+
+A deduplicação por visitante é em memória, por processo, dentro de DEDUPE_WINDOW
+segundos (padrão 24h). Com vários workers, um mesmo visitante pode ser contado
+uma vez por worker dentro da janela.
+"""
+
+import atexit
+import collections
+import datetime
+import os
+import threading
+import time
+
+import catalog_snapshot
+import visit_buckets
+
+
+FLUSH_INTERVAL = float(os.getenv("VISIT_FLUSH_INTERVAL_SECONDS", "5"))
+DEDUPE_WINDOW = int(os.getenv("VISIT_DEDUPE_WINDOW_SECONDS", str(24 * 60 * 60)))
+MAX_SEEN = int(os.getenv("VISIT_DEDUPE_MAX_KEYS", "200000"))
+MAX_PENDING_ROWS = 50000
+VISIT_ROW_TTL = 30 * 24 * 60 * 60
+
+_lock = threading.Lock()
+_seen = collections.OrderedDict()  # {(item_id, visitor_key): expira_em}
+_pending_counts = {}  # {item_id: visitas}
+_pending_rows = []  # linhas para alugueqqc_item_visits
+_tables = {"itens": None, "visits": None, "snapshot": None}
+_flusher = {"thread": None}
+_stop = threading.Event()
+
+
+def configure(itens_table, visits_table, snapshot_table=None):
+    """Define as tabelas usadas na descarga (chamado em init_item_routes)."""
+    _tables["itens"] = itens_table
+    _tables["visits"] = visits_table
+    _tables["snapshot"] = snapshot_table
+
+
+def _ensure_flusher():
+    thread = _flusher["thread"]
+    if thread is not None and thread.is_alive():
+        return
+    with _lock:
+        thread = _flusher["thread"]
+        if thread is not None and thread.is_alive():
+            return
+        thread = threading.Thread(target=_flush_loop, name="visit-recorder", daemon=True)
+        _flusher["thread"] = thread
+        thread.start()
+
+
+def _flush_loop():
+    while not _stop.wait(FLUSH_INTERVAL):
+        try:
+            flush()
+        except Exception as e:
+            print(f"Erro na descarga do buffer de visitas: {e}")
+
+
+def record(item_id, visitor_key=""):
+    """
+    Registra a visita no buffer. Devolve False se o visitante já foi contado
+    para o item dentro da janela; True caso contrário. Não faz I/O.
+    """
+    if not item_id:
+        return False
+    now = time.time()
+    with _lock:
+        if visitor_key:
+            seen_key = (item_id, visitor_key)
+            expires_at = _seen.get(seen_key)
+            if expires_at is not None and expires_at > now:
+                return False
+            _seen[seen_key] = now + DEDUPE_WINDOW
+            _seen.move_to_end(seen_key)
+            while len(_seen) > MAX_SEEN:
+                _seen.popitem(last=False)
+
+        _pending_counts[item_id] = _pending_counts.get(item_id, 0) + 1
+        if len(_pending_rows) < MAX_PENDING_ROWS:
+            row = {
+                "item_id": item_id,
+                "timestamp": datetime.datetime.now().isoformat(),
+                "ttl": int(now) + VISIT_ROW_TTL,
+            }
+            if visitor_key:
+                row["visitor_key"] = visitor_key
+            _pending_rows.append(row)
+
+    _ensure_flusher()
+    return True
+
+
+def _requeue(counts):
+    with _lock:
+        for item_id, n in counts.items():
+            _pending_counts[item_id] = _pending_counts.get(item_id, 0) + n
+
+
+def flush():
+    """Descarrega o buffer no DynamoDB. Seguro para chamar de qualquer thread."""
+    itens_table = _tables["itens"]
+    visits_table = _tables["visits"]
+    if itens_table is None or visits_table is None:
+        return
+
+    with _lock:
+        counts = dict(_pending_counts)
+        rows = list(_pending_rows)
+        _pending_counts.clear()
+        del _pending_rows[:]
+        now = time.time()
+        # Limpa entradas vencidas do início (as mais antigas)
+        while _seen:
+            if next(iter(_seen.values())) > now:
+                break
+            _seen.popitem(last=False)
+
+    if not counts and not rows:
+        return
+
+    # {account_id: {item_id: visitas}} para um update por conta nos baldes
+    per_account = {}
+    failed = {}
+    for item_id, n in counts.items():
+        try:
+            attrs = itens_table.update_item(
+                Key={"item_id": item_id},
+                UpdateExpression="ADD visit_count :inc",
+                ConditionExpression="attribute_exists(item_id)",
+                ExpressionAttributeValues={":inc": n},
+                ReturnValues="ALL_NEW",
+            ).get("Attributes") or {}
+        except itens_table.meta.client.exceptions.ConditionalCheckFailedException:
+            continue  # item inexistente: não cria registro fantasma
+        except Exception as e:
+            print(f"Erro ao somar visitas do item {item_id}: {e}")
+            failed[item_id] = n
+            continue
+        account_id = attrs.get("account_id")
+        if account_id:
+            per_account.setdefault(account_id, {})[item_id] = n
+            catalog_snapshot.update_visit_count(_tables["snapshot"], account_id, item_id, attrs.get("visit_count"))
+
+    if failed:
+        _requeue(failed)
+
+    for account_id, item_counts in per_account.items():
+        visit_buckets.record_visits(visits_table, account_id, item_counts)
+
+    if rows:
+        try:
+            with visits_table.batch_writer(overwrite_by_pkeys=["item_id", "timestamp"]) as batch:
+                for row in rows:
+                    batch.put_item(Item=row)
+        except Exception as e:
+            print(f"Erro ao gravar log de visitas ({len(rows)} linhas): {e}")
+
+
+def shutdown():
+    _stop.set()
+    try:
+        flush()
+    except Exception as e:
+        print(f"Erro ao descarregar visitas no encerramento: {e}")
+
+
+atexit.register(shutdown)